@@ -398,6 +398,18 @@ def update_persona_in_db(persona_data: dict):
     persona_ref.update(persona_data)
 
 
+def get_persona_state_db(persona_id: str):
+    """What the persona's prompt was last built from, kept apart so the app document stays small"""
+    state_ref = db.collection('plugins_data').document(persona_id).collection('state').document('persona')
+    doc = state_ref.get()
+    return doc.to_dict() if doc.exists else None
+
+
+def set_persona_state_db(persona_id: str, state: dict):
+    state_ref = db.collection('plugins_data').document(persona_id).collection('state').document('persona')
+    state_ref.set(state)
+
+
 def migrate_app_owner_id_db(new_id: str, old_id: str):
     filters = [FieldFilter('uid', '==', old_id), FieldFilter('deleted', '==', False)]
     apps_ref = db.collection('plugins_data').where(filter=BaseCompositeFilter('AND', filters)).stream()
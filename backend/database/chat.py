@@ -1,25 +1,51 @@
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Callable, Optional, List
 
 from google.cloud import firestore
 from google.cloud.firestore_v1 import FieldFilter
 
-from models.chat import Message
+from models.chat import Message, MessageConversation
 from utils.other.endpoints import timeit
 from ._client import db
+from .deletion_jobs import bulk_update_query
+from .redis_db import bump_chat_version, get_chat_version, get_chat_history, cache_chat_history, \
+    push_chat_history_message, clear_chat_history, set_chat_cleared_at, get_chat_cleared_at, remove_chat_cleared_at
+
+# Newest messages of each chat thread kept in Redis for history loads
+CHAT_HISTORY_CACHE_MESSAGES = 100
+
+
+def _conversation_ref(conversation) -> dict:
+    """id, title, emoji and created_at of a conversation a message cites"""
+    return MessageConversation.model_validate(conversation, from_attributes=True).model_dump()
+
+
+def _history_thread(plugin_id: Optional[str], chat_session_id: Optional[str] = None) -> str:
+    return f'{plugin_id or ""}:{chat_session_id or ""}'
 
 
 @timeit
 def add_message(uid: str, message_data: dict):
-    del message_data['memories']
+    memories = message_data.pop('memories', None) or []
+    if memories or not message_data.get('memories_id'):
+        # stored with the message, history loads then never read the conversations
+        message_data['memories'] = [_conversation_ref(conversation) for conversation in memories]
     message_data['deleted'] = False
     user_ref = db.collection('users').document(uid)
     user_ref.collection('messages').add(message_data)
+    bump_chat_version(uid)
+
+    # every history query the message belongs to, see get_messages filters
+    threads = [_history_thread(message_data.get('plugin_id'))]
+    if message_data.get('chat_session_id'):
+        threads.append(_history_thread(message_data.get('plugin_id'), message_data['chat_session_id']))
+    push_chat_history_message(uid, threads, message_data, CHAT_HISTORY_CACHE_MESSAGES)
     return message_data
 
 
-def add_plugin_message(text: str, plugin_id: str, uid: str, conversation_id: Optional[str] = None) -> Message:
+def add_plugin_message(text: str, plugin_id: str, uid: str, conversation=None) -> Message:
+    """conversation: the conversation the app answered about, its reference is stored with the message"""
     ai_message = Message(
         id=str(uuid.uuid4()),
         text=text,
@@ -28,7 +54,8 @@ def add_plugin_message(text: str, plugin_id: str, uid: str, conversation_id: Opt
         plugin_id=plugin_id,
         from_external_integration=False,
         type='text',
-        memories_id=[conversation_id] if conversation_id else [],
+        memories_id=[conversation.id] if conversation else [],
+        memories=[_conversation_ref(conversation)] if conversation else [],
     )
     add_message(uid, ai_message.dict())
     return ai_message
@@ -95,9 +122,15 @@ def get_plugin_messages(uid: str, plugin_id: str, limit: int = 20, offset: int =
 
 @timeit
 def get_messages(
-        uid: str, limit: int = 20, offset: int = 0, include_conversations: bool = False, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None
+        uid: str, limit: int = 20, offset: int = 0, include_conversations: bool = False, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None,
+        before: Optional[datetime] = None,
         # include_plugin_id_filter: bool = True,
 ):
+    """
+    include_conversations: attach the cited conversations and files. Conversations come from the references stored
+    on the message, only messages written before those existed read them.
+    before: only messages created before it, a cursor instead of offset.
+    """
     print('get_messages', uid, limit, offset, plugin_id, include_conversations)
     user_ref = db.collection('users').document(uid)
     messages_ref = (
@@ -108,41 +141,70 @@ def get_messages(
     messages_ref = messages_ref.where(filter=FieldFilter('plugin_id', '==', plugin_id))
     if chat_session_id:
         messages_ref = messages_ref.where(filter=FieldFilter('chat_session_id', '==', chat_session_id))
-
-    messages_ref = messages_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(limit).offset(offset)
+    if before:
+        messages_ref = messages_ref.where(filter=FieldFilter('created_at', '<', before))
+    # a cleared chat's messages can still be waiting for their deletion job
+    cleared = get_chat_cleared_at(uid, plugin_id) or {}
+    cutoffs = [cleared[key] for key in {'', chat_session_id or ''} if key in cleared]
+    if cutoffs:
+        messages_ref = messages_ref.where(
+            filter=FieldFilter('created_at', '>', datetime.fromtimestamp(max(cutoffs), tz=timezone.utc)))
+    # cleared sessions of the chat, a read across sessions skips their messages up to the cutoff
+    sessions_cleared = {} if chat_session_id else {key: value for key, value in cleared.items() if key}
+
+    messages_ref = messages_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
+    if not sessions_cleared:
+        messages_ref = messages_ref.limit(limit).offset(offset)
 
     messages = []
     conversations_id = set()
     files_id = set()
 
     # Fetch messages and collect conversation IDs
+    skipped = 0
     for doc in messages_ref.stream():
         message = doc.to_dict()
         # if message.get('deleted') is True:
         #     continue
+        if sessions_cleared:
+            cutoff = sessions_cleared.get(message.get('chat_session_id'))
+            if cutoff and message['created_at'].timestamp() <= cutoff:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            if len(messages) >= limit:
+                break
         messages.append(message)
-        conversations_id.update(message.get('memories_id', []))
+        if 'memories' not in message:
+            conversations_id.update(message.get('memories_id', []))
         files_id.update(message.get('files_id', []))
 
     if not include_conversations:
         return messages
 
-    # Fetch all conversations at once
+    # Fetch the conversations of older messages at once
     conversations = {}
-    conversations_ref = user_ref.collection('conversations')
-    doc_refs = [conversations_ref.document(str(conversation_id)) for conversation_id in conversations_id]
-    docs = db.get_all(doc_refs)
-    for doc in docs:
-        if doc.exists:
-            conversation = doc.to_dict()
-            conversations[conversation['id']] = conversation
+    if conversations_id:
+        conversations_ref = user_ref.collection('conversations')
+        doc_refs = [conversations_ref.document(str(conversation_id)) for conversation_id in conversations_id]
+        docs = db.get_all(doc_refs, field_paths=['id', 'structured.title', 'structured.emoji', 'created_at'])
+        for doc in docs:
+            if doc.exists:
+                conversation = doc.to_dict()
+                conversations[conversation['id']] = conversation
 
     # Attach conversations to messages
     for message in messages:
+        if 'memories' in message:
+            continue
         message['memories'] = [
             conversations[conversation_id] for conversation_id in message.get('memories_id', []) if conversation_id in conversations
         ]
 
+    if not files_id:
+        return messages
+
     # Fetch file chat
     files = {}
     files_ref = user_ref.collection('files')
@@ -164,6 +226,47 @@ def get_messages(
     return messages
 
 
+def _from_cache(message: dict) -> dict:
+    if isinstance(message.get('created_at'), str):
+        message['created_at'] = datetime.fromisoformat(message['created_at'])
+    return message
+
+
+def get_message_history(uid: str, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None,
+                        limit: int = 100, before: Optional[datetime] = None) -> List[dict]:
+    """
+    Messages of a chat thread, newest first, with the conversations and files they cite.
+    The newest CHAT_HISTORY_CACHE_MESSAGES come from the thread's Redis list, older pages (before, the created_at of
+    the last message of the previous page) from Firestore.
+    """
+    thread = _history_thread(plugin_id, chat_session_id)
+    cached = get_chat_history(uid, thread)
+    if cached is None:
+        # the version is read first, a write racing the read then keeps the stale list out of the cache
+        version = get_chat_version(uid)
+        cached = get_messages(uid, limit=CHAT_HISTORY_CACHE_MESSAGES, include_conversations=True,
+                              plugin_id=plugin_id, chat_session_id=chat_session_id)
+        if cached and version is not None:
+            cache_chat_history(uid, thread, cached, version)
+    else:
+        cached = [_from_cache(message) for message in cached]
+
+    messages, seen = [], set()
+    for message in cached:
+        # a message stored while its thread was being cached can be listed twice
+        if message['id'] in seen or (before and message['created_at'] >= before):
+            continue
+        seen.add(message['id'])
+        messages.append(message)
+    messages = messages[:limit]
+
+    if len(messages) < limit and len(cached) >= CHAT_HISTORY_CACHE_MESSAGES:
+        older_than = messages[-1]['created_at'] if messages else before
+        messages += get_messages(uid, limit=limit - len(messages), include_conversations=True, plugin_id=plugin_id,
+                                 chat_session_id=chat_session_id, before=older_than)
+    return messages
+
+
 def get_message(uid: str, message_id: str) -> tuple[Message, str] | None:
     user_ref = db.collection('users').document(uid)
     message_ref = user_ref.collection('messages').where('id', '==', message_id).limit(1).stream()
@@ -184,13 +287,23 @@ def report_message(uid: str, msg_doc_id: str):
     message_ref = user_ref.collection('messages').document(msg_doc_id)
     try:
         message_ref.update({'deleted': True, 'reported': True})
+        bump_chat_version(uid)
+        clear_chat_history(uid)
         return {"message": "Message reported"}
     except Exception as e:
         print("Update failed:", e)
         return {"message": f"Update failed: {e}"}
 
 
-def batch_delete_messages(parent_doc_ref, batch_size=450, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None):
+def batch_delete_messages(parent_doc_ref, plugin_id: Optional[str], chat_session_id: Optional[str],
+                          cleared_at: float, on_progress: Callable[[int], None] = None) -> int:
+    """
+    Marks the messages of the chat (plugin_id, and chat_session_id when the chat had a session) created up to
+    cleared_at (clear_chat's cutoff) deleted, run by the chat deletion job (utils/deletion_jobs.py). Messages sent
+    after the clear are never touched. The same messages are hidden by the cutoff until then, it is dropped once they
+    are all marked.
+    """
+    uid = parent_doc_ref.id
     messages_ref = (
         parent_doc_ref.collection('messages')
         .where(filter=FieldFilter('deleted', '==', False))
@@ -198,43 +311,32 @@ def batch_delete_messages(parent_doc_ref, batch_size=450, plugin_id: Optional[st
     messages_ref = messages_ref.where(filter=FieldFilter('plugin_id', '==', plugin_id))
     if chat_session_id:
         messages_ref = messages_ref.where(filter=FieldFilter('chat_session_id', '==', chat_session_id))
+    messages_ref = (
+        messages_ref
+        .where(filter=FieldFilter('created_at', '<=', datetime.fromtimestamp(cleared_at, tz=timezone.utc)))
+        .order_by('created_at', direction=firestore.Query.DESCENDING)
+    )
     print('batch_delete_messages', plugin_id)
-    last_doc = None  # For pagination
-
-    while True:
-        if last_doc:
-            docs = messages_ref.limit(batch_size).start_after(last_doc).stream()
-        else:
-            docs = messages_ref.limit(batch_size).stream()
-
-        docs_list = list(docs)
-
-        if not docs_list:
-            print("No more messages to delete")
-            break
-
-        batch = db.batch()
-
-        for doc in docs_list:
-            print('Deleting message:', doc.id)
-            batch.update(doc.reference, {'deleted': True})
-
-        batch.commit()
-
-        if len(docs_list) < batch_size:
-            print("Processed all messages")
-            break
-
-        last_doc = docs_list[-1]
-
-
-def clear_chat(uid: str, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None):
+    deleted = bulk_update_query(messages_ref, {'deleted': True}, on_progress=on_progress)
+    bump_chat_version(uid)
+    clear_chat_history(uid)
+    remove_chat_cleared_at(uid, plugin_id, chat_session_id, cleared_at)
+    return deleted
+
+
+def clear_chat(uid: str, cleared_at: float, plugin_id: Optional[str] = None, chat_session_id: Optional[str] = None):
+    """
+    Hides the chat's messages created up to cleared_at from reads right away, a deletion job then marks them
+    deleted with batch_delete_messages.
+    """
     try:
         user_ref = db.collection('users').document(uid)
-        print(f"Deleting messages for user: {uid}")
+        print(f"Clearing messages for user: {uid}")
         if not user_ref.get().exists:
             return {"message": "User not found"}
-        batch_delete_messages(user_ref, plugin_id=plugin_id, chat_session_id=chat_session_id)
+        set_chat_cleared_at(uid, plugin_id, chat_session_id, cleared_at)
+        bump_chat_version(uid)
+        clear_chat_history(uid)
         return None
     except Exception as e:
         return {"message": str(e)}
@@ -271,11 +373,14 @@ def delete_multi_files(uid: str, files_data: list):
         batch.update(file_ref, file_data)
 
     batch.commit()
+    # cached history lists the files
+    clear_chat_history(uid)
 
 def add_chat_session(uid: str, chat_session_data: dict):
     chat_session_data['deleted'] = False
     user_ref = db.collection('users').document(uid)
     user_ref.collection('chat_sessions').document(chat_session_data['id']).set(chat_session_data)
+    bump_chat_version(uid)
     return chat_session_data
 
 def get_chat_session(uid: str, plugin_id: Optional[str] = None):
@@ -296,6 +401,8 @@ def delete_chat_session(uid, chat_session_id):
     user_ref = db.collection('users').document(uid)
     session_ref = user_ref.collection('chat_sessions').document(chat_session_id)
     session_ref.update({'deleted': True})
+    bump_chat_version(uid)
+    clear_chat_history(uid)
 
 def add_message_to_chat_session(uid: str, chat_session_id: str, message_id: str):
     user_ref = db.collection('users').document(uid)
@@ -2,7 +2,7 @@ import asyncio
 import json
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 
 from google.cloud import firestore
 from google.cloud.firestore_v1 import FieldFilter
@@ -14,6 +14,19 @@ from models.transcript_segment import TranscriptSegment
 from ._client import db
 
 conversations_collection = 'conversations'
+transcript_chunks_collection = 'transcript_chunks'
+
+# Segments per transcript chunk document, small enough that a chunk with translations stays far below 1MiB.
+# Chunk positions are derived from it, it cannot change once transcripts are stored
+TRANSCRIPT_CHUNK_SIZE = 100
+# Chunk writes per batch commit, Firestore rejects batches of more than 500 writes
+TRANSCRIPT_CHUNKS_PER_BATCH = 400
+
+# Fields needed to render conversation lists, everything heavy (transcripts, photos, app results) is left out
+CONVERSATION_LIST_FIELDS = [
+    'id', 'created_at', 'started_at', 'finished_at', 'source', 'language', 'structured', 'geolocation',
+    'discarded', 'deleted', 'visibility', 'status', 'processing_conversation_id', 'app_id',
+]
 
 
 # *****************************
@@ -28,22 +41,44 @@ def upsert_conversation(uid: str, conversation_data: dict):
 
     user_ref = db.collection('users').document(uid)
     conversation_ref = user_ref.collection(conversations_collection).document(conversation_data['id'])
-    conversation_ref.set(conversation_data)
+
+    segments = conversation_data.get('transcript_segments') or []
+    if conversation_data.get('transcript_chunked') and not segments and conversation_data.get('transcript_segments_count'):
+        # transcript was never loaded, the stored chunks and their search text are kept as they are
+        conversation_ref.set(conversation_data, merge=list(conversation_data.keys()))
+        return
+
+    # the transcript goes to the chunks, the conversation document only keeps its size and search text
+    writes = _transcript_chunk_writes(conversation_ref, segments) + _stale_transcript_chunk_writes(conversation_ref,
+                                                                                                   len(segments))
+    _commit_transcript_writes(writes, lambda batch: batch.set(conversation_ref, {
+        **conversation_data, 'transcript_segments': [], 'transcript_chunked': True,
+        'transcript_segments_count': len(segments), 'transcript_text': _transcript_text(segments),
+    }))
 
 
-def get_conversation(uid, conversation_id):
+def get_conversation(uid, conversation_id, include_transcript: bool = True):
+    """include_transcript: load chunked transcript segments, without it chunked conversations have none"""
     user_ref = db.collection('users').document(uid)
     conversation_ref = user_ref.collection(conversations_collection).document(conversation_id)
-    return conversation_ref.get().to_dict()
+    conversation = conversation_ref.get().to_dict()
+    if conversation and include_transcript:
+        _load_transcripts(uid, [conversation])
+    return conversation
 
 
 def get_conversations(uid: str, limit: int = 100, offset: int = 0, include_discarded: bool = False,
                       statuses: List[str] = [], start_date: Optional[datetime] = None,
-                      end_date: Optional[datetime] = None, categories: Optional[List[str]] = None):
-    conversations_ref = (
-        db.collection('users').document(uid).collection(conversations_collection)
-        .where(filter=FieldFilter('deleted', '==', False))
-    )
+                      end_date: Optional[datetime] = None, categories: Optional[List[str]] = None,
+                      fields: Optional[List[str]] = None, start_after: Optional[Tuple[datetime, str]] = None,
+                      include_transcript: bool = True):
+    """
+    fields: only return these fields (e.g. CONVERSATION_LIST_FIELDS), the rest is never read from Firestore.
+    start_after: (created_at, id) of the last conversation of the previous page, a cursor instead of offset.
+    include_transcript: load chunked transcript segments, ignored when fields are selected.
+    """
+    collection_ref = db.collection('users').document(uid).collection(conversations_collection)
+    conversations_ref = collection_ref.where(filter=FieldFilter('deleted', '==', False))
     if not include_discarded:
         conversations_ref = conversations_ref.where(filter=FieldFilter('discarded', '==', False))
     if len(statuses) > 0:
@@ -61,10 +96,26 @@ def get_conversations(uid: str, limit: int = 100, offset: int = 0, include_disca
     # Sort
     conversations_ref = conversations_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
 
+    if fields:
+        conversations_ref = conversations_ref.select(fields)
+
+    if start_after:
+        # the cursor names the document id too, so it has to be ordered on explicitly. Firestore orders created_at
+        # ties by document id in the same direction anyway, pages with and without a cursor line up.
+        created_at, conversation_id = start_after
+        conversations_ref = conversations_ref.order_by(firestore.FieldPath.document_id(),
+                                                       direction=firestore.Query.DESCENDING)
+        conversations_ref = conversations_ref.start_after([created_at, collection_ref.document(conversation_id)])
+
     # Limits
-    conversations_ref = conversations_ref.limit(limit).offset(offset)
-    
-    return [doc.to_dict() for doc in conversations_ref.stream()]
+    conversations_ref = conversations_ref.limit(limit)
+    if offset:
+        conversations_ref = conversations_ref.offset(offset)
+
+    conversations = [doc.to_dict() for doc in conversations_ref.stream()]
+    if include_transcript and not fields:
+        _load_transcripts(uid, conversations)
+    return conversations
 
 
 def update_conversation(uid: str, conversation_id: str, memory_data: dict):
@@ -108,10 +159,10 @@ def filter_conversations_by_date(uid, start_date, end_date):
         .where(filter=FieldFilter('discarded', '==', False))
         .order_by('created_at', direction=firestore.Query.DESCENDING)
     )
-    return [doc.to_dict() for doc in query.stream()]
+    return _load_transcripts(uid, [doc.to_dict() for doc in query.stream()])
 
 
-def get_conversations_by_id(uid, conversation_ids):
+def get_conversations_by_id(uid, conversation_ids, include_transcript: bool = True):
     user_ref = db.collection('users').document(uid)
     conversations_ref = user_ref.collection(conversations_collection)
 
@@ -125,6 +176,8 @@ def get_conversations_by_id(uid, conversation_ids):
             if data.get('deleted') or data.get('discarded'):
                 continue
             conversations.append(data)
+    if include_transcript:
+        _load_transcripts(uid, conversations)
     return conversations
 
 
@@ -132,14 +185,18 @@ def get_conversations_by_id(uid, conversation_ids):
 # ********** STATUS *************
 # **************************************
 
-def get_in_progress_conversation(uid: str):
+def get_in_progress_conversation(uid: str, include_transcript: bool = True):
     user_ref = db.collection('users').document(uid)
     conversations_ref = (
         user_ref.collection(conversations_collection)
         .where(filter=FieldFilter('status', '==', 'in_progress'))
     )
     docs = [doc.to_dict() for doc in conversations_ref.stream()]
-    return docs[0] if docs else None
+    if not docs:
+        return None
+    if include_transcript:
+        _load_transcripts(uid, docs[:1])
+    return docs[0]
 
 
 def get_processing_conversations(uid: str):
@@ -148,7 +205,7 @@ def get_processing_conversations(uid: str):
         user_ref.collection(conversations_collection)
         .where(filter=FieldFilter('status', '==', 'processing'))
     )
-    return [doc.to_dict() for doc in conversations_ref.stream()]
+    return _load_transcripts(uid, [doc.to_dict() for doc in conversations_ref.stream()])
 
 
 def update_conversation_status(uid: str, conversation_id: str, status: ConversationStatus):
@@ -204,10 +261,167 @@ def update_conversation_finished_at(uid: str, conversation_id: str, finished_at:
     conversation_ref.update({'finished_at': finished_at})
 
 
-def update_conversation_segments(uid: str, conversation_id: str, segments: List[dict]):
+def update_conversation_segments(uid: str, conversation_id: str, segments: List[dict],
+                                 changed_indexes: Optional[List[int]] = None):
+    """
+    Replaces the whole transcript.
+    changed_indexes: positions of the only segments that changed (same segment count), just their chunks are written.
+    """
+    user_ref = db.collection('users').document(uid)
+    conversation_ref = user_ref.collection(conversations_collection).document(conversation_id)
+    data = {'transcript_segments': [], 'transcript_chunked': True, 'transcript_segments_count': len(segments)}
+    if changed_indexes is not None:
+        writes = []
+        for index in sorted({i // TRANSCRIPT_CHUNK_SIZE for i in changed_indexes}):
+            offset = index * TRANSCRIPT_CHUNK_SIZE
+            chunk = segments[offset:offset + TRANSCRIPT_CHUNK_SIZE]
+            writes += _transcript_chunk_writes(conversation_ref, chunk, offset)
+            data.update(_transcript_text_updates(chunk, offset))
+    else:
+        writes = _transcript_chunk_writes(conversation_ref, segments) + _stale_transcript_chunk_writes(
+            conversation_ref, len(segments))
+        data['transcript_text'] = _transcript_text(segments)
+    _commit_transcript_writes(writes, lambda batch: batch.update(conversation_ref, data))
+
+
+# *****************************************
+# ********** TRANSCRIPT CHUNKS ************
+# *****************************************
+
+def _transcript_chunk_id(index: int) -> str:
+    # zero padded so chunk ids sort in transcript order
+    return f'{index:05d}'
+
+
+def _transcript_chunk_writes(conversation_ref, segments: List[dict], offset: int = 0) -> List[tuple]:
+    """(chunk ref, data) writes of segments starting at transcript position offset (a chunk boundary)"""
+    assert offset % TRANSCRIPT_CHUNK_SIZE == 0, 'transcript chunk writes start at a chunk boundary'
+    chunks_ref = conversation_ref.collection(transcript_chunks_collection)
+    writes = []
+    for i in range(0, len(segments), TRANSCRIPT_CHUNK_SIZE):
+        index = (offset + i) // TRANSCRIPT_CHUNK_SIZE
+        writes.append((chunks_ref.document(_transcript_chunk_id(index)), {
+            'index': index, 'segments': segments[i:i + TRANSCRIPT_CHUNK_SIZE],
+        }))
+    return writes
+
+
+def _stale_transcript_chunk_writes(conversation_ref, count: int) -> List[tuple]:
+    # deletes of the chunks left over from a longer transcript, known from the stored segment count
+    stored = conversation_ref.get(field_paths=['transcript_segments_count']).to_dict() or {}
+    stored_chunks_count = -(-(stored.get('transcript_segments_count') or 0) // TRANSCRIPT_CHUNK_SIZE)
+    chunks_count = -(-count // TRANSCRIPT_CHUNK_SIZE)
+    chunks_ref = conversation_ref.collection(transcript_chunks_collection)
+    return [
+        (chunks_ref.document(_transcript_chunk_id(index)), None) for index in range(chunks_count, stored_chunks_count)
+    ]
+
+
+def _commit_transcript_writes(writes: List[tuple], write_conversation: Callable):
+    """
+    Commits chunk writes (data None deletes the chunk) in batches below Firestore's 500 writes limit.
+    write_conversation(batch) goes in the last batch, so the conversation never counts chunks not yet written.
+    """
+    batch = db.batch()
+    count = 0
+    for chunk_ref, data in writes:
+        if data is None:
+            batch.delete(chunk_ref)
+        else:
+            batch.set(chunk_ref, data)
+        count += 1
+        if count >= TRANSCRIPT_CHUNKS_PER_BATCH:
+            batch.commit()
+            batch = db.batch()
+            count = 0
+    write_conversation(batch)
+    batch.commit()
+
+
+def _chunk_text(segments: List[dict]) -> str:
+    return ' '.join(segment.get('text') or '' for segment in segments).strip()
+
+
+def _transcript_text(segments: List[dict], offset: int = 0) -> dict:
+    """
+    Search text of the transcript, kept on the conversation document for the Typesense sync (transcript_segments
+    stays empty there). One entry per chunk id, so appends only rewrite the entries of the chunks they touch.
+    """
+    return {
+        _transcript_chunk_id((offset + i) // TRANSCRIPT_CHUNK_SIZE): _chunk_text(segments[i:i + TRANSCRIPT_CHUNK_SIZE])
+        for i in range(0, len(segments), TRANSCRIPT_CHUNK_SIZE)
+    }
+
+
+def _transcript_text_updates(segments: List[dict], offset: int) -> dict:
+    # update() field paths of the transcript_text entries of segments written from offset on
+    return {firestore.FieldPath('transcript_text', chunk_id).to_api_repr(): text
+            for chunk_id, text in _transcript_text(segments, offset).items()}
+
+
+def _transcript_chunk_refs(uid: str, conversation: dict, first_index: int = 0, client=db):
+    conversation_ref = client.collection('users').document(uid).collection(conversations_collection) \
+        .document(conversation['id'])
+    chunks_ref = conversation_ref.collection(transcript_chunks_collection)
+    chunks_count = -(-conversation.get('transcript_segments_count', 0) // TRANSCRIPT_CHUNK_SIZE)
+    return [chunks_ref.document(_transcript_chunk_id(index)) for index in range(first_index, chunks_count)]
+
+
+def _load_transcripts(uid: str, conversations: List[dict]) -> List[dict]:
+    """Fills in transcript_segments of chunked conversations, all chunks are read with a single get_all"""
+    chunked = [c for c in conversations if c.get('transcript_chunked') and c.get('transcript_segments_count')]
+    refs = [ref for conversation in chunked for ref in _transcript_chunk_refs(uid, conversation)]
+    if not refs:
+        return conversations
+
+    chunks = {}
+    for doc in db.get_all(refs):
+        if doc.exists:
+            chunks[doc.reference.path] = doc.to_dict().get('segments', [])
+    for conversation in chunked:
+        conversation['transcript_segments'] = [
+            segment for ref in _transcript_chunk_refs(uid, conversation) for segment in chunks.get(ref.path, [])
+        ]
+    return conversations
+
+
+def get_transcript_segments(uid: str, conversation: dict) -> List[dict]:
+    """Transcript of a conversation document, in either the chunked or the inline format"""
+    if conversation.get('transcript_chunked') and not conversation.get('transcript_segments'):
+        _load_transcripts(uid, [conversation])
+    return conversation.get('transcript_segments') or []
+
+
+def get_transcript_tail(uid: str, conversation: dict) -> Tuple[int, List[dict]]:
+    """
+    The last transcript chunk of a conversation document read without its transcript, as (offset, segments).
+    Only this chunk can change when segments are appended. Inline transcripts are returned whole from offset 0,
+    so the next append moves them to chunks.
+    """
+    if not conversation.get('transcript_chunked'):
+        return 0, conversation.get('transcript_segments') or []
+    count = conversation.get('transcript_segments_count', 0)
+    if not count:
+        return 0, []
+    index = (count - 1) // TRANSCRIPT_CHUNK_SIZE
+    tail_ref = _transcript_chunk_refs(uid, conversation, first_index=index)[0]
+    doc = tail_ref.get()
+    return index * TRANSCRIPT_CHUNK_SIZE, (doc.to_dict().get('segments', []) if doc.exists else [])
+
+
+def append_transcript_segments(uid: str, conversation_id: str, segments: List[dict], offset: int,
+                               finished_at: Optional[datetime] = None):
+    """
+    Writes the transcript from offset (as returned by get_transcript_tail) on, only the chunks past it are touched.
+    """
     user_ref = db.collection('users').document(uid)
     conversation_ref = user_ref.collection(conversations_collection).document(conversation_id)
-    conversation_ref.update({'transcript_segments': segments})
+    data = {'transcript_segments': [], 'transcript_chunked': True, 'transcript_segments_count': offset + len(segments),
+            **_transcript_text_updates(segments, offset)}
+    if finished_at:
+        data['finished_at'] = finished_at
+    _commit_transcript_writes(_transcript_chunk_writes(conversation_ref, segments, offset),
+                              lambda batch: batch.update(conversation_ref, data))
 
 
 # ***********************************
@@ -226,6 +440,11 @@ async def _get_public_conversation(db: AsyncClient, uid: str, conversation_id: s
     if conversation_doc.exists:
         conversation_data = conversation_doc.to_dict()
         if conversation_data.get('visibility') in ['public'] and not conversation_data.get('deleted'):
+            if conversation_data.get('transcript_chunked') and conversation_data.get('transcript_segments_count'):
+                chunk_refs = _transcript_chunk_refs(uid, conversation_data, client=db)
+                chunks = [doc async for doc in db.get_all(chunk_refs) if doc.exists]
+                chunks.sort(key=lambda doc: doc.id)
+                conversation_data['transcript_segments'] = [s for doc in chunks for s in doc.to_dict()['segments']]
             return conversation_data
     return None
 
@@ -383,6 +602,7 @@ def get_closest_conversation_to_timestamps(
             closest_conversation = conversation
 
     print('get_closest_conversation_to_timestamps closest_conversation:', closest_conversation['id'])
+    _load_transcripts(uid, [closest_conversation])
     return closest_conversation
 
 
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.cloud import firestore
+from google.cloud.firestore import DELETE_FIELD
+
+from ._client import db
+
+daily_digests_collection = 'daily_digests'
+
+
+def _digest_ref(uid: str, date: str):
+    return db.collection('users').document(uid).collection(daily_digests_collection).document(date)
+
+
+def upsert_daily_digest_conversation(uid: str, date: str, conversation: dict) -> dict:
+    """
+    Adds (or replaces, on reprocessing) one conversation of the user's local day, returns the digest after it.
+    Every change bumps revision, the summary records the revision it was generated from.
+    """
+    digest_ref = _digest_ref(uid, date)
+    digest_ref.set({
+        'date': date,
+        'conversations': {conversation['id']: conversation},
+        'revision': firestore.Increment(1),
+        'updated_at': datetime.now(timezone.utc),
+    }, merge=True)
+    return digest_ref.get().to_dict()
+
+
+def remove_daily_digest_conversation(uid: str, date: str, conversation_id: str) -> bool:
+    """Returns whether the conversation was in the digest"""
+    digest_ref = _digest_ref(uid, date)
+    snapshot = digest_ref.get()
+    if not snapshot.exists or conversation_id not in (snapshot.to_dict().get('conversations') or {}):
+        return False
+    digest_ref.update({
+        f'conversations.`{conversation_id}`': DELETE_FIELD,
+        'revision': firestore.Increment(1),
+        'updated_at': datetime.now(timezone.utc),
+    })
+    return True
+
+
+def get_daily_digest(uid: str, date: str) -> Optional[dict]:
+    return _digest_ref(uid, date).get().to_dict()
+
+
+def set_daily_digest_summary(uid: str, date: str, summary: str, revision: int) -> bool:
+    """Stores the summary unless one from a newer revision is already stored, folds may finish out of order"""
+    digest_ref = _digest_ref(uid, date)
+
+    @firestore.transactional
+    def update(transaction):
+        snapshot = digest_ref.get(transaction=transaction)
+        if not snapshot.exists or (snapshot.to_dict().get('summary_revision') or 0) >= revision:
+            return False
+        transaction.update(digest_ref, {'summary': summary, 'summary_revision': revision})
+        return True
+
+    return update(db.transaction())
+
+
+def mark_daily_digest_sent(uid: str, date: str):
+    _digest_ref(uid, date).update({'sent_at': datetime.now(timezone.utc)})
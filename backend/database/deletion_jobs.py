@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from google.cloud.firestore_v1 import FieldFilter
+
+from ._client import db
+
+deletion_jobs_collection = 'deletion_jobs'
+
+# Documents read per round of a bulk delete, the BulkWriter sends their writes in parallel
+BULK_DELETE_CHUNK_SIZE = 1000
+# A write still failing after this many attempts fails the round, its document would be read again forever
+BULK_WRITE_MAX_ATTEMPTS = 5
+
+
+def create_deletion_job(job_data: dict):
+    db.collection(deletion_jobs_collection).document(job_data['id']).set(job_data)
+    return job_data
+
+
+def get_deletion_job(job_id: str) -> Optional[dict]:
+    doc = db.collection(deletion_jobs_collection).document(job_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def update_deletion_job(job_id: str, data: dict):
+    """data can set a single step with 'steps.<name>' keys, the job document is the checkpoint"""
+    data['updated_at'] = datetime.now(timezone.utc)
+    db.collection(deletion_jobs_collection).document(job_id).update(data)
+
+
+def get_unfinished_deletion_jobs(limit: int = 100) -> List[dict]:
+    jobs_ref = (
+        db.collection(deletion_jobs_collection)
+        .where(filter=FieldFilter('status', 'in', ['pending', 'running']))
+        .limit(limit)
+    )
+    return [doc.to_dict() for doc in jobs_ref.stream()]
+
+
+def _bulk_writer(failures: list):
+    """BulkWriter retrying a failed write a few times, writes that keep failing are collected in failures"""
+    bulk_writer = db.bulk_writer()
+
+    def on_write_error(failure, _) -> bool:
+        if failure.attempts < BULK_WRITE_MAX_ATTEMPTS:
+            return True
+        failures.append(failure)
+        return False
+
+    bulk_writer.on_write_error(on_write_error)
+    return bulk_writer
+
+
+def _raise_failures(failures: list):
+    if failures:
+        raise RuntimeError(f'{len(failures)} bulk writes failed, first: {failures[0].code} {failures[0].message}')
+
+
+def bulk_delete_collection(collection_ref, on_progress: Callable[[int], None] = None) -> int:
+    """
+    Deletes every document of the collection and of its subcollections, chunk by chunk.
+    Re-running it after an interruption continues with whatever is left.
+    """
+    failures = []
+    bulk_writer = _bulk_writer(failures)
+    # all descendants, documents nested under the collection's documents are found even once their parent is gone
+    query = collection_ref.recursive().select([]).limit(BULK_DELETE_CHUNK_SIZE)
+    deleted = 0
+    try:
+        while True:
+            docs = list(query.stream())
+            if not docs:
+                break
+            for doc in docs:
+                bulk_writer.delete(doc.reference)
+            bulk_writer.flush()
+            _raise_failures(failures)
+            deleted += len(docs)
+            if on_progress:
+                on_progress(deleted)
+    finally:
+        bulk_writer.close()
+    return deleted
+
+
+def bulk_update_query(query, data: dict, on_progress: Callable[[int], None] = None) -> int:
+    """
+    Applies data to every document matching query, chunk by chunk. The update must take documents out of the
+    query (e.g. deleted == False and {'deleted': True}), each chunk is read from the start of what still matches.
+    """
+    failures = []
+    bulk_writer = _bulk_writer(failures)
+    query = query.select([]).limit(BULK_DELETE_CHUNK_SIZE)
+    updated = 0
+    try:
+        while True:
+            docs = list(query.stream())
+            if not docs:
+                break
+            for doc in docs:
+                bulk_writer.update(doc.reference, data)
+            bulk_writer.flush()
+            _raise_failures(failures)
+            updated += len(docs)
+            if on_progress:
+                on_progress(updated)
+    finally:
+        bulk_writer.close()
+    return updated
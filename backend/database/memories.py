@@ -1,10 +1,11 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import Callable, List
 
 from google.cloud import firestore
 from google.cloud.firestore_v1 import FieldFilter
 
 from ._client import db
+from .deletion_jobs import bulk_update_query
 
 memories_collection = 'memories'
 users_collection = 'users'
@@ -32,6 +33,20 @@ def get_memories(uid: str, limit: int = 100, offset: int = 0, categories: List[s
     return result
 
 
+def get_memories_by_ids(uid: str, memory_ids: List[str]) -> List[dict]:
+    memories_ref = db.collection(users_collection).document(uid).collection(memories_collection)
+    docs = db.get_all([memories_ref.document(memory_id) for memory_id in memory_ids])
+    memories = {doc.id: doc.to_dict() for doc in docs if doc.exists}
+    return [memories[memory_id] for memory_id in memory_ids if memory_id in memories]
+
+
+def get_memory_contents(uid: str) -> List[dict]:
+    """id and content of every memory not deleted, for building the user's memory index"""
+    memories_ref = db.collection(users_collection).document(uid).collection(memories_collection)
+    query = memories_ref.where(filter=FieldFilter('deleted', '==', False)).select(['id', 'content'])
+    return [doc.to_dict() for doc in query.stream()]
+
+
 def get_user_public_memories(uid: str, limit: int = 100, offset: int = 0):
     print('get_public_memories', limit, offset)
 
@@ -126,14 +141,11 @@ def delete_memory(uid: str, memory_id: str):
     memory_ref.update({'deleted': True})
 
 
-def delete_all_memories(uid: str):
+def delete_all_memories(uid: str, on_progress: Callable[[int], None] = None) -> int:
     user_ref = db.collection(users_collection).document(uid)
     memories_ref = user_ref.collection(memories_collection)
     query = memories_ref.where(filter=FieldFilter('deleted', '==', False))
-    batch = db.batch()
-    for doc in query.stream():
-        batch.update(doc.reference, {'deleted': True})
-    batch.commit()
+    return bulk_update_query(query, {'deleted': True}, on_progress=on_progress)
 
 
 def delete_memories_for_conversation(uid: str, memory_id: str):
@@ -3,10 +3,16 @@ import asyncio
 from google.cloud.firestore_v1.base_query import FieldFilter
 from google.cloud.firestore import DELETE_FIELD
 from ._client import db
+from .redis_db import index_notification_user, unindex_notification_user
 
 
 def save_token(uid: str, data: dict):
     db.collection('users').document(uid).set(data, merge=True)
+    if data.get('fcm_token') and data.get('time_zone'):
+        index_notification_user(uid, data['time_zone'], data['fcm_token'])
+    elif 'fcm_token' in data and not data['fcm_token']:
+        # token cleared (e.g. on sign out)
+        unindex_notification_user(uid)
 
 
 def get_user_time_zone(uid: str):
@@ -31,6 +37,7 @@ def remove_token(token: str):
     token = db.collection('users').where(filter=FieldFilter('fcm_token', '==', token)).get()
     for doc in token:
         doc.reference.update({'fcm_token': DELETE_FIELD, 'time_zone': DELETE_FIELD})
+        unindex_notification_user(doc.id)
 
 
 def get_token(uid: str):
@@ -68,7 +75,7 @@ async def get_users_in_timezones(timezones: list[str], filter: str):
                     if filter == 'fcm_token':
                         token = doc.get('fcm_token')
                     else:
-                        token = doc.id, doc.get('fcm_token')
+                        token = doc.id, doc.get('fcm_token'), doc.get('time_zone')
                     if token:
                         chunk_users.append(token)
 
@@ -1,7 +1,7 @@
 import base64
 import json
 import os
-from typing import List, Union, Optional
+from typing import Dict, List, Tuple, Union, Optional
 
 import redis
 from redis.exceptions import ConnectionError, TimeoutError
@@ -411,6 +411,22 @@ def get_cached_signed_url(blob_path: str) -> str:
     return signed_url.decode()
 
 
+def get_cached_signed_urls(blob_paths: List[str]) -> dict:
+    if not blob_paths:
+        return {}
+    signed_urls = r.mget([f'urls:{blob_path}' for blob_path in blob_paths])
+    return {blob_path: url.decode() for blob_path, url in zip(blob_paths, signed_urls) if url}
+
+
+def cache_signed_urls(signed_urls: dict, ttl: int = 60 * 60):
+    if not signed_urls:
+        return
+    pipe = r.pipeline()
+    for blob_path, signed_url in signed_urls.items():
+        pipe.set(f'urls:{blob_path}', signed_url, ex=ttl - 1)
+    pipe.execute()
+
+
 def cache_user_geolocation(uid: str, geolocation: dict):
     r.set(f'users:{uid}:geolocation', str(geolocation))
     r.expire(f'users:{uid}:geolocation', 60 * 30)  # FIXME: too much?
@@ -633,3 +649,388 @@ def remove_user_auto_processing_cancelled(uid: str):
     print(f"🛑 AUTO_CANCEL: Removing auto-processing cancellation flag for user {uid}")
     r.delete(f'users:{uid}:auto_processing_cancelled')
     print(f"🛑 AUTO_CANCEL: Successfully removed auto-processing cancellation flag for user {uid}")
+
+
+# ******************************************************
+# **************** CONVERSATION IMAGES *****************
+# ******************************************************
+
+@try_catch_decorator
+def get_conversation_image_descriptions(conversation_id: str, prompt_key: str) -> dict:
+    """Vision descriptions of a conversation's images, {content hash: json of the description and fingerprint}"""
+    data = r.hgetall(f'conversations:{conversation_id}:image_fingerprints:{prompt_key}')
+    return {k.decode(): v.decode() for k, v in data.items()} if data else {}
+
+
+@try_catch_decorator
+def cache_conversation_image_descriptions(conversation_id: str, prompt_key: str, descriptions: dict,
+                                          ttl: int = 60 * 60 * 24 * 30):
+    if not descriptions:
+        return
+    key = f'conversations:{conversation_id}:image_fingerprints:{prompt_key}'
+    r.hset(key, mapping=descriptions)
+    r.expire(key, ttl)
+
+
+# progress events of an image upload, in the order images finish: users:{uid}:image_uploads:{upload_id} = [json]
+
+@try_catch_decorator
+def push_image_upload_progress(uid: str, upload_id: str, event: dict, ttl: int = 60 * 10):
+    key = f'users:{uid}:image_uploads:{upload_id}'
+    pipe = r.pipeline()
+    pipe.rpush(key, json.dumps(event))
+    pipe.expire(key, ttl)
+    pipe.execute()
+
+
+@try_catch_decorator
+def get_image_upload_progress(uid: str, upload_id: str, start: int = 0) -> List[dict]:
+    """Events from position start on"""
+    events = r.lrange(f'users:{uid}:image_uploads:{upload_id}', start, -1)
+    return [json.loads(event) for event in events]
+
+
+# ******************************************************
+# ******************* TTS AUDIO CACHE ******************
+# ******************************************************
+
+@try_catch_decorator
+def get_tts_cache_last_used(keys: List[str]) -> dict:
+    """Last use timestamp of the given TTS cache keys that are stored, {key: ts}"""
+    if not keys:
+        return {}
+    scores = r.zmscore('tts-cache:index', keys)
+    return {key: score for key, score in zip(keys, scores) if score is not None}
+
+
+@try_catch_decorator
+def touch_tts_cache_keys(keys: dict):
+    """Marks TTS cache keys as stored and used, {key: ts}"""
+    if keys:
+        r.zadd('tts-cache:index', keys)
+
+
+@try_catch_decorator
+def get_stale_tts_cache_keys(older_than: float, keep_newest: int, limit: int = 500) -> List[str]:
+    """Keys last used before older_than, plus the least recently used ones beyond keep_newest entries"""
+    stale = [k.decode() for k in r.zrangebyscore('tts-cache:index', '-inf', older_than, start=0, num=limit)]
+    overflow = r.zcard('tts-cache:index') - keep_newest
+    if overflow > len(stale):
+        stale += [k.decode() for k in r.zrange('tts-cache:index', len(stale), min(overflow, limit) - 1)]
+    return stale[:limit]
+
+
+@try_catch_decorator
+def remove_tts_cache_keys(keys: List[str]):
+    if keys:
+        r.zrem('tts-cache:index', *keys)
+
+
+# ******************************************************
+# ******************** CHAT CONTEXT ********************
+# ******************************************************
+
+@try_catch_decorator
+def get_chat_version(uid: str) -> int:
+    """Counter bumped by every write to the user's chat messages or sessions, 0 if never written"""
+    version = r.get(f'users:{uid}:chat_version')
+    return int(version) if version else 0
+
+
+@try_catch_decorator
+def bump_chat_version(uid: str) -> int:
+    return r.incr(f'users:{uid}:chat_version')
+
+
+# ******************************************************
+# *************** NOTIFICATION SCHEDULE ****************
+# ******************************************************
+
+# users with a push token, bucketed by time zone: notification-users:{time zone} = {uid: fcm token}
+# notification-users:time-zones = {uid: time zone} remembers each user's bucket
+
+@try_catch_decorator
+def index_notification_user(uid: str, time_zone: str, fcm_token: str):
+    previous = r.hget('notification-users:time-zones', uid)
+    pipe = r.pipeline()
+    if previous and previous.decode() != time_zone:
+        pipe.hdel(f'notification-users:{previous.decode()}', uid)
+    pipe.hset(f'notification-users:{time_zone}', uid, fcm_token)
+    pipe.hset('notification-users:time-zones', uid, time_zone)
+    pipe.execute()
+
+
+@try_catch_decorator
+def unindex_notification_user(uid: str):
+    previous = r.hget('notification-users:time-zones', uid)
+    pipe = r.pipeline()
+    if previous:
+        pipe.hdel(f'notification-users:{previous.decode()}', uid)
+    pipe.hdel('notification-users:time-zones', uid)
+    pipe.execute()
+
+
+@try_catch_decorator
+def scan_notification_users(time_zone: str, cursor: int = 0, count: int = 500):
+    """One page of a time zone's users, (next cursor, {uid: fcm token}), the scan is done when the cursor is 0"""
+    cursor, users = r.hscan(f'notification-users:{time_zone}', cursor=cursor, count=count)
+    return cursor, {uid.decode(): token.decode() for uid, token in users.items()}
+
+
+@try_catch_decorator
+def set_notification_index_ready():
+    r.set('notification-users:ready', '1')
+
+
+@try_catch_decorator
+def is_notification_index_ready() -> bool:
+    return r.get('notification-users:ready') is not None
+
+
+# ******************************************************
+# *********************** TRENDS ***********************
+# ******************************************************
+
+@try_catch_decorator
+def increment_trend_topic(category: dict, topic_id: str, topic: str, amount: int = 1):
+    """Counts one more conversation for a topic in the trends ranking, the cached snapshot catches up on expiry"""
+    pipe = r.pipeline()
+    pipe.hset('trends:categories', category['id'], json.dumps(category, default=str))
+    pipe.hset('trends:topics', topic_id, topic)
+    pipe.zincrby(f'trends:ranking:{category["id"]}', amount, topic_id)
+    pipe.execute()
+
+
+@try_catch_decorator
+def set_trend_rankings(categories: List[dict], topics: dict, rankings: dict):
+    """Replaces the whole ranking, rankings = {category id: {topic id: count}}, topics = {topic id: topic}"""
+    pipe = r.pipeline()
+    pipe.delete('trends:categories', 'trends:topics', 'trends:snapshot',
+                *[f'trends:ranking:{category["id"]}' for category in categories])
+    if categories:
+        pipe.hset('trends:categories', mapping={c['id']: json.dumps(c, default=str) for c in categories})
+    if topics:
+        pipe.hset('trends:topics', mapping=topics)
+    for category_id, counts in rankings.items():
+        if counts:
+            pipe.zadd(f'trends:ranking:{category_id}', counts)
+    pipe.set('trends:ready', '1')
+    pipe.execute()
+
+
+@try_catch_decorator
+def get_trend_rankings(top_k: int):
+    """(categories, {topic id: topic}, {category id: [(topic id, count)]}) with the top_k topics per category,
+    None when the ranking was never built"""
+    if not r.exists('trends:ready'):
+        return None
+    categories = [json.loads(c) for c in r.hvals('trends:categories')]
+    pipe = r.pipeline()
+    for category in categories:
+        pipe.zrevrange(f'trends:ranking:{category["id"]}', 0, top_k - 1, withscores=True)
+    rankings = {
+        category['id']: [(topic_id.decode(), int(count)) for topic_id, count in ranking]
+        for category, ranking in zip(categories, pipe.execute())
+    }
+    topic_ids = list({topic_id for ranking in rankings.values() for topic_id, _ in ranking})
+    names = r.hmget('trends:topics', topic_ids) if topic_ids else []
+    topics = {topic_id: name.decode() for topic_id, name in zip(topic_ids, names) if name}
+    return categories, topics, rankings
+
+
+@try_catch_decorator
+def get_trends_snapshot():
+    data = r.get('trends:snapshot')
+    return json.loads(data) if data else None
+
+
+@try_catch_decorator
+def cache_trends_snapshot(snapshot: list, ttl: int = 60):
+    r.set('trends:snapshot', json.dumps(snapshot, default=str), ex=ttl)
+
+
+# ******************************************************
+# ****************** PERSONA REBUILDS ******************
+# ******************************************************
+
+@try_catch_decorator
+def add_persona_pending_items(uid: str, count: int = 1) -> int:
+    """Counts memories and conversations not yet folded into the user's personas, returns the total"""
+    pipe = r.pipeline()
+    pipe.incrby(f'users:{uid}:persona_pending', count)
+    pipe.expire(f'users:{uid}:persona_pending', 60 * 60 * 24 * 7)
+    return pipe.execute()[0]
+
+
+@try_catch_decorator
+def get_persona_built_at(uid: str) -> Optional[float]:
+    built_at = r.get(f'users:{uid}:persona_built_at')
+    return float(built_at) if built_at else None
+
+
+@try_catch_decorator
+def set_persona_built(uid: str, built_at: float):
+    pipe = r.pipeline()
+    pipe.set(f'users:{uid}:persona_built_at', built_at, ex=60 * 60 * 24 * 7)
+    pipe.delete(f'users:{uid}:persona_pending')
+    pipe.execute()
+
+
+# deferred rebuilds, picked up by the next update or the cron once due: persona_rebuilds = {uid: due at}
+@try_catch_decorator
+def schedule_persona_rebuild(uid: str, due_at: float):
+    # an earlier due time already scheduled is kept
+    r.zadd('persona_rebuilds', {uid: due_at}, nx=True)
+
+
+@try_catch_decorator
+def get_due_persona_rebuilds(now: float, limit: int = 100) -> List[str]:
+    return [uid.decode() for uid in r.zrangebyscore('persona_rebuilds', 0, now, start=0, num=limit)]
+
+
+@try_catch_decorator
+def claim_persona_rebuild(uid: str) -> bool:
+    """True for the one caller that takes the scheduled rebuild"""
+    return r.zrem('persona_rebuilds', uid) == 1
+
+
+# ******************************************************
+# *************** DAILY DIGEST SUMMARIES ***************
+# ******************************************************
+
+# digests whose summary is behind, refreshed by the cron once due: daily_digest_summaries = {uid:date: due at}
+@try_catch_decorator
+def schedule_daily_digest_summary(uid: str, date: str, due_at: float):
+    # folds meanwhile are picked up by the refresh already scheduled
+    r.zadd('daily_digest_summaries', {f'{uid}:{date}': due_at}, nx=True)
+
+
+@try_catch_decorator
+def get_due_daily_digest_summaries(now: float, limit: int = 100) -> List[Tuple[str, str]]:
+    members = r.zrangebyscore('daily_digest_summaries', 0, now, start=0, num=limit)
+    return [tuple(member.decode().rsplit(':', 1)) for member in members]
+
+
+@try_catch_decorator
+def claim_daily_digest_summary(uid: str, date: str) -> bool:
+    """True for the one caller that takes the scheduled refresh"""
+    return r.zrem('daily_digest_summaries', f'{uid}:{date}') == 1
+
+
+# ******************************************************
+# ******************** CHAT HISTORY ********************
+# ******************************************************
+
+# recent messages of a chat thread, newest first: users:{uid}:chat_history:{thread} = [message json]
+# users:{uid}:chat_history_threads remembers the cached threads, so a delete can drop them all
+
+@try_catch_decorator
+def get_chat_history(uid: str, thread: str) -> Optional[List[dict]]:
+    """Cached messages of the thread, None when it is not cached"""
+    messages = r.lrange(f'users:{uid}:chat_history:{thread}', 0, -1)
+    if not messages:
+        return None
+    return [json.loads(message) for message in messages]
+
+
+@try_catch_decorator
+def cache_chat_history(uid: str, thread: str, messages: List[dict], version: int, ttl: int = 60 * 60 * 24) -> bool:
+    """Caches messages read from Firestore, unless the chat was written since version was read"""
+    key = f'users:{uid}:chat_history:{thread}'
+    version_key = f'users:{uid}:chat_version'
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(version_key)
+            current = pipe.get(version_key)
+            if (int(current) if current else 0) != version:
+                return False
+            pipe.multi()
+            pipe.delete(key)
+            pipe.rpush(key, *[json.dumps(message, default=str) for message in messages])
+            pipe.expire(key, ttl)
+            pipe.sadd(f'users:{uid}:chat_history_threads', thread)
+            pipe.expire(f'users:{uid}:chat_history_threads', ttl)
+            pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+
+@try_catch_decorator
+def push_chat_history_message(uid: str, threads: List[str], message: dict, max_messages: int):
+    """Adds a new message to the threads that are cached, the others are built on their next read"""
+    data = json.dumps(message, default=str)
+    pipe = r.pipeline()
+    for thread in threads:
+        pipe.lpushx(f'users:{uid}:chat_history:{thread}', data)
+        pipe.ltrim(f'users:{uid}:chat_history:{thread}', 0, max_messages - 1)
+    pipe.execute()
+
+
+@try_catch_decorator
+def clear_chat_history(uid: str):
+    threads = r.smembers(f'users:{uid}:chat_history_threads')
+    keys = [f'users:{uid}:chat_history:{thread.decode()}' for thread in threads]
+    r.delete(f'users:{uid}:chat_history_threads', *keys)
+
+
+# ******************************************************
+# ******************** DELETION JOBS *******************
+# ******************************************************
+
+@try_catch_decorator
+def delete_chat_keys(uid: str):
+    """Chat version, cached chat history and clear cutoffs of the user, account deletion drops them"""
+    keys = list(r.scan_iter(match=f'users:{uid}:chat_*', count=500))
+    if keys:
+        r.delete(*keys)
+
+
+@try_catch_decorator
+def acquire_deletion_job_lease(job_id: str, ttl: int) -> bool:
+    """True for the one instance that should run the job, the lease lapses if that instance dies"""
+    return bool(r.set(f'deletion_jobs:{job_id}:lease', 1, nx=True, ex=ttl))
+
+
+@try_catch_decorator
+def renew_deletion_job_lease(job_id: str, ttl: int):
+    r.expire(f'deletion_jobs:{job_id}:lease', ttl)
+
+
+@try_catch_decorator
+def release_deletion_job_lease(job_id: str):
+    r.delete(f'deletion_jobs:{job_id}:lease')
+
+
+# users:{uid}:chat_cleared:{plugin_id} = {chat session id, '' for a chat without one: cutoff}. A cleared chat's
+# messages stay hidden until its deletion job marked them deleted, there is no TTL so a job that fails or waits for
+# a retry never lets them back
+
+@try_catch_decorator
+def set_chat_cleared_at(uid: str, plugin_id: Optional[str], chat_session_id: Optional[str], cleared_at: float):
+    r.hset(f'users:{uid}:chat_cleared:{plugin_id or ""}', chat_session_id or '', cleared_at)
+
+
+@try_catch_decorator
+def remove_chat_cleared_at(uid: str, plugin_id: Optional[str], chat_session_id: Optional[str], cleared_at: float):
+    """Drops the cutoff once the job clearing up to it completed, unless a later clear moved it"""
+    key = f'users:{uid}:chat_cleared:{plugin_id or ""}'
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            current = pipe.hget(key, chat_session_id or '')
+            if current is None or float(current) != cleared_at:
+                return
+            pipe.multi()
+            pipe.hdel(key, chat_session_id or '')
+            pipe.execute()
+        except redis.WatchError:
+            # a later clear set a new cutoff meanwhile, it stays
+            pass
+
+
+@try_catch_decorator
+def get_chat_cleared_at(uid: str, plugin_id: Optional[str]) -> Dict[str, float]:
+    """Pending cutoffs of the chat with plugin_id, by chat session id ('' for a clear without a session)"""
+    cleared = r.hgetall(f'users:{uid}:chat_cleared:{plugin_id or ""}')
+    return {session_id.decode(): float(cleared_at) for session_id, cleared_at in cleared.items()}
@@ -1,47 +1,43 @@
+import random
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 from google.api_core.retry import Retry
 
+import database.redis_db as redis_db
 from models.conversation import Conversation
-from models.trend import Trend, valid_items
+from models.trend import Trend, TrendEnum, valid_items
 from ._client import db, document_id_from_seed
 
+# Counter documents per topic, each takes at most ~1 write/s so popular topics never contend on one document
+TOPIC_COUNTER_SHARDS = 10
+# Topics returned per category by /v1/trends
+TRENDS_TOP_K = 50
 
-def get_trends_data() -> List[Dict]:
-    trends_ref = db.collection('trends')
-    trends_docs = [doc for doc in trends_ref.stream(retry=Retry())]
-    trends_data = []
-    for category in trends_docs:
-        try:
-            category_data = category.to_dict()
-            if category_data['category'] not in ['ceo', 'company', 'software_product', 'hardware_product',
-                                                 'ai_product']:
-                continue
+trend_categories = [category.value for category in TrendEnum]
 
-            category_topics_ref = trends_ref.document(category_data['id']).collection('topics')
-            topics_docs = [topic.to_dict() for topic in category_topics_ref.stream(retry=Retry())]
-            cleaned_topics = []
-            topics = sorted(topics_docs, key=lambda e: len(e['memory_ids']), reverse=True)
-            for topic in topics:
-                if topic['topic'] not in valid_items:
-                    continue
-                topic['memories_count'] = len(topic['memory_ids'])
-                del topic['memory_ids']
-                cleaned_topics.append(topic)
-
-            category_data['topics'] = cleaned_topics
-            trends_data.append(category_data)
-        except Exception as e:
-            print(e)
-            continue
 
-    return trends_data
+# Layout, under trends/{category id}/topics/{topic id}:
+#   shards/{0..TOPIC_COUNTER_SHARDS-1}  {'count': n, 'days': {'YYYY-MM-DD': n}}, summed for the topic's totals
+#   conversations/{conversation id}     marker, a conversation counts once per topic even when reprocessed
+# The ranking served to clients is kept in Redis (redis_db TRENDS), incremented alongside the shards.
+
+
+def _ranking_category(category_data: dict) -> dict:
+    # stored as JSON in Redis, created_at in the same ISO format the API responds with
+    created_at = category_data.get('created_at')
+    return {**category_data, 'created_at': created_at.isoformat() if isinstance(created_at, datetime) else created_at}
+
+
+def _topic_ref(category_id: str, topic_id: str):
+    return db.collection('trends').document(category_id).collection('topics').document(topic_id)
 
 
 def save_trends(memory: Conversation, trends: List[Trend]):
     trends_coll_ref = db.collection('trends')
+    day = datetime.utcnow().strftime('%Y-%m-%d')
 
     for trend in trends:
         category = trend.category.value
@@ -49,17 +45,84 @@ def save_trends(memory: Conversation, trends: List[Trend]):
         trend_type = trend.type.value
         category_id = document_id_from_seed(category + trend_type)
         category_doc_ref = trends_coll_ref.document(category_id)
+        category_data = {"id": category_id, "category": category, "type": trend_type, "created_at": datetime.utcnow()}
 
-        category_doc_ref.set(
-            {"id": category_id, "category": category, "type": trend_type, "created_at": datetime.utcnow()},
-            merge=True
-        )
-
-        topics_coll_ref = category_doc_ref.collection('topics')
+        category_doc_ref.set(category_data, merge=True)
 
         for topic in topics:
             topic_id = document_id_from_seed(topic)
-            topic_doc_ref = topics_coll_ref.document(topic_id)
+            topic_doc_ref = _topic_ref(category_id, topic_id)
+
+            batch = db.batch()
+            batch.set(topic_doc_ref, {"id": topic_id, "topic": topic}, merge=True)
+            batch.create(topic_doc_ref.collection('conversations').document(memory.id), {"created_at": datetime.utcnow()})
+            shard_ref = topic_doc_ref.collection('shards').document(str(random.randrange(TOPIC_COUNTER_SHARDS)))
+            batch.set(shard_ref, {
+                'count': firestore.firestore.Increment(1),
+                'days': {day: firestore.firestore.Increment(1)},
+            }, merge=True)
+            try:
+                batch.commit()
+            except AlreadyExists:
+                # already counted, the conversation was reprocessed
+                continue
+            if topic in valid_items:
+                redis_db.increment_trend_topic(_ranking_category(category_data), topic_id, topic)
+
 
-            topic_doc_ref.set({"id": topic_id, "topic": topic}, merge=True)
-            topic_doc_ref.update({'memory_ids': firestore.firestore.ArrayUnion([memory.id])})
+def get_topic_counts(category_id: str, topic_id: str) -> Dict:
+    """Total and per day conversation counts of a topic, {'count': n, 'days': {'YYYY-MM-DD': n}}"""
+    total, days = 0, {}
+    for shard in _topic_ref(category_id, topic_id).collection('shards').stream(retry=Retry()):
+        data = shard.to_dict()
+        total += data.get('count', 0)
+        for day, count in (data.get('days') or {}).items():
+            days[day] = days.get(day, 0) + count
+    return {'count': total, 'days': days}
+
+
+def rebuild_trend_rankings() -> Optional[tuple]:
+    """Recounts every topic from its shards into the Redis ranking, for a cold cache or after a migration"""
+    categories, topics, rankings = [], {}, {}
+    for category in db.collection('trends').stream(retry=Retry()):
+        category_data = category.to_dict()
+        if category_data.get('category') not in trend_categories:
+            continue
+        categories.append(_ranking_category(category_data))
+        rankings[category_data['id']] = {}
+        for topic in category.reference.collection('topics').stream(retry=Retry()):
+            topic_data = topic.to_dict()
+            if topic_data.get('topic') not in valid_items:
+                continue
+            count = get_topic_counts(category_data['id'], topic_data['id'])['count']
+            if count:
+                topics[topic_data['id']] = topic_data['topic']
+                rankings[category_data['id']][topic_data['id']] = count
+    redis_db.set_trend_rankings(categories, topics, rankings)
+    return categories, topics, {
+        category_id: sorted(counts.items(), key=lambda e: e[1], reverse=True)[:TRENDS_TOP_K]
+        for category_id, counts in rankings.items()
+    }
+
+
+def get_trends_data() -> List[Dict]:
+    snapshot = redis_db.get_trends_snapshot()
+    if snapshot is not None:
+        return snapshot
+
+    rankings = redis_db.get_trend_rankings(TRENDS_TOP_K) or rebuild_trend_rankings()
+    categories, topics, ranked = rankings
+    trends_data = []
+    for category in categories:
+        if category.get('category') not in trend_categories:
+            continue
+        cleaned_topics = []
+        for topic_id, count in ranked.get(category['id'], []):
+            topic = topics.get(topic_id)
+            if topic not in valid_items:
+                continue
+            cleaned_topics.append({'id': topic_id, 'topic': topic, 'memories_count': count})
+        trends_data.append({**category, 'topics': cleaned_topics})
+
+    redis_db.cache_trends_snapshot(trends_data)
+    return trends_data
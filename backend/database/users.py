@@ -3,6 +3,8 @@ from datetime import datetime, timezone
 from google.cloud.firestore_v1 import FieldFilter
 
 from ._client import db, document_id_from_seed
+from .deletion_jobs import bulk_delete_collection
+from .redis_db import unindex_notification_user
 
 
 def is_exists_user(uid: str):
@@ -54,35 +56,29 @@ def delete_person(uid: str, person_id: str):
     person_ref.update({'deleted': True})
 
 
-def delete_user_data(uid: str):
-    # TODO: why dont we delete the whole document ref here?
+# what account deletion removes, each recursively (conversations take their transcript chunks and photos along)
+user_data_collections = [
+    'conversations', 'memories', 'facts', 'messages', 'processing_memories', 'chat_sessions', 'files', 'people',
+    'daily_digests',
+]
+
+
+def get_user_collections(uid: str) -> list:
     user_ref = db.collection('users').document(uid)
-    conversations_ref = user_ref.collection('memories')
-    # delete all conversations
-    batch = db.batch()
-    for doc in conversations_ref.stream():
-        batch.delete(doc.reference)
-    batch.commit()
-    # delete chat messages
-    messages_ref = user_ref.collection('messages')
-    batch = db.batch()
-    for doc in messages_ref.stream():
-        batch.delete(doc.reference)
-    batch.commit()
-    # delete memories
-    batch = db.batch()
-    memories_ref = user_ref.collection('facts')
-    for doc in memories_ref.stream():
-        batch.delete(doc.reference)
-    batch.commit()
-    # delete processing conversations
-    processing_conversations_ref = user_ref.collection('processing_memories')
-    batch = db.batch()
-    for doc in processing_conversations_ref.stream():
-        batch.delete(doc.reference)
-    batch.commit()
-    # delete user
-    user_ref.delete()
+    return [user_ref.collection(name) for name in user_data_collections]
+
+
+def delete_user_document(uid: str):
+    db.collection('users').document(uid).delete()
+    # the push token went with the document, the notification buckets must not keep it
+    unindex_notification_user(uid)
+
+
+def delete_user_data(uid: str):
+    """The user data collections and then the user, account deletion runs it as a job (utils/deletion_jobs.py)"""
+    for collection_ref in get_user_collections(uid):
+        bulk_delete_collection(collection_ref)
+    delete_user_document(uid)
     return {'status': 'ok', 'message': 'Account deleted successfully'}
 
 
@@ -2,7 +2,7 @@ import json
 import os
 from collections import defaultdict
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import List, Tuple
 
 from pinecone import Pinecone
 
@@ -71,14 +71,15 @@ def upsert_vectors(
     print('upsert_vectors', res)
 
 
-def query_vectors(query: str, uid: str, starts_at: int = None, ends_at: int = None, k: int = 5) -> List[str]:
+def query_vectors(query: str, uid: str, starts_at: int = None, ends_at: int = None, k: int = 5,
+                  vector: List[float] = None) -> List[str]:
     try:
         filter_data = {'uid': uid}
         if starts_at is not None:
             filter_data['created_at'] = {'$gte': starts_at, '$lte': ends_at}
 
         # print('filter_data', filter_data)
-        xq = embeddings.embed_query(query)
+        xq = vector if vector is not None else embeddings.embed_query(query)
         xc = index.query(vector=xq, top_k=k, include_metadata=False, filter=filter_data, namespace="ns1")
         # print(xc)
         return [item['id'].replace(f'{uid}-', '') for item in xc['matches']]
@@ -166,3 +167,42 @@ def delete_vector(conversation_id: str):
     # TODO: does this work?
     result = index.delete(ids=[conversation_id], namespace="ns1")
     print('delete_vector', result)
+
+
+# ************************************************
+# ************* MEMORIES (FACTS) INDEX ***********
+# ************************************************
+
+# Pinecone upserts are limited by request size, 1024 dimension vectors fit ~100 per request
+MEMORY_VECTORS_UPSERT_BATCH = 100
+
+
+def _memories_namespace(uid: str) -> str:
+    return f'memories-{uid}'
+
+
+def upsert_memory_vectors(uid: str, memory_ids: List[str], vectors: List[List[float]]):
+    data = [{'id': memory_id, 'values': vector} for memory_id, vector in zip(memory_ids, vectors)]
+    for i in range(0, len(data), MEMORY_VECTORS_UPSERT_BATCH):
+        index.upsert(vectors=data[i:i + MEMORY_VECTORS_UPSERT_BATCH], namespace=_memories_namespace(uid))
+    print('upsert_memory_vectors', uid, len(data))
+
+
+def query_memory_vectors(uid: str, vector: List[float], k: int) -> List[Tuple[str, float]]:
+    """(memory id, cosine similarity) of the k nearest memories"""
+    xc = index.query(vector=vector, top_k=k, include_values=False, include_metadata=False,
+                     namespace=_memories_namespace(uid))
+    return [(item['id'], item['score']) for item in xc['matches']]
+
+
+def delete_memory_vectors(uid: str, memory_ids: List[str]):
+    index.delete(ids=memory_ids, namespace=_memories_namespace(uid))
+
+
+def delete_memories_namespace(uid: str):
+    """Drops every memory vector of the user, a namespace that was never written to is fine"""
+    try:
+        index.delete(delete_all=True, namespace=_memories_namespace(uid))
+    except Exception as e:
+        if 'not found' not in str(e).lower():
+            raise
@@ -9,6 +9,7 @@ from routers import workflow, chat, firmware, plugins, transcribe, notifications
     speech_profile, agents, users, processing_conversations, trends, sync, apps, custom_auth, \
     payment, integration, conversations, memories, mcp, agent_conversations, tts
 
+from utils.deletion_jobs import start_deletion_job_sweeper
 from utils.other.timeout import TimeoutMiddleware
 
 if os.environ.get('SERVICE_ACCOUNT_JSON'):
@@ -59,6 +60,12 @@ methods_timeout = {
 
 app.add_middleware(TimeoutMiddleware,methods_timeout=methods_timeout)
 
+
+@app.on_event('startup')
+def resume_deletion_jobs():
+    # jobs interrupted by a restart or a crashed instance
+    start_deletion_job_sweeper()
+
 modal_app = App(
     name='backend',
     secrets=[Secret.from_name("gcp-credentials"), Secret.from_name('envs')],
@@ -0,0 +1,39 @@
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import database.memories as memories_db
+from database._client import db
+from utils.llms.memory_index import index_memories
+
+
+def migration_memory_vectors():
+    """
+    Embeds the memories of every user into their Pinecone namespace (utils/llms/memory_index.py).
+    Memories saved after the deploy are indexed when written, re-running only re-embeds.
+    """
+    last_doc = None
+    limit = 500
+    users_count = 0
+    memories_count = 0
+    while True:
+        print(f"running...users...{users_count}...memories...{memories_count}")
+        users_ref = db.collection('users').order_by(FieldPath.document_id(), direction=firestore.Query.ASCENDING)
+        if last_doc:
+            users_ref = users_ref.start_after(last_doc)
+        users = list(users_ref.select([]).limit(limit).stream())
+        if not users:
+            break
+        last_doc = users[-1]
+
+        for user in users:
+            memories = [memory for memory in memories_db.get_memory_contents(user.id) if memory.get('content')]
+            for i in range(0, len(memories), 500):
+                index_memories(user.id, memories[i:i + 500])
+            users_count += 1
+            memories_count += len(memories)
+
+    print(f"indexed {memories_count} memories of {users_count} users")
+
+
+if __name__ == '__main__':
+    migration_memory_vectors()
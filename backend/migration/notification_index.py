@@ -0,0 +1,41 @@
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import database.redis_db as redis_db
+from database._client import db
+
+
+def migration_notification_index():
+    """
+    Buckets every user with a push token by time zone in Redis, for utils/other/notification_schedule.py.
+    The cron reads the index once it is marked ready, until then it keeps querying Firestore.
+    """
+    last_doc = None
+    limit = 1000
+    indexed = 0
+    while True:
+        print(f"running...users...{indexed}")
+        users_ref = (
+            db.collection('users')
+            .order_by(FieldPath.document_id(), direction=firestore.Query.ASCENDING)
+            .select(['fcm_token', 'time_zone'])
+        )
+        if last_doc:
+            users_ref = users_ref.start_after(last_doc)
+        users = list(users_ref.limit(limit).stream())
+        if not users:
+            break
+        last_doc = users[-1]
+
+        for user in users:
+            data = user.to_dict()
+            if data.get('fcm_token') and data.get('time_zone'):
+                redis_db.index_notification_user(user.id, data['time_zone'], data['fcm_token'])
+                indexed += 1
+
+    redis_db.set_notification_index_ready()
+    print(f"indexed {indexed} users")
+
+
+if __name__ == '__main__':
+    migration_notification_index()
@@ -0,0 +1,62 @@
+import time
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from database._client import db
+from database.conversations import update_conversation_segments
+
+
+def migration_transcript_chunks():
+    """
+    Moves inline transcript_segments of every conversation into transcript_chunks documents.
+    Conversations already chunked are skipped, so the migration can be stopped and re-run at any point.
+    """
+    last_user = None
+    user_limit = 400
+    migrated = 0
+    while True:
+        print(f"running...user...{last_user.id if last_user else ''}")
+        users_ref = (
+            db.collection('users')
+            .order_by(FieldPath.document_id(), direction=firestore.Query.ASCENDING)
+        )
+        if last_user:
+            users_ref = users_ref.start_after(last_user)
+        users = list(users_ref.limit(user_limit).stream())
+        if not users or len(users) == 0:
+            print("no users")
+            break
+        last_user = users[-1]
+        for user in users:
+            last_doc = None
+            limit = 100
+            while True:
+                print(f"running...user...{user.id}...conversations...{last_doc.id if last_doc else ''}")
+                conversations_ref = (
+                    db.collection('users').document(user.id).collection('conversations')
+                    .order_by(FieldPath.document_id(), direction=firestore.Query.ASCENDING)
+                    .select(['transcript_chunked'])
+                )
+                if last_doc:
+                    conversations_ref = conversations_ref.start_after(last_doc)
+                docs = list(conversations_ref.limit(limit).stream())
+                if not docs or len(docs) == 0:
+                    break
+                last_doc = docs[-1]
+
+                for doc in docs:
+                    if doc.to_dict().get('transcript_chunked'):
+                        continue
+                    # the full document is only read for conversations still in the inline format
+                    conversation = doc.reference.get().to_dict()
+                    segments = conversation.get('transcript_segments') or []
+                    update_conversation_segments(user.id, doc.id, segments)
+                    migrated += 1
+                time.sleep(.01)
+
+    print(f"migrated {migrated} conversations")
+
+
+if __name__ == '__main__':
+    migration_transcript_chunks()
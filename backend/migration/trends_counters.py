@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from google.cloud.firestore import DELETE_FIELD, Increment
+
+from database._client import db
+from database.trends import rebuild_trend_rankings
+
+
+def migration_trends_counters():
+    """
+    Moves the memory_ids arrays of trend topics to a counter shard plus one marker per conversation,
+    then rebuilds the Redis ranking. Topics already migrated have no memory_ids left and are skipped.
+    """
+    migrated = 0
+    for category in db.collection('trends').stream():
+        for topic in category.reference.collection('topics').stream():
+            memory_ids = topic.to_dict().get('memory_ids')
+            if memory_ids is None:
+                continue
+            print(f"running...topic...{topic.id}...{len(memory_ids)}")
+            markers_ref = topic.reference.collection('conversations')
+            for i in range(0, len(memory_ids), 400):
+                batch = db.batch()
+                for memory_id in memory_ids[i:i + 400]:
+                    batch.set(markers_ref.document(memory_id), {'created_at': datetime.utcnow()})
+                batch.commit()
+
+            # history has no per day breakdown, all of it is counted on the migration day.
+            # added to the shard, conversations counted since the deploy may already be in it
+            batch = db.batch()
+            batch.set(topic.reference.collection('shards').document('0'), {
+                'count': Increment(len(memory_ids)),
+                'days': {datetime.utcnow().strftime('%Y-%m-%d'): Increment(len(memory_ids))},
+            }, merge=True)
+            batch.update(topic.reference, {'memory_ids': DELETE_FIELD})
+            batch.commit()
+            migrated += 1
+
+    rebuild_trend_rankings()
+    print(f"migrated {migrated} topics")
+
+
+if __name__ == '__main__':
+    migration_trends_counters()
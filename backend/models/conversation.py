@@ -241,6 +241,9 @@ class Conversation(BaseModel):
 
     structured: Structured
     transcript_segments: List[TranscriptSegment] = []
+    # stored in transcript_chunks documents instead of inline, see database.conversations
+    transcript_chunked: bool = False
+    transcript_segments_count: int = 0
     geolocation: Optional[Geolocation] = None
     photos: List[ConversationPhoto] = []
 
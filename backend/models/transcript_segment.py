@@ -1,8 +1,22 @@
+from collections import OrderedDict
 from datetime import timedelta
-from typing import Optional, List
+from typing import Optional, List, Iterable, Dict, Union
+import sys
+import threading
 import uuid
+
+import numpy as np
 from pydantic import BaseModel, Field
 
+# Rendered transcripts, shared by every thread of the process {(rendered segment fields, timestamps, user name): text}
+RENDER_CACHE_MAX_CHARS = 16 * 1024 * 1024
+# Shorter transcripts are cheaper to render than to cache
+RENDER_CACHE_MIN_SEGMENTS = 20
+
+_render_lock = threading.Lock()
+_rendered: OrderedDict = OrderedDict()
+_rendered_chars = 0
+
 
 class Translation(BaseModel):
     lang: str
@@ -32,22 +46,50 @@ class TranscriptSegment(BaseModel):
 
     @staticmethod
     def segments_as_string(segments, include_timestamps=False, user_name: str = None):
+        """
+        Long transcripts are rendered once per version of the segment list: the key holds the fields every segment is
+        rendered from, so appending, replacing or editing any segment renders again, while repeated calls return the
+        cached text. Hashing it stays cheap, strings cache their hash and unchanged texts are the same objects.
+        """
+        key = None
+        if len(segments) >= RENDER_CACHE_MIN_SEGMENTS:
+            if include_timestamps:
+                fields = tuple((s.text, s.is_user, s.speaker_id, s.start, s.end) for s in segments)
+            else:
+                fields = tuple((s.text, s.is_user, s.speaker_id) for s in segments)
+            key = (fields, include_timestamps, user_name)
+            with _render_lock:
+                transcript = _rendered.get(key)
+                if transcript is not None:
+                    _rendered.move_to_end(key)
+                    return transcript
+
+        transcript = TranscriptSegment._render(segments, include_timestamps, user_name)
+        if key is not None:
+            _cache_rendered(key, transcript)
+        return transcript
+
+    @staticmethod
+    def _render(segments, include_timestamps=False, user_name: str = None):
         if not user_name:
             user_name = 'User'
-        transcript = ''
         include_timestamps = include_timestamps and TranscriptSegment.can_display_seconds(segments)
+        lines = []
         for segment in segments:
             segment_text = segment.text.strip()
             timestamp_str = f'[{segment.get_timestamp_string()}] ' if include_timestamps else ''
-            transcript += f'{timestamp_str}{user_name if segment.is_user else f"Speaker {segment.speaker_id}"}: {segment_text}\n\n'
-        return transcript.strip()
+            lines.append(f'{timestamp_str}{user_name if segment.is_user else f"Speaker {segment.speaker_id}"}: {segment_text}')
+        return '\n\n'.join(lines).strip()
 
     @staticmethod
     def can_display_seconds(segments):
-        for i in range(len(segments)):
-            for j in range(i + 1, len(segments)):
-                if segments[i].start > segments[j].end or segments[i].end > segments[j].start:
-                    return False
+        # no segment may start or end after a later one ends or starts, checked against running maxima in O(n)
+        max_start = max_end = float('-inf')
+        for segment in segments:
+            if max_start > segment.end or max_end > segment.start:
+                return False
+            max_start = max(max_start, segment.start)
+            max_end = max(max_end, segment.end)
         return True
 
     @staticmethod
@@ -98,6 +140,158 @@ class TranscriptSegment(BaseModel):
         return segments, (starts,ends)
 
 
+def _cache_rendered(key, transcript: str):
+    global _rendered_chars
+    with _render_lock:
+        if key in _rendered:
+            return
+        _rendered[key] = transcript
+        _rendered_chars += len(transcript)
+        while _rendered_chars > RENDER_CACHE_MAX_CHARS and _rendered:
+            _, evicted = _rendered.popitem(last=False)
+            _rendered_chars -= len(evicted)
+
+
+class CompactTranscript:
+    """
+    Columnar, array backed transcript segments for the hot paths (listen loop, long transcripts).
+    start/end/is_user live in numpy arrays, speakers are interned and stored as indexes, texts in a plain list.
+    Segments become TranscriptSegment models only when asked for (to_segments, indexing), at API boundaries.
+    """
+
+    __slots__ = ('ids', 'texts', 'starts', 'ends', 'is_user', 'speaker_index', 'speakers', 'speaker_ids',
+                 'person_ids', 'translations')
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.starts = np.zeros(0, dtype=np.float64)
+        self.ends = np.zeros(0, dtype=np.float64)
+        self.is_user = np.zeros(0, dtype=np.bool_)
+        self.speaker_index = np.zeros(0, dtype=np.uint16)
+        # interned speaker labels, speaker_index points into them
+        self.speakers: List[Optional[str]] = []
+        self.speaker_ids: List[int] = []
+        self.person_ids: List[Optional[str]] = []
+        # sparse, only segments that have translations {position: [{lang, text}]}
+        self.translations: Dict[int, List[dict]] = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _intern_speaker(self, speaker: Optional[str], lookup: Dict[Optional[str], int]) -> int:
+        index = lookup.get(speaker)
+        if index is None:
+            index = lookup[speaker] = len(self.speakers)
+            self.speakers.append(sys.intern(speaker) if speaker else speaker)
+            self.speaker_ids.append(int(speaker.split('_')[1]) if speaker else 0)
+        return index
+
+    @staticmethod
+    def from_dicts(segments: Iterable[dict]) -> 'CompactTranscript':
+        """Builds the columns straight from stored/STT segment dicts, without creating any pydantic model"""
+        transcript = CompactTranscript()
+        lookup: Dict[Optional[str], int] = {}
+        starts, ends, is_user, speaker_index = [], [], [], []
+        for i, segment in enumerate(segments):
+            transcript.ids.append(segment.get('id') or str(uuid.uuid4()))
+            transcript.texts.append(segment['text'])
+            starts.append(segment['start'])
+            ends.append(segment['end'])
+            is_user.append(segment['is_user'])
+            speaker_index.append(transcript._intern_speaker(segment.get('speaker', 'SPEAKER_00'), lookup))
+            transcript.person_ids.append(segment.get('person_id'))
+            if segment.get('translations'):
+                transcript.translations[i] = [
+                    t.dict() if isinstance(t, Translation) else dict(t) for t in segment['translations']
+                ]
+        transcript.starts = np.array(starts, dtype=np.float64)
+        transcript.ends = np.array(ends, dtype=np.float64)
+        transcript.is_user = np.array(is_user, dtype=np.bool_)
+        transcript.speaker_index = np.array(speaker_index, dtype=np.uint16)
+        return transcript
+
+    @staticmethod
+    def from_segments(segments: Iterable[TranscriptSegment]) -> 'CompactTranscript':
+        return CompactTranscript.from_dicts(segment.__dict__ for segment in segments)
+
+    def shift(self, seconds: float) -> 'CompactTranscript':
+        """Moves every segment by seconds, in place, as one array operation"""
+        if seconds:
+            self.starts += seconds
+            self.ends += seconds
+        return self
+
+    def _segment_dict(self, i: int) -> dict:
+        speaker = int(self.speaker_index[i])
+        return {
+            'id': self.ids[i],
+            'text': self.texts[i],
+            'speaker': self.speakers[speaker],
+            'speaker_id': self.speaker_ids[speaker],
+            'is_user': bool(self.is_user[i]),
+            'person_id': self.person_ids[i],
+            'start': float(self.starts[i]),
+            'end': float(self.ends[i]),
+            'translations': [dict(t) for t in self.translations.get(i, [])],
+        }
+
+    def to_dicts(self) -> List[dict]:
+        """Same shape as TranscriptSegment.dict(), for storage and websocket payloads"""
+        return [self._segment_dict(i) for i in range(len(self))]
+
+    def to_segments(self) -> List[TranscriptSegment]:
+        return [TranscriptSegment(**self._segment_dict(i)) for i in range(len(self))]
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            start, stop, _ = i.indices(len(self))
+            part = CompactTranscript()
+            part.ids, part.texts, part.person_ids = self.ids[i], self.texts[i], self.person_ids[i]
+            part.starts, part.ends = self.starts[i].copy(), self.ends[i].copy()
+            part.is_user, part.speaker_index = self.is_user[i].copy(), self.speaker_index[i].copy()
+            part.speakers, part.speaker_ids = self.speakers, self.speaker_ids
+            part.translations = {k - start: v for k, v in self.translations.items() if start <= k < stop}
+            return part
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('transcript segment index out of range')
+        return TranscriptSegment(**self._segment_dict(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TranscriptSegment(**self._segment_dict(i))
+
+    def can_display_seconds(self) -> bool:
+        """TranscriptSegment.can_display_seconds in O(n): no segment may start or end after a later one begins/ends"""
+        if len(self) < 2:
+            return True
+        return bool(np.all(np.maximum.accumulate(self.starts)[:-1] <= self.ends[1:]) and
+                    np.all(np.maximum.accumulate(self.ends)[:-1] <= self.starts[1:]))
+
+    def as_string(self, include_timestamps=False, user_name: str = None) -> str:
+        """Same output as TranscriptSegment.segments_as_string"""
+        if not user_name:
+            user_name = 'User'
+        include_timestamps = include_timestamps and self.can_display_seconds()
+        speaker_names = [f'Speaker {speaker_id}' for speaker_id in self.speaker_ids]
+        is_user = self.is_user.tolist()
+        speaker_index = self.speaker_index.tolist()
+        if include_timestamps:
+            starts = self.starts.astype(np.int64).tolist()
+            ends = self.ends.astype(np.int64).tolist()
+        lines = []
+        for i, text in enumerate(self.texts):
+            name = user_name if is_user[i] else speaker_names[speaker_index[i]]
+            if include_timestamps:
+                timestamp = f'{timedelta(seconds=starts[i])} - {timedelta(seconds=ends[i])}'
+                lines.append(f'[{timestamp}] {name}: {text.strip()}')
+            else:
+                lines.append(f'{name}: {text.strip()}')
+        return '\n\n'.join(lines).strip()
+
+
 class ImprovedTranscriptSegment(BaseModel):
     speaker_id: int = Field(..., description='The correctly assigned speaker id')
     text: str = Field(..., description='The corrected text of the segment')
@@ -7,3 +7,17 @@ class WebhookType(str, Enum):
     realtime_transcript = 'realtime_transcript'
     memory_created = 'memory_created',
     day_summary = 'day_summary'
+
+
+class DeletionJobKind(str, Enum):
+    account = 'account'
+    chat = 'chat'
+    memories = 'memories'
+    recordings = 'recordings'
+
+
+class DeletionJobStatus(str, Enum):
+    pending = 'pending'
+    running = 'running'
+    completed = 'completed'
+    failed = 'failed'
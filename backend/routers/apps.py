@@ -102,11 +102,7 @@ def create_app(app_data: str = Form(...), file: UploadFile = File(...), uid=Depe
                 if action.get('action') not in [action_type.value for action_type in ActionType]:
                     raise HTTPException(status_code=422,
                                         detail=f'Unsupported action type. Supported types: {", ".join([action_type.value for action_type in ActionType])}')
-    os.makedirs(f'_temp/plugins', exist_ok=True)
-    file_path = f"_temp/plugins/{file.filename}"
-    with open(file_path, 'wb') as f:
-        f.write(file.file.read())
-    img_url = upload_plugin_logo(file_path, data['id'])
+    img_url = upload_plugin_logo(file.file, data['id'])
     data['image'] = img_url
     data['created_at'] = datetime.now(timezone.utc)
 
@@ -156,11 +152,7 @@ async def create_persona(persona_data: str = Form(...), file: UploadFile = File(
         data['connected_accounts'] = ['omi']
     data['persona_prompt'] = await generate_persona_prompt(uid, data)
     data['description'] = generate_persona_desc(uid, data['name'])
-    os.makedirs(f'_temp/plugins', exist_ok=True)
-    file_path = f"_temp/plugins/{file.filename}"
-    with open(file_path, 'wb') as f:
-        f.write(file.file.read())
-    img_url = upload_plugin_logo(file_path, data['id'])
+    img_url = upload_plugin_logo(file.file, data['id'])
     data['image'] = img_url
     data['created_at'] = datetime.now(timezone.utc)
 
@@ -189,11 +181,7 @@ async def update_persona(persona_id: str, persona_data: str = Form(...), file: U
         if 'image' in persona and len(persona['image']) > 0 and \
                 persona['image'].startswith('https://storage.googleapis.com/'):
             delete_plugin_logo(persona['image'])
-        os.makedirs(f'_temp/plugins', exist_ok=True)
-        file_path = f"_temp/plugins/{file.filename}"
-        with open(file_path, 'wb') as f:
-            f.write(file.file.read())
-        img_url = upload_plugin_logo(file_path, persona_id)
+        img_url = upload_plugin_logo(file.file, persona_id)
         data['image'] = img_url
 
     save_username(data['username'], uid)
@@ -316,11 +304,7 @@ def update_app(app_id: str, app_data: str = Form(...), file: UploadFile = File(N
         if 'image' in plugin and len(plugin['image']) > 0 and \
                 plugin['image'].startswith('https://storage.googleapis.com/'):
             delete_plugin_logo(plugin['image'])
-        os.makedirs(f'_temp/plugins', exist_ok=True)
-        file_path = f"_temp/plugins/{file.filename}"
-        with open(file_path, 'wb') as f:
-            f.write(file.file.read())
-        img_url = upload_plugin_logo(file_path, app_id)
+        img_url = upload_plugin_logo(file.file, app_id)
         data['image'] = img_url
     data['updated_at'] = datetime.now(timezone.utc)
 
@@ -875,27 +859,15 @@ async def upload_app_thumbnail_endpoint(
     Returns:
         Dict with thumbnail URL
     """
-    # Save uploaded file temporarily
     thumbnail_id = str(ULID())
-    os.makedirs('_temp/thumbnails', exist_ok=True)
-    temp_path = f'_temp/thumbnails/{thumbnail_id}.jpg'
 
-    try:
-        with open(temp_path, 'wb') as f:
-            f.write(await file.read())
-
-        # Upload to cloud storage
-        url = upload_app_thumbnail(temp_path, thumbnail_id)
-
-        return {
-            'thumbnail_url': url,
-            'thumbnail_id': thumbnail_id
-        }
+    # Stream the upload straight to cloud storage
+    url = await asyncio.to_thread(upload_app_thumbnail, file.file, thumbnail_id)
 
-    finally:
-        # Cleanup temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    return {
+        'thumbnail_url': url,
+        'thumbnail_id': thumbnail_id
+    }
 
 
 def delete_persona(persona_id: str, secret_key: str = Header(...)):
@@ -1,3 +1,5 @@
+import asyncio
+import threading
 import uuid
 import re
 import base64
@@ -15,8 +17,11 @@ from models.app import App, UsageHistoryType
 from models.chat import ChatSession, Message, SendMessageRequest, MessageSender, ResponseMessage, MessageConversation, \
     FileChat
 from models.conversation import Conversation
+from models.users import DeletionJobKind
 from routers.sync import retrieve_file_paths, decode_files_to_wav, retrieve_vad_segments
+from utils import chat_context
 from utils.apps import get_available_app_by_id
+from utils.deletion_jobs import start_deletion_job
 from utils.chat import process_voice_message_segment, process_voice_message_segment_stream, transcribe_voice_message_segment
 from utils.llm import initial_chat_message, initial_persona_chat_message
 from utils.other import endpoints as auth, storage
@@ -51,7 +56,7 @@ def acquire_chat_session(uid: str, plugin_id: Optional[str] = None):
 
 
 @router.post('/v2/messages', tags=['chat'], response_model=ResponseMessage)
-def send_message(
+async def send_message(
         data: SendMessageRequest, plugin_id: Optional[str] = None, uid: str = Depends(auth.get_current_user_uid)
 ):
     print('send_message', data.text, plugin_id, uid)
@@ -59,40 +64,54 @@ def send_message(
     if plugin_id in ['null', '']:
         plugin_id = None
 
-    # get chat session
-    chat_session = chat_db.get_chat_session(uid, plugin_id=plugin_id)
-    chat_session = ChatSession(**chat_session) if chat_session else None
+    # everything the answer depends on is read at once, the context mostly comes from the per-user cache
+    reads = [
+        chat_context.load_chat_context(uid, plugin_id),
+        asyncio.to_thread(chat_context.get_time_zone, uid),
+        asyncio.to_thread(get_available_app_by_id, plugin_id, uid) if plugin_id else asyncio.sleep(0),
+        asyncio.to_thread(chat_db.get_chat_files, uid, data.file_ids) if data.file_ids else asyncio.sleep(0),
+    ]
+    context, tz, app, files = await asyncio.gather(*reads)
+    chat_session = context.chat_session
 
     message = Message(
         id=str(uuid.uuid4()), text=data.text, created_at=datetime.now(timezone.utc), sender='human', type='text',
         plugin_id=plugin_id
     )
+    session_file_ids = []
     if data.file_ids is not None:
         new_file_ids = fc.retrieve_new_file(data.file_ids)
         if chat_session:
             new_file_ids = chat_session.retrieve_new_file(data.file_ids)
             chat_session.add_file_ids(data.file_ids)
-            chat_db.add_files_to_chat_session(uid, chat_session.id, data.file_ids)
+            session_file_ids = data.file_ids
 
         if len(new_file_ids) > 0:
             message.files_id = new_file_ids
-            files = chat_db.get_chat_files(uid, new_file_ids)
-            files = [FileChat(**f) if f else None for f in files]
-            message.files = files
+            files = [f for f in files or [] if f and f.get('id') in new_file_ids]
+            message.files = [FileChat(**f) for f in files]
             fc.add_files(new_file_ids)
 
     if chat_session:
         message.chat_session_id = chat_session.id
-        chat_db.add_message_to_chat_session(uid, chat_session.id, message.id)
+        chat_session.message_ids = (chat_session.message_ids or []) + [message.id]
 
-    chat_db.add_message(uid, message.dict())
+    def store_human_message():
+        if chat_session:
+            chat_db.add_files_to_chat_session(uid, chat_session.id, session_file_ids)
+            chat_db.add_message_to_chat_session(uid, chat_session.id, message.id)
+        chat_db.add_message(uid, message.dict())
+        chat_context.messages_written(uid, plugin_id, [message], chat_session=chat_session)
+
+    # the answer does not wait for the human message to be stored
+    human_message_write = threading.Thread(target=store_human_message)
+    human_message_write.start()
 
-    app = get_available_app_by_id(plugin_id, uid)
     app = App(**app) if app else None
 
     app_id = app.id if app else None
 
-    messages = list(reversed([Message(**msg) for msg in chat_db.get_messages(uid, limit=10, plugin_id=plugin_id)]))
+    messages = (context.messages + [message])[-chat_context.CHAT_CONTEXT_MESSAGES:]
 
     def process_message(response: str, callback_data: dict):
         memories = callback_data.get('memories_found', [])
@@ -115,9 +134,12 @@ def send_message(
             plugin_id=plugin_id,
             type='text',
             memories_id=memories_id,
+            memories=[MessageConversation(**m) for m in (memories if len(memories) < 5 else memories[:5])],
         )
+        # keeps the human message before the answer, in storage and in the cached context
+        human_message_write.join()
         chat_db.add_message(uid, ai_message.dict())
-        ai_message.memories = [MessageConversation(**m) for m in (memories if len(memories) < 5 else memories[:5])]
+        chat_context.messages_written(uid, plugin_id, [ai_message])
 
         if plugin_id:
             record_app_usage(uid, plugin_id, UsageHistoryType.chat_message_sent, message_id=ai_message.id)
@@ -129,7 +151,8 @@ def send_message(
     async def generate_stream():
         callback_data = {}
         try:
-            async for chunk in execute_graph_chat_stream(uid, messages, app, cited=True, callback_data=callback_data, chat_session=chat_session):
+            async for chunk in execute_graph_chat_stream(uid, messages, app, cited=True, callback_data=callback_data,
+                                                         chat_session=chat_session, tz=tz):
                 if chunk:
                     msg = chunk.replace("\n", "__CRLF__")
                     yield f'{msg}\n\n'
@@ -142,7 +165,7 @@ def send_message(
                         callback_data['memories_found'] = []
                         callback_data['ask_for_nps'] = False
                     
-                    ai_message, ask_for_nps = process_message(response, callback_data)
+                    ai_message, ask_for_nps = await asyncio.to_thread(process_message, response, callback_data)
                     ai_message_dict = ai_message.dict()
                     response_message = ResponseMessage(**ai_message_dict)
                     response_message.ask_for_nps = ask_for_nps
@@ -157,7 +180,7 @@ def send_message(
             callback_data['memories_found'] = []
             callback_data['ask_for_nps'] = False
             
-            ai_message, ask_for_nps = process_message(response, callback_data)
+            ai_message, ask_for_nps = await asyncio.to_thread(process_message, response, callback_data)
             ai_message_dict = ai_message.dict()
             response_message = ResponseMessage(**ai_message_dict)
             response_message.ask_for_nps = ask_for_nps
@@ -235,8 +258,8 @@ def send_message_v1(
         memories_id=memories_id,
     )
 
+    ai_message.memories = [MessageConversation.model_validate(m, from_attributes=True) for m in memories[:5]]
     chat_db.add_message(uid, ai_message.dict())
-    ai_message.memories = memories if len(memories) < 5 else memories[:5]
     if app_id:
         record_app_usage(uid, app_id, UsageHistoryType.chat_message_sent, message_id=ai_message.id)
 
@@ -270,9 +293,13 @@ def clear_chat_messages(plugin_id: Optional[str] = None, uid: str = Depends(auth
     chat_session = chat_db.get_chat_session(uid, plugin_id=plugin_id)
     chat_session_id = chat_session['id'] if chat_session else None
 
-    err = chat_db.clear_chat(uid, plugin_id=plugin_id, chat_session_id=chat_session_id)
+    cleared_at = datetime.now(timezone.utc).timestamp()
+    err = chat_db.clear_chat(uid, cleared_at, plugin_id=plugin_id, chat_session_id=chat_session_id)
     if err:
         raise HTTPException(status_code=500, detail='Failed to clear chat')
+    # the cleared messages are hidden already, the job marks the same messages deleted
+    start_deletion_job(uid, DeletionJobKind.chat,
+                       {'plugin_id': plugin_id, 'chat_session_id': chat_session_id, 'cleared_at': cleared_at})
 
     # clean thread chat file
     fc_tool = FileChatTool()
@@ -339,17 +366,21 @@ def get_messages_v1(uid: str = Depends(auth.get_current_user_uid)):
 
 
 @router.get('/v2/messages', response_model=List[Message], tags=['chat'])
-def get_messages(plugin_id: Optional[str] = None, uid: str = Depends(auth.get_current_user_uid)):
+def get_messages(plugin_id: Optional[str] = None, limit: int = 100, before: Optional[datetime] = None,
+                 uid: str = Depends(auth.get_current_user_uid)):
+    """before: created_at of the oldest message already loaded, to page back through the history"""
     if plugin_id in ['null', '']:
         plugin_id = None
+    if before and before.tzinfo is None:
+        before = before.replace(tzinfo=timezone.utc)
 
     chat_session = chat_db.get_chat_session(uid, plugin_id=plugin_id)
     chat_session_id = chat_session['id'] if chat_session else None
 
-    messages = chat_db.get_messages(uid, limit=100, include_conversations=True, plugin_id=plugin_id,
-                                    chat_session_id=chat_session_id)
+    messages = chat_db.get_message_history(uid, plugin_id=plugin_id, chat_session_id=chat_session_id,
+                                           limit=min(limit, 100), before=before)
     print('get_messages', len(messages), plugin_id)
-    if not messages:
+    if not messages and not before:
         return [initial_message_util(uid, plugin_id)]
     return messages
 
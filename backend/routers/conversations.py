@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Body, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Body, File, UploadFile, Form
+from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Union
 from datetime import datetime as dt, timezone, timedelta
 from pydantic import BaseModel
@@ -8,6 +9,9 @@ from PIL.ExifTags import TAGS
 import io
 import threading
 import re
+import asyncio
+import base64
+import json
 
 import database.conversations as conversations_db
 import database.users as users_db
@@ -17,10 +21,12 @@ from models.conversation import *
 from models.conversation import SearchRequest
 
 from utils.conversations.process_conversation import process_conversation, retrieve_in_progress_conversation, _extract_memories_from_image_conversation
+from utils.conversations.daily_digest import refold_conversation_into_daily_digest
 from utils.conversations.search import search_conversations
-from utils.llm import generate_summary_with_prompt, get_transcript_structure, EnhancedSummaryOutput, process_prompt, analyze_image_content
+from utils.llm import generate_summary_with_prompt, get_transcript_structure, EnhancedSummaryOutput, process_prompt
 from utils.other import endpoints as auth
-from utils.other.storage import get_conversation_recording_if_exists, upload_conversation_image, upload_multiple_conversation_images
+from utils.other.storage import get_conversation_recording_if_exists, refresh_conversation_image_urls
+from utils.other.image_ingestion import ingest_conversation_images_ordered, IngestedImage
 from utils.app_integrations import trigger_external_integrations
 
 router = APIRouter()
@@ -62,6 +68,50 @@ def detect_image_type_from_content(content: bytes) -> str:
     return None
 
 
+# How long GET /v1/conversations/image-uploads/{upload_id}/progress waits for an upload to finish
+IMAGE_UPLOAD_PROGRESS_TIMEOUT_SECONDS = 180
+IMAGE_UPLOAD_PROGRESS_POLL_SECONDS = 0.25
+
+
+def _image_ingestion_progress(uid: str, upload_id: Optional[str]):
+    """Progress callback of an image upload, with an upload_id its events feed the progress stream"""
+
+    def on_progress(image: IngestedImage, done: int, total: int):
+        status = "analyzed" if image.analyzed else "analysis_failed"
+        if image.reused_description:
+            status = "reused_description"
+        print(f"DEBUG: Image {image.index} uploaded and {status} ({done}/{total})")
+        if upload_id:
+            redis_db.push_image_upload_progress(uid, upload_id, {
+                'index': image.index, 'url': image.url, 'status': status, 'done': done, 'total': total,
+            })
+
+    return on_progress
+
+
+@router.get("/v1/conversations/image-uploads/{upload_id}/progress", tags=['conversations'])
+async def stream_image_upload_progress(upload_id: str, uid: str = Depends(auth.get_current_user_uid)):
+    """
+    Server-sent events for an upload to upload-images or create-from-images sent with the same upload_id, one
+    `data: {index, url, status, done, total}` event per image as it is uploaded and analyzed. The stream ends once
+    every image is done, or after IMAGE_UPLOAD_PROGRESS_TIMEOUT_SECONDS.
+    """
+
+    async def generate_events():
+        position = 0
+        deadline = asyncio.get_running_loop().time() + IMAGE_UPLOAD_PROGRESS_TIMEOUT_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            events = await asyncio.to_thread(redis_db.get_image_upload_progress, uid, upload_id, position) or []
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+            position += len(events)
+            if events and events[-1]['done'] >= events[-1]['total']:
+                return
+            await asyncio.sleep(IMAGE_UPLOAD_PROGRESS_POLL_SECONDS)
+
+    return StreamingResponse(generate_events(), media_type="text/event-stream")
+
+
 def extract_image_timestamp(image_data: bytes) -> Optional[dt]:
     """
     Extract the creation timestamp from image EXIF data and attempt to convert to UTC.
@@ -399,6 +449,18 @@ def _get_conversation_by_id(uid: str, conversation_id: str) -> dict:
     return conversation
 
 
+def _refresh_image_urls(conversations: List[dict]) -> List[dict]:
+    """Re-signs the (expiring) image URLs of all the conversations in one batch."""
+    with_images = [c for c in conversations if c and (c.get('structured') or {}).get('image_urls')]
+    if not with_images:
+        return conversations
+    urls = [url for c in with_images for url in c['structured']['image_urls']]
+    refreshed = iter(refresh_conversation_image_urls(urls))
+    for c in with_images:
+        c['structured']['image_urls'] = [next(refreshed) for _ in c['structured']['image_urls']]
+    return conversations
+
+
 def get_conversation_transcript(conversation: dict) -> str:
     """
     Extract the transcript from a conversation dictionary.
@@ -482,23 +544,50 @@ def reprocess_conversation(
     return process_conversation(uid, language_code, conversation, force_process=True, is_reprocess=True, app_id=app_id)
 
 
+def _encode_conversations_cursor(conversation: dict) -> str:
+    created_at = conversation['created_at']
+    data = json.dumps({'created_at': created_at.isoformat(), 'id': conversation['id']})
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def _decode_conversations_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return dt.fromisoformat(data['created_at']), data['id']
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get('/v1/conversations', response_model=List[Conversation], tags=['conversations'])
-def get_conversations(limit: int = 100, offset: int = 0, statuses: str = "", include_discarded: bool = True,
+def get_conversations(response: Response, limit: int = 100, offset: int = 0, statuses: str = "",
+                      include_discarded: bool = True, cursor: Optional[str] = None, list_view: bool = False,
                       uid: str = Depends(auth.get_current_user_uid)):
-    print('get_conversations', uid, limit, offset, statuses)
-    return conversations_db.get_conversations(uid, limit, offset, include_discarded=include_discarded,
-                                              statuses=statuses.split(",") if len(statuses) > 0 else [])
+    """
+    cursor: value of the X-Next-Cursor header of the previous page, replaces offset for deep pages.
+    list_view: only return the fields needed to render conversation lists, without transcripts or photos.
+    """
+    print('get_conversations', uid, limit, offset, statuses, bool(cursor), list_view)
+    conversations = conversations_db.get_conversations(
+        uid, limit, offset, include_discarded=include_discarded,
+        statuses=statuses.split(",") if len(statuses) > 0 else [],
+        fields=conversations_db.CONVERSATION_LIST_FIELDS if list_view else None,
+        start_after=_decode_conversations_cursor(cursor) if cursor else None,
+    )
+    if len(conversations) == limit and conversations:
+        response.headers['X-Next-Cursor'] = _encode_conversations_cursor(conversations[-1])
+    return _refresh_image_urls(conversations)
 
 
 @router.get("/v1/conversations/{conversation_id}", response_model=Conversation, tags=['conversations'])
 def get_conversation_by_id(conversation_id: str, uid: str = Depends(auth.get_current_user_uid)):
-    return _get_conversation_by_id(uid, conversation_id)
+    return _refresh_image_urls([_get_conversation_by_id(uid, conversation_id)])[0]
 
 
 @router.patch("/v1/conversations/{conversation_id}/title", tags=['conversations'])
 def patch_conversation_title(conversation_id: str, title: str, uid: str = Depends(auth.get_current_user_uid)):
     _get_conversation_by_id(uid, conversation_id)
     conversations_db.update_conversation_title(uid, conversation_id, title)
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     return {'status': 'Ok'}
 
 
@@ -523,6 +612,7 @@ def delete_conversation(conversation_id: str, uid: str = Depends(auth.get_curren
     print('delete_conversation', conversation_id, uid)
     conversations_db.delete_conversation(uid, conversation_id)
     delete_vector(conversation_id)
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     return {"status": "Ok"}
 
 
@@ -601,6 +691,7 @@ def set_conversation_events_state(
         events[event_idx].created = data.values[i]
 
     conversations_db.update_conversation_events(uid, conversation_id, [event.dict() for event in events])
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     return {"status": "Ok"}
 
 
@@ -617,6 +708,7 @@ def set_action_item_status(data: SetConversationActionItemsStateRequest, convers
 
     conversations_db.update_conversation_action_items(uid, conversation_id,
                                                       [action_item.dict() for action_item in action_items])
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     return {"status": "Ok"}
 
 
@@ -631,6 +723,7 @@ def delete_action_item(data: DeleteActionItemRequest, conversation_id: str, uid=
             action_item.deleted = True
     conversations_db.update_conversation_action_items(uid, conversation_id,
                                                       [action_item.dict() for action_item in action_items])
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     return {"status": "Ok"}
 
 
@@ -1211,6 +1304,7 @@ def generate_enhanced_summary(
     
     # Save the updated conversation
     conversations_db.update_conversation_structured(uid, conversation_id, enhanced_structured.dict())
+    threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
     
     return conversation
 
@@ -1219,11 +1313,13 @@ async def upload_and_process_conversation_images(
     conversation_id: str,
     files: List[UploadFile] = File(...),
     user_prompt: Optional[str] = Form(default=""),
+    upload_id: Optional[str] = Form(default=None),
     uid: str = Depends(auth.get_current_user_uid)
 ):
     """
     Upload one or more images to Firebase Storage and process them with OpenAI to enhance the conversation summary.
     Accepts optional user_prompt for providing context and instructions for event generation.
+    With an upload_id, per-image progress is streamed by GET /v1/conversations/image-uploads/{upload_id}/progress.
     """
     print(f"DEBUG: Starting upload_and_process_conversation_images for conversation {conversation_id}, user {uid}")
     print(f"DEBUG: Received {len(files)} files")
@@ -1411,16 +1507,19 @@ async def upload_and_process_conversation_images(
             images_data.append(image_data)
             
             # Extract timestamp from EXIF data
-            timestamp = extract_image_timestamp(image_data)
+            timestamp = await asyncio.to_thread(extract_image_timestamp, image_data)
             image_timestamps.append(timestamp)
             print(f"DEBUG: Image {len(images_data)-1} EXIF timestamp: {timestamp}")
         
-        # Upload images to Firebase Storage
-        uploaded_urls = upload_multiple_conversation_images(images_data, uid, conversation_id)
-        image_urls.extend(uploaded_urls)
+        # Upload images to Firebase Storage and describe them, concurrently and off the event loop
+        ingested_images = await ingest_conversation_images_ordered(
+            images_data, uid, conversation_id, user_prompt, on_progress=_image_ingestion_progress(uid, upload_id)
+        )
+        image_urls.extend(image.url for image in ingested_images)
+        image_descriptions.extend(image.description for image in ingested_images)
         
-        print(f"DEBUG: Uploaded {len(uploaded_urls)} images to Firebase Storage:")
-        for i, url in enumerate(uploaded_urls):
+        print(f"DEBUG: Uploaded {len(image_urls)} images to Firebase Storage:")
+        for i, url in enumerate(image_urls):
             print(f"DEBUG: Image {i}: {url}")
         
         # Determine the conversation timestamp based on image timestamps and filename timestamps
@@ -1441,15 +1540,6 @@ async def upload_and_process_conversation_images(
             conversation_timestamp = dt.now(timezone.utc)
             print(f"DEBUG: No timestamps found, using current time: {conversation_timestamp}")
         
-        # Get image descriptions using OpenAI
-        for image_data in images_data:
-            try:
-                description = analyze_image_content(image_data, user_prompt)
-                image_descriptions.append(description)
-            except Exception as e:
-                print(f"Error analyzing image: {e}")
-                image_descriptions.append("Image content could not be analyzed")
-        
         # Get user preferences
         user_language = users_db.get_user_language_preference(uid) or 'English'
         user_name = users_db.get_user_name(uid) or 'User'
@@ -1700,6 +1790,7 @@ async def upload_and_process_conversation_images(
         
         # Update the conversation in the database
         conversations_db.update_conversation_structured(uid, conversation_id, conversation.structured.dict())
+        threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation_id)).start()
         
         print(f"DEBUG: Database updated successfully")
         
@@ -1747,6 +1838,7 @@ async def upload_and_process_conversation_images(
 async def create_conversation_from_images(
     files: List[UploadFile] = File(...),
     user_prompt: Optional[str] = Form(default=""),
+    upload_id: Optional[str] = Form(default=None),
     uid: str = Depends(auth.get_current_user_uid)
 ):
     """
@@ -1754,6 +1846,7 @@ async def create_conversation_from_images(
     This endpoint uploads images, analyzes their content, and creates a new conversation 
     with structured insights based on the image content.
     Accepts optional user_prompt for providing context and instructions for event generation.
+    With an upload_id, per-image progress is streamed by GET /v1/conversations/image-uploads/{upload_id}/progress.
     """
     print(f"DEBUG: Starting create_conversation_from_images for user {uid}")
     print(f"DEBUG: Received {len(files)} files")
@@ -1809,16 +1902,19 @@ async def create_conversation_from_images(
             images_data.append(image_data)
             
             # Extract timestamp from EXIF data
-            timestamp = extract_image_timestamp(image_data)
+            timestamp = await asyncio.to_thread(extract_image_timestamp, image_data)
             image_timestamps.append(timestamp)
             print(f"DEBUG: Image {len(images_data)-1} EXIF timestamp: {timestamp}")
         
-        # Upload images to Firebase Storage
-        uploaded_urls = upload_multiple_conversation_images(images_data, uid, conversation_id)
-        image_urls.extend(uploaded_urls)
+        # Upload images to Firebase Storage and describe them, concurrently and off the event loop
+        ingested_images = await ingest_conversation_images_ordered(
+            images_data, uid, conversation_id, user_prompt, on_progress=_image_ingestion_progress(uid, upload_id)
+        )
+        image_urls.extend(image.url for image in ingested_images)
+        image_descriptions.extend(image.description for image in ingested_images)
         
-        print(f"DEBUG: Uploaded {len(uploaded_urls)} images to Firebase Storage:")
-        for i, url in enumerate(uploaded_urls):
+        print(f"DEBUG: Uploaded {len(image_urls)} images to Firebase Storage:")
+        for i, url in enumerate(image_urls):
             print(f"DEBUG: Image {i}: {url}")
         
         # Determine the conversation timestamp based on image timestamps
@@ -1835,15 +1931,6 @@ async def create_conversation_from_images(
             conversation_timestamp = dt.now(timezone.utc)
             print(f"DEBUG: No EXIF timestamps found, using current time: {conversation_timestamp}")
         
-        # Get image descriptions using OpenAI
-        for image_data in images_data:
-            try:
-                description = analyze_image_content(image_data, user_prompt)
-                image_descriptions.append(description)
-            except Exception as e:
-                print(f"Error analyzing image: {e}")
-                image_descriptions.append("Image content could not be analyzed")
-        
         # Get user preferences
         user_language = users_db.get_user_language_preference(uid) or 'English'
         user_name = users_db.get_user_name(uid) or 'User'
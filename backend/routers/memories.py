@@ -5,8 +5,11 @@ from fastapi import APIRouter, Depends, HTTPException
 
 import database.memories as memories_db
 from models.memories import MemoryDB, Memory, MemoryCategory
+from models.users import DeletionJobKind
 from utils.apps import update_personas_async
+from utils.deletion_jobs import start_deletion_job, DELETION_JOB_INLINE_SECONDS
 from utils.llm import identify_category_for_memory
+from utils.llms.memory_index import index_memories, unindex_memories
 from utils.other import endpoints as auth
 
 router = APIRouter()
@@ -18,6 +21,7 @@ def create_memory(memory: Memory, uid: str = Depends(auth.get_current_user_uid))
     memory.category = identify_category_for_memory(memory.content, categories)
     memory_db = MemoryDB.from_memory(memory, uid, None, True)
     memories_db.create_memory(uid, memory_db.dict())
+    threading.Thread(target=index_memories, args=(uid, [memory_db.dict()])).start()
     threading.Thread(target=update_personas_async, args=(uid,)).start()
     return memory_db
 
@@ -35,13 +39,15 @@ def get_memories(limit: int = 100, offset: int = 0, uid: str = Depends(auth.get_
 @router.delete('/v3/memories/{memory_id}', tags=['memories'])
 def delete_memory(memory_id: str, uid: str = Depends(auth.get_current_user_uid)):
     memories_db.delete_memory(uid, memory_id)
+    threading.Thread(target=unindex_memories, args=(uid, [memory_id])).start()
     return {'status': 'ok'}
 
 
 @router.delete('/v3/memories', tags=['memories'])
 def delete_memories(uid: str = Depends(auth.get_current_user_uid)):
-    memories_db.delete_all_memories(uid)
-    return {'status': 'ok'}
+    # heavy users' memories keep being deleted after the response
+    job = start_deletion_job(uid, DeletionJobKind.memories, wait_seconds=DELETION_JOB_INLINE_SECONDS)
+    return {'status': 'ok', 'job_id': job['id'], 'job_status': job['status']}
 
 
 @router.post('/v3/memories/{memory_id}/review', tags=['memories'])
@@ -58,6 +64,7 @@ def edit_memory(memory_id: str, value: str, uid: str = Depends(auth.get_current_
     #     value = value[len(first_word):].strip()
 
     memories_db.edit_memory(uid, memory_id, value)
+    threading.Thread(target=index_memories, args=(uid, [{'id': memory_id, 'content': value}])).start()
     return {'status': 'ok'}
 
 
@@ -66,5 +73,6 @@ def update_memory_visibility(memory_id: str, value: str, uid: str = Depends(auth
     if value not in ['public', 'private']:
         raise HTTPException(status_code=400, detail='Invalid visibility value')
     memories_db.change_memory_visibility(uid, memory_id, value)
-    threading.Thread(target=update_personas_async, args=(uid,)).start()
+    # a fact made private leaves public personas right away
+    threading.Thread(target=update_personas_async, args=(uid, value == 'private')).start()
     return {'status': 'ok'}
@@ -10,7 +10,7 @@ from utils.apps import get_available_app_by_id, verify_api_key
 from utils.app_integrations import send_app_notification
 import database.notifications as notification_db
 from models.other import SaveFcmTokenRequest
-from utils.notifications import send_notification
+from utils.notifications import send_notification, get_delivery_metrics
 from utils.other import endpoints as auth
 from models.app import App
 
@@ -76,6 +76,13 @@ def send_notification_to_user(data: dict, secret_key: str = Header(...)):
     return {'status': 'Ok'}
 
 
+@router.get('/v1/notifications/metrics')
+def get_notification_metrics(secret_key: str = Header(...)):
+    if secret_key != os.getenv('ADMIN_KEY'):
+        raise HTTPException(status_code=403, detail='You are not authorized to perform this action')
+    return get_delivery_metrics()
+
+
 @router.post('/v1/integrations/notification')
 def send_app_notification_to_user(
     request: Request,
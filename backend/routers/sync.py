@@ -4,7 +4,8 @@ import struct
 import threading
 import time
 from datetime import datetime
-from typing import List
+from contextlib import nullcontext
+from typing import List, Tuple, BinaryIO, Union
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from pyogg import OpusDecoder
@@ -21,16 +22,17 @@ from utils.stt.vad import vad_is_empty
 
 router = APIRouter()
 
-import shutil
 import wave
 
 
-def decode_opus_file_to_wav(opus_file_path, wav_file_path, sample_rate=16000, channels=1, frame_size: int = 160):
+def decode_opus_file_to_wav(opus_file: Union[str, BinaryIO], wav_file_path, sample_rate=16000, channels=1,
+                            frame_size: int = 160):
     decoder = OpusDecoder()
     decoder.set_sampling_frequency(sample_rate)
     decoder.set_channels(channels)
-    
-    with open(opus_file_path, 'rb') as f:
+
+    # a path on disk, or the uploaded stream itself
+    with open(opus_file, 'rb') if isinstance(opus_file, str) else nullcontext(opus_file) as f:
         pcm_data = []
         frame_count = 0
         while True:
@@ -75,7 +77,11 @@ def get_timestamp_from_path(path: str):
     return timestamp
 
 
-def retrieve_file_paths(files: List[UploadFile], uid: str):
+def retrieve_file_paths(files: List[UploadFile], uid: str) -> List[Tuple[str, BinaryIO]]:
+    """
+    Validates the uploaded .bin files and pairs each one with its local path.
+    The uploads are decoded straight from their request streams, the .bin files are never written to disk.
+    """
     directory = f'syncing/{uid}/'
     os.makedirs(directory, exist_ok=True)
     paths = []
@@ -96,15 +102,14 @@ def retrieve_file_paths(files: List[UploadFile], uid: str):
             raise HTTPException(status_code=400, detail=f"Invalid file format {filename}, invalid timestamp")
 
         path = f"{directory}{filename}"
-        paths.append(path)
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file.file.seek(0)
+        paths.append((path, file.file))
     return paths
 
 
-def decode_files_to_wav(files_path: List[str]):
+def decode_files_to_wav(files: List[Tuple[str, BinaryIO]]):
     wav_files = []
-    for path in files_path:
+    for path, opus_file in files:
         wav_path = path.replace('.bin', '.wav')
         filename = os.path.basename(path)
         frame_size = 160  # Default frame size
@@ -116,7 +121,7 @@ def decode_files_to_wav(files_path: List[str]):
             except ValueError:
                 print(f"Invalid frame size format in filename: {filename}, using default {frame_size}")
 
-        decode_opus_file_to_wav(path, wav_path, frame_size=frame_size)
+        decode_opus_file_to_wav(opus_file, wav_path, frame_size=frame_size)
         try:
             aseg = AudioSegment.from_wav(wav_path)
         except Exception as e:
@@ -127,7 +132,6 @@ def decode_files_to_wav(files_path: List[str]):
             os.remove(wav_path)
             continue
         wav_files.append(wav_path)
-        os.remove(path)
     return wav_files
 
 
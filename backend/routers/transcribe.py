@@ -2,6 +2,7 @@ import os
 import uuid
 import asyncio
 import struct
+import threading
 from datetime import datetime, timezone, timedelta, time
 from enum import Enum
 
@@ -21,6 +22,7 @@ from models.conversation import Conversation, TranscriptSegment, ConversationSta
 from models.message_event import ConversationEvent, MessageEvent, MessageServiceStatusEvent, LastConversationEvent, TranslationEvent
 from models.transcript_segment import Translation
 from utils.apps import is_audio_bytes_app_enabled
+from utils.conversations.daily_digest import refold_conversation_into_daily_digest
 from utils.conversations.location import get_google_maps_location
 from utils.conversations.process_conversation import process_conversation, retrieve_in_progress_conversation
 from utils.other.task import safe_create_task
@@ -429,13 +431,27 @@ async def _listen(
             else:
                 # Use standard processing
                 print(f"📝 PROCESSING: Processing conversation {conversation.id} with standard pipeline")
-                conversation = process_conversation(uid, language, conversation)
+                loop = asyncio.get_running_loop()
+                processing_conversation = conversation
+
+                def _send_partial_summary(structured: Structured):
+                    # Runs on the processing thread, hand the event back to the websocket loop
+                    preview = processing_conversation.model_copy(update={'structured': structured})
+                    asyncio.run_coroutine_threadsafe(
+                        _asend_message_event(ConversationEvent(event_type="memory_processing_partial", memory=preview)),
+                        loop,
+                    )
+
+                conversation = await asyncio.to_thread(
+                    process_conversation, uid, language, conversation, on_partial=_send_partial_summary
+                )
                 messages = trigger_external_integrations(uid, conversation)
                 print(f"✅ PROCESSING: Standard processing completed for conversation {conversation.id}")
         except Exception as e:
             print(f"🔴 PROCESSING: Error processing conversation {conversation.id}: {e}", uid)
             conversations_db.set_conversation_as_discarded(uid, conversation.id)
             conversation.discarded = True
+            threading.Thread(target=refold_conversation_into_daily_digest, args=(uid, conversation.id)).start()
             messages = []
 
         print(f"📡 PROCESSING: Sending conversation created event for {conversation.id}")
@@ -524,7 +540,7 @@ async def _listen(
         nonlocal seconds_to_add
         nonlocal conversation_creation_timeout
         # Determine previous disconnected socket seconds to add + start processing timer if a conversation in progress
-        if existing_conversation := retrieve_in_progress_conversation(uid):
+        if existing_conversation := retrieve_in_progress_conversation(uid, include_transcript=False):
             # segments seconds alignment
             started_at = datetime.fromisoformat(existing_conversation['started_at'].isoformat())
             seconds_to_add = (datetime.now(timezone.utc) - started_at).total_seconds()
@@ -546,13 +562,17 @@ async def _listen(
     _process_in_progess_memories()
 
     def _upsert_in_progress_conversation(segments: List[TranscriptSegment], finished_at: datetime):
-        if existing := retrieve_in_progress_conversation(uid):
-            conversation = Conversation(**existing)
-            conversation.transcript_segments, (starts, ends) = TranscriptSegment.combine_segments(conversation.transcript_segments, segments)
-            conversations_db.update_conversation_segments(uid, conversation.id,
-                                                          [segment.dict() for segment in conversation.transcript_segments])
-            conversations_db.update_conversation_finished_at(uid, conversation.id, finished_at)
+        if existing := retrieve_in_progress_conversation(uid, include_transcript=False):
+            # new segments can only merge into the last transcript chunk, the rest is never read or rewritten
+            offset, tail = conversations_db.get_transcript_tail(uid, existing)
+            conversation = Conversation(**{**existing, 'transcript_segments': []})
+            conversation.transcript_segments, (starts, ends) = TranscriptSegment.combine_segments(
+                [TranscriptSegment(**segment) for segment in tail], segments)
+            conversations_db.append_transcript_segments(uid, conversation.id,
+                                                        [segment.dict() for segment in conversation.transcript_segments],
+                                                        offset, finished_at=finished_at)
             redis_db.set_in_progress_conversation_id(uid, conversation.id)
+            # transcript_segments holds the tail only, starts/ends index into it
             return conversation, (starts, ends)
 
         # new
@@ -879,20 +899,22 @@ async def _listen(
             if len(translated_segments) > 0:
                 conversation = conversations_db.get_conversation(uid, conversation_id)
                 if conversation:
-                    should_updates = False
+                    changed_indexes = []
                     for segment in translated_segments:
                         for i, existing_segment in enumerate(conversation['transcript_segments']):
                             if existing_segment['id'] == segment.id:
                                 conversation['transcript_segments'][i]['translations'] = segment.dict()['translations']
-                                should_updates = True
+                                changed_indexes.append(i)
                                 break
 
-                    # Update the database
-                    if should_updates:
+                    # Update the database, only the chunks holding translated segments are rewritten
+                    if changed_indexes:
                         conversations_db.update_conversation_segments(
                             uid,
                             conversation_id,
-                            conversation['transcript_segments']
+                            conversation['transcript_segments'],
+                            # an inline transcript is moved to chunks whole
+                            changed_indexes=changed_indexes if conversation.get('transcript_chunked') else None,
                         )
 
             # Send a translation event to the client with the translated segments
@@ -932,16 +954,11 @@ async def _listen(
                 await create_conversation_on_segment_received_task(finished_at)
 
                 # Segments aligning duration seconds.
-                if seconds_to_add:
-                    for i, segment in enumerate(segments):
-                        segment["start"] += seconds_to_add
-                        segment["end"] += seconds_to_add
-                        segments[i] = segment
-                elif seconds_to_trim:
-                    for i, segment in enumerate(segments):
-                        segment["start"] -= seconds_to_trim
-                        segment["end"] -= seconds_to_trim
-                        segments[i] = segment
+                shift = seconds_to_add or (-seconds_to_trim if seconds_to_trim else 0)
+                if shift:
+                    for segment in segments:
+                        segment["start"] += shift
+                        segment["end"] += shift
 
                 transcript_segments, _ = TranscriptSegment.combine_segments([], [TranscriptSegment(**segment) for segment in segments])
 
@@ -950,16 +967,17 @@ async def _listen(
                 current_conversation_id = conversation.id
 
                 # Send to client
+                transcript_segments_dicts = [segment.dict() for segment in transcript_segments]
                 if including_combined_segments:
                     updates_segments = [segment.dict() for segment in conversation.transcript_segments[starts:ends]]
                 else:
-                    updates_segments = [segment.dict() for segment in transcript_segments]
+                    updates_segments = transcript_segments_dicts
 
                 await websocket.send_json(updates_segments)
 
                 # Send to external trigger
                 if transcript_send is not None:
-                    transcript_send([segment.dict() for segment in transcript_segments], current_conversation_id)
+                    transcript_send(transcript_segments_dicts, current_conversation_id)
 
                 # Translate
                 if translation_enabled:
@@ -3,14 +3,15 @@ Text-to-Speech API endpoints using Azure TTS service
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from typing import Optional
+from typing import Optional, AsyncIterator, Callable, List
 from pydantic import BaseModel, Field
-import os
-import httpx
+import asyncio
 import io
 import traceback
 
 from utils.other import endpoints as auth
+from utils.tts.synthesis import TTSError, TTS_MODEL, is_tts_configured, stream_speech
+from utils.tts import cache as tts_cache
 
 # Add startup logging to verify this module loads
 print("🔊 TTS_ROUTER: Loading TTS router module...")
@@ -25,41 +26,39 @@ class TTSRequest(BaseModel):
     text: str = Field(..., description="Text content to convert to speech", max_length=10000)
     voice: str = Field(default="alloy", description="Voice to use for TTS")
     speed: float = Field(default=1.0, description="Speech speed (0.25 to 4.0)", ge=0.25, le=4.0)
+    stream: bool = Field(default=True, description="Stream audio as soon as the first sentences are synthesized")
 
 
-def truncate_text_for_tts(text: str, max_chars: int = 3000) -> str:
+async def _start_audio_stream(
+    audio_stream: AsyncIterator[bytes], on_complete: Optional[Callable[[bytes], None]] = None
+) -> AsyncIterator[bytes]:
     """
-    Truncate text to fit within Azure TTS limits.
-    Azure TTS has a 2000 token limit, so we'll use a conservative 3000 character limit.
+    Waits for the first audio bytes so synthesis errors still surface as an HTTP error, then returns a generator
+    that replays them followed by the rest of the stream. on_complete gets the whole audio once fully streamed.
     """
-    print(f"🔊 TTS_TRUNCATE: Input text length: {len(text)} characters")
-    
-    if len(text) <= max_chars:
-        print(f"🔊 TTS_TRUNCATE: Text within limit, no truncation needed")
-        return text
-    
-    print(f"🔊 TTS_TRUNCATE: Text exceeds {max_chars} chars, truncating...")
-    
-    # Try to truncate at sentence boundaries
-    sentences = text.split('. ')
-    truncated = ""
-    
-    for sentence in sentences:
-        test_text = truncated + sentence + ". "
-        if len(test_text) <= max_chars:
-            truncated = test_text
-        else:
-            break
-    
-    # If we got at least some content, return it
-    if len(truncated) > 100:
-        print(f"🔊 TTS_TRUNCATE: Truncated at sentence boundary to {len(truncated)} characters")
-        return truncated.strip()
-    
-    # Fallback: hard truncate at character limit
-    fallback_text = text[:max_chars].strip() + "..."
-    print(f"🔊 TTS_TRUNCATE: Hard truncated to {len(fallback_text)} characters")
-    return fallback_text
+    try:
+        first = await audio_stream.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="No text to convert")
+    except TTSError as e:
+        print(f"🔴 TTS: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    async def replay():
+        parts: List[bytes] = [first]
+        yield first
+        try:
+            async for data in audio_stream:
+                parts.append(data)
+                yield data
+        except Exception as e:
+            # headers are already sent, the client gets a shorter audio
+            print(f"🔴 TTS: Error while streaming audio: {e}")
+            return
+        if on_complete:
+            on_complete(b''.join(parts))
+
+    return replay()
 
 
 @router.post("/v1/tts/speak", tags=['tts'])
@@ -78,79 +77,35 @@ async def convert_text_to_speech(
     print(f"🔊 TTS_SPEAK: Starting convert_text_to_speech for user {uid}")
     
     try:
-        # Get Azure TTS configuration from environment
-        azure_tts_api_key = os.getenv("AZURE_TTS_API_KEY")
-        azure_tts_endpoint = os.getenv("AZURE_TTS_ENDPOINT")
-        azure_tts_api_version = os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview")
-        
-        print(f"🔊 TTS_SPEAK: Azure config - endpoint: {azure_tts_endpoint}, version: {azure_tts_api_version}")
-        print(f"🔊 TTS_SPEAK: Azure API key present: {bool(azure_tts_api_key)}")
-        
-        if not azure_tts_api_key or not azure_tts_endpoint:
+        if not is_tts_configured():
             print(f"🔴 TTS_SPEAK: Azure TTS service not properly configured")
-            print(f"🔴 TTS_SPEAK: API Key present: {bool(azure_tts_api_key)}")
-            print(f"🔴 TTS_SPEAK: Endpoint: {repr(azure_tts_endpoint)}")
             raise HTTPException(
                 status_code=500, 
                 detail="Azure TTS service not properly configured"
             )
         
-        # Skip truncation for testing - use original text
         text_to_convert = request.text
         
         print(f"🔊 TTS_SPEAK: Converting text to speech for user {uid}")
         print(f"🔊 TTS_SPEAK: Text length: {len(text_to_convert)} characters")
-        print(f"🔊 TTS_SPEAK: Voice: {request.voice}, Speed: {request.speed}")
+        print(f"🔊 TTS_SPEAK: Voice: {request.voice}, Speed: {request.speed}, Stream: {request.stream}")
         
-        # Prepare Azure TTS request
-        azure_url = f"{azure_tts_endpoint}?api-version={azure_tts_api_version}"
         headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {azure_tts_api_key}"
+            "Content-Disposition": "inline; filename=speech.mp3",
+            "Cache-Control": "no-cache"
         }
+        audio_stream = stream_speech(text_to_convert, request.voice, request.speed)
         
-        payload = {
-            "model": "gpt-4o-mini-tts",
-            "input": text_to_convert,
-            "voice": request.voice,
-            "speed": request.speed
-        }
-        
-        print(f"🔊 TTS_SPEAK: Making request to {azure_url}")
-        print(f"🔊 TTS_SPEAK: Payload keys: {list(payload.keys())}")
-        
-        # Call Azure TTS service
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            print(f"🔊 TTS_SPEAK: Sending request to Azure TTS...")
-            response = await client.post(
-                azure_url,
-                headers=headers,
-                json=payload
-            )
-            
-            print(f"🔊 TTS_SPEAK: Azure response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                print(f"🔴 TTS_SPEAK: Azure TTS API error: {response.status_code} - {response.text}")
-                print(f"🔴 TTS_SPEAK: Response headers: {dict(response.headers)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Azure TTS service error: {response.status_code} - {response.text}"
-                )
-            
-            # Get audio content
-            audio_content = response.content
+        if not request.stream:
+            try:
+                audio_content = b''.join([data async for data in audio_stream])
+            except TTSError as e:
+                print(f"🔴 TTS_SPEAK: {e}")
+                raise HTTPException(status_code=e.status_code, detail=str(e))
             print(f"🔊 TTS_SPEAK: Generated audio - {len(audio_content)} bytes")
-            
-            # Create streaming response
-            return StreamingResponse(
-                io.BytesIO(audio_content),
-                media_type="audio/mpeg",
-                headers={
-                    "Content-Disposition": "inline; filename=speech.mp3",
-                    "Cache-Control": "no-cache"
-                }
-            )
+            return StreamingResponse(io.BytesIO(audio_content), media_type="audio/mpeg", headers=headers)
+        
+        return StreamingResponse(await _start_audio_stream(audio_stream), media_type="audio/mpeg", headers=headers)
             
     except HTTPException:
         print(f"🔴 TTS_SPEAK: HTTPException raised, re-raising")
@@ -174,27 +129,13 @@ async def convert_conversation_summary_to_speech(
     """
     Convert a specific conversation's agent analysis to speech.
     
-    This endpoint first checks if a cached audio file exists in Firebase Storage.
-    If found, it returns a redirect to the cached file URL.
-    If not found, it generates new audio using Azure TTS and caches it.
+    The audio is cached by content (text, voice, speed and model), so any conversation or user asking
+    for the same summary gets a redirect to the cached file URL.
+    If not found, it streams new audio from Azure TTS and caches it.
     """
     print(f"🔊 TTS_CONVERSATION: Starting convert_conversation_summary_to_speech for conversation {conversation_id}, user {uid}")
     
     try:
-        # First, check if cached audio exists in Firebase Storage
-        from utils.other.storage import get_conversation_audio_url, upload_conversation_audio
-        
-        print(f"🔊 TTS_CONVERSATION: Checking for cached audio (voice: {voice}, speed: {speed})")
-        cached_audio_url = get_conversation_audio_url(uid, conversation_id, voice, speed)
-        
-        if cached_audio_url:
-            print(f"🔊 TTS_CONVERSATION: Found cached audio, redirecting to: {cached_audio_url}")
-            # Return redirect to cached audio file
-            from fastapi.responses import RedirectResponse
-            return RedirectResponse(url=cached_audio_url, status_code=302)
-        
-        print(f"🔊 TTS_CONVERSATION: No cached audio found, generating new audio")
-        
         # Get conversation data
         import database.conversations as conversations_db
         conversation_data = conversations_db.get_conversation(uid, conversation_id)
@@ -220,77 +161,42 @@ async def convert_conversation_summary_to_speech(
                 detail="No agent analysis or summary content found in conversation"
             )
         
-        print(f"🔊 TTS_CONVERSATION: Converting conversation {conversation_id} summary to speech")
-        print(f"🔊 TTS_CONVERSATION: Content length: {len(agent_analysis)} characters")
+        # Check the content addressed cache, indexed in memory and Redis so no storage round trip is needed
+        print(f"🔊 TTS_CONVERSATION: Checking for cached audio (voice: {voice}, speed: {speed})")
+        cache_key = tts_cache.tts_cache_key(agent_analysis, voice, speed, TTS_MODEL)
+        cached_audio_url = await asyncio.to_thread(tts_cache.get_cached_audio_url, cache_key)
         
-        # Generate audio using Azure TTS
-        text_to_convert = agent_analysis
+        if cached_audio_url:
+            print(f"🔊 TTS_CONVERSATION: Found cached audio, redirecting to: {cached_audio_url}")
+            # Return redirect to cached audio file
+            from fastapi.responses import RedirectResponse
+            return RedirectResponse(url=cached_audio_url, status_code=302)
         
-        # Get Azure TTS configuration
-        azure_tts_api_key = os.getenv("AZURE_TTS_API_KEY")
-        azure_tts_endpoint = os.getenv("AZURE_TTS_ENDPOINT")
-        azure_tts_api_version = os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview")
+        print(f"🔊 TTS_CONVERSATION: No cached audio found, generating new audio")
+        print(f"🔊 TTS_CONVERSATION: Converting conversation {conversation_id} summary to speech")
+        print(f"🔊 TTS_CONVERSATION: Content length: {len(agent_analysis)} characters")
         
-        if not azure_tts_api_key or not azure_tts_endpoint:
+        if not is_tts_configured():
             print(f"🔴 TTS_CONVERSATION: Azure TTS service not properly configured")
             raise HTTPException(
                 status_code=500, 
                 detail="Azure TTS service not properly configured"
             )
         
-        # Prepare Azure TTS request
-        azure_url = f"{azure_tts_endpoint}?api-version={azure_tts_api_version}"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {azure_tts_api_key}"
-        }
+        def cache_audio(audio_content: bytes):
+            # Cache the whole audio once it has been fully streamed, the sentence chunks are cached on their own
+            print(f"🔊 TTS_CONVERSATION: Generated audio - {len(audio_content)} bytes, caching it")
+            tts_cache.store_audio_in_background(cache_key, audio_content)
         
-        payload = {
-            "model": "gpt-4o-mini-tts",
-            "input": text_to_convert,
-            "voice": voice,
-            "speed": speed
-        }
-        
-        print(f"🔊 TTS_CONVERSATION: Making request to Azure TTS...")
-        
-        # Call Azure TTS service
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                azure_url,
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code != 200:
-                print(f"🔴 TTS_CONVERSATION: Azure TTS API error: {response.status_code} - {response.text}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Azure TTS service error: {response.status_code} - {response.text}"
-                )
-            
-            # Get audio content
-            audio_content = response.content
-            print(f"🔊 TTS_CONVERSATION: Generated audio - {len(audio_content)} bytes")
-            
-            # Cache the audio in Firebase Storage
-            try:
-                print(f"🔊 TTS_CONVERSATION: Uploading audio to Firebase Storage...")
-                cached_url = upload_conversation_audio(audio_content, uid, conversation_id, voice, speed)
-                print(f"🔊 TTS_CONVERSATION: Audio cached successfully at: {cached_url}")
-            except Exception as cache_error:
-                print(f"🔴 TTS_CONVERSATION: Failed to cache audio: {cache_error}")
-                # Continue with direct audio response even if caching fails
-            
-            # Return the audio as streaming response
-            return StreamingResponse(
-                io.BytesIO(audio_content),
-                media_type="audio/mpeg",
-                headers={
-                    "Content-Disposition": "inline; filename=speech.mp3",
-                    "Cache-Control": "public, max-age=3600"  # Cache for 1 hour
-                }
-            )
+        audio_stream = stream_speech(agent_analysis, voice, speed)
+        return StreamingResponse(
+            await _start_audio_stream(audio_stream, on_complete=cache_audio),
+            media_type="audio/mpeg",
+            headers={
+                "Content-Disposition": "inline; filename=speech.mp3",
+                "Cache-Control": "public, max-age=3600"  # Cache for 1 hour
+            }
+        )
         
     except HTTPException:
         print(f"🔴 TTS_CONVERSATION: HTTPException raised, re-raising")
@@ -10,12 +10,12 @@ from database.redis_db import cache_user_geolocation, set_user_webhook_db, get_u
 from database.users import *
 from models.conversation import Geolocation, Conversation
 from models.other import Person, CreatePerson
-from models.users import WebhookType
+from models.users import WebhookType, DeletionJobKind
 from utils.apps import get_available_app_by_id
+from utils.deletion_jobs import start_deletion_job, get_deletion_job, DELETION_JOB_INLINE_SECONDS
 from utils.llm import followup_question_prompt
 from utils.other import endpoints as auth
-from utils.other.storage import delete_all_conversation_recordings, get_user_person_speech_samples, \
-    delete_user_person_speech_samples
+from utils.other.storage import get_user_person_speech_samples, delete_user_person_speech_samples
 from utils.webhooks import webhook_first_time_setup
 import database.users as users_db
 from database.users import get_user_name, set_user_name, \
@@ -29,15 +29,32 @@ router = APIRouter()
 @router.delete('/v1/users/delete-account', tags=['v1'])
 def delete_account(uid: str = Depends(auth.get_current_user_uid)):
     try:
-        delete_user_data(uid)
+        # the data is deleted in the background, GET /v1/users/deletion-jobs/{job_id} reports the progress
+        job = start_deletion_job(uid, DeletionJobKind.account)
         # delete user from firebase auth
         auth.delete_account(uid)
-        return {'status': 'ok', 'message': 'Account deleted successfully'}
+        return {'status': 'ok', 'message': 'Account deletion started', 'job_id': job['id']}
     except Exception as e:
         print('delete_account', str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get('/v1/users/deletion-jobs/{job_id}', tags=['v1'])
+def get_deletion_job_status(job_id: str, uid: str = Depends(auth.get_current_user_uid)):
+    job = get_deletion_job(uid, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail='Deletion job not found')
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'steps': job.get('steps') or {},
+        'error': job.get('error'),
+        'created_at': job['created_at'],
+        'completed_at': job.get('completed_at'),
+    }
+
+
 @router.patch('/v1/users/geolocation', tags=['v1'])
 def set_user_geolocation(geolocation: Geolocation, uid: str = Depends(auth.get_current_user_uid)):
     cache_user_geolocation(uid, geolocation.dict())
@@ -116,8 +133,8 @@ def get_store_recording_permission(uid: str = Depends(auth.get_current_user_uid)
 @router.delete('/v1/users/store-recording-permission', tags=['v1'])
 def delete_permission_and_recordings(uid: str = Depends(auth.get_current_user_uid)):
     set_user_store_recording_permission(uid, False)
-    delete_all_conversation_recordings(uid)
-    return {'status': 'ok'}
+    job = start_deletion_job(uid, DeletionJobKind.recordings, wait_seconds=DELETION_JOB_INLINE_SECONDS)
+    return {'status': 'ok', 'job_id': job['id'], 'job_status': job['status']}
 
 
 # ****************************************
@@ -0,0 +1,155 @@
+"""
+Time to first token of POST /v2/messages against a running backend.
+Run one backend on the old code and one on the new (or the same one before and after a deploy), then:
+
+    CHAT_BENCHMARK_TOKEN=<firebase id token> python testing/chat_ttft_benchmark.py http://localhost:8000 [http://localhost:8001]
+
+Every base URL gets the same warmup and the same questions, the first of them are cache misses by design.
+
+Without a backend, the setup before the first token can be compared against local stand-ins, no network or
+credentials needed:
+
+    python testing/chat_ttft_benchmark.py --local
+
+The old path made its Firestore reads and writes one after the other. The new path does one Redis GET and
+the remaining reads concurrently, and stores the human message in the background. Each stand-in call costs a
+fixed round trip, roughly what these calls cost from Cloud Run to Firestore and Memorystore in one region.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+QUESTIONS = [
+    'What did I talk about yesterday?',
+    'Summarize my last meeting',
+    'Who did I meet this week?',
+    'What are my open action items?',
+    'What was the most important thing I said today?',
+]
+ROUNDS = int(os.getenv('CHAT_BENCHMARK_ROUNDS', '4'))
+WARMUP = 1
+
+LOCAL_MESSAGES = int(os.getenv('CHAT_BENCHMARK_LOCAL_MESSAGES', '200'))
+FIRESTORE_READ_SECONDS = 0.025
+FIRESTORE_WRITE_SECONDS = 0.035
+REDIS_SECONDS = 0.001
+# Share of messages whose context is not cached (first message, or another instance wrote in between)
+CONTEXT_MISS_RATIO = 0.1
+
+
+def _send(base_url: str, token: str, text: str, plugin_id: str = None):
+    """(seconds to the first streamed chunk, seconds to the done event)"""
+    params = {'plugin_id': plugin_id} if plugin_id else {}
+    started = time.perf_counter()
+    first_token = None
+    with requests.post(f'{base_url}/v2/messages', params=params, json={'text': text, 'file_ids': []},
+                       headers={'Authorization': f'Bearer {token}'}, stream=True, timeout=120) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            if line.startswith('done: '):
+                break
+    return first_token, time.perf_counter() - started
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def benchmark(base_url: str, token: str, plugin_id: str = None):
+    for question in QUESTIONS[:WARMUP]:
+        _send(base_url, token, question, plugin_id)
+
+    ttft, total = [], []
+    for _ in range(ROUNDS):
+        for question in QUESTIONS:
+            first_token, done = _send(base_url, token, question, plugin_id)
+            ttft.append(first_token * 1000)
+            total.append(done * 1000)
+
+    print(f'\n{base_url} ({len(ttft)} messages)')
+    print(f'{"":16}{"p50":>10}{"p95":>10}{"mean":>10}')
+    for name, values in [('TTFT (ms)', ttft), ('total (ms)', total)]:
+        print(f'{name:16}{_percentile(values, 50):>10.0f}{_percentile(values, 95):>10.0f}'
+              f'{statistics.mean(values):>10.0f}')
+
+
+def _firestore_read():
+    time.sleep(FIRESTORE_READ_SECONDS)
+
+
+def _firestore_write():
+    time.sleep(FIRESTORE_WRITE_SECONDS)
+
+
+def _redis():
+    time.sleep(REDIS_SECONDS)
+
+
+async def _old_setup(with_app: bool, with_files: bool):
+    """send_message up to the first token before the context cache, every call in turn on the request thread"""
+    _firestore_read()  # get_chat_session
+    if with_files:
+        _firestore_write()  # add_files_to_chat_session
+        _firestore_read()  # get_chat_files
+    _firestore_write()  # add_message_to_chat_session
+    _firestore_write()  # add_message
+    if with_app:
+        _firestore_read()  # get_available_app_by_id
+    _firestore_read()  # get_messages
+    _firestore_read()  # get_user_time_zone, in the graph
+
+
+async def _new_setup(with_app: bool, with_files: bool, cached: bool):
+    """send_message up to the first token: the context, time zone, app and files are read at once"""
+
+    async def load_context():
+        await asyncio.to_thread(_redis)  # get_chat_version
+        if not cached:
+            await asyncio.gather(asyncio.to_thread(_firestore_read), asyncio.to_thread(_firestore_read))
+
+    await asyncio.gather(
+        load_context(),
+        asyncio.to_thread(_firestore_read) if not cached else asyncio.sleep(0),  # time zone, cached for an hour
+        asyncio.to_thread(_firestore_read) if with_app else asyncio.sleep(0),
+        asyncio.to_thread(_firestore_read) if with_files else asyncio.sleep(0),
+    )
+    # the human message and session writes run in the background, off the path to the first token
+
+
+def benchmark_local():
+    results = {'old': [], 'new': []}
+    for i in range(LOCAL_MESSAGES):
+        with_app, with_files = i % 2 == 0, i % 10 == 0
+        cached = (i % round(1 / CONTEXT_MISS_RATIO)) != 0
+        for name, setup in [('old', _old_setup(with_app, with_files)),
+                            ('new', _new_setup(with_app, with_files, cached))]:
+            started = time.perf_counter()
+            asyncio.run(setup)
+            results[name].append((time.perf_counter() - started) * 1000)
+
+    print(f'\nsetup before the first token, local stand-ins ({LOCAL_MESSAGES} messages)')
+    print(f'{"":16}{"p50":>10}{"p95":>10}{"mean":>10}')
+    for name, values in results.items():
+        print(f'{name + " (ms)":16}{_percentile(values, 50):>10.0f}{_percentile(values, 95):>10.0f}'
+              f'{statistics.mean(values):>10.0f}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--local']:
+        benchmark_local()
+        sys.exit(0)
+    token = os.getenv('CHAT_BENCHMARK_TOKEN')
+    if not token or len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for url in sys.argv[1:]:
+        benchmark(url.rstrip('/'), token, os.getenv('CHAT_BENCHMARK_PLUGIN_ID'))
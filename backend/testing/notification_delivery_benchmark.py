@@ -0,0 +1,112 @@
+"""
+Notification delivery against a local FCM stand-in, no network or credentials needed:
+
+    python testing/notification_delivery_benchmark.py
+
+A burst of app notifications (several apps per user, some tokens unregistered) is sent the old way, one FCM
+call per notification, and through the batched delivery service. The stand-in charges a fixed round trip per
+call plus a small cost per message, roughly what send_each costs against FCM.
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from firebase_admin import messaging
+
+from utils.notifications import NOTIFICATION_BATCH_WINDOW_SECONDS, NotificationDelivery
+
+USERS = int(os.getenv('NOTIFICATION_BENCHMARK_USERS', '300'))
+APPS_PER_USER = 4
+UNREGISTERED_RATIO = 0.05
+ROUND_TRIP_SECONDS = 0.08
+PER_MESSAGE_SECONDS = 0.0002
+
+
+class _SendResponse:
+    def __init__(self, exception: Exception = None):
+        self.exception = exception
+        self.success = exception is None
+
+
+class _BatchResponse:
+    def __init__(self, responses):
+        self.responses = responses
+
+
+class LocalFCM:
+    """Answers send_each like FCM, tokens in `unregistered` fail with UnregisteredError"""
+
+    def __init__(self, unregistered: set):
+        self.unregistered = unregistered
+        self.calls = 0
+        self.delivered = 0
+        self._lock = threading.Lock()
+
+    def send_each(self, messages):
+        time.sleep(ROUND_TRIP_SECONDS + PER_MESSAGE_SECONDS * len(messages))
+        responses = []
+        for message in messages:
+            if message.token in self.unregistered:
+                responses.append(_SendResponse(messaging.UnregisteredError('Requested entity was not found.')))
+            else:
+                responses.append(_SendResponse())
+        with self._lock:
+            self.calls += 1
+            self.delivered += sum(1 for response in responses if response.success)
+        return _BatchResponse(responses)
+
+
+def _burst():
+    tokens = [f'token-{i}' for i in range(USERS)]
+    unregistered = set(random.Random(7).sample(tokens, int(USERS * UNREGISTERED_RATIO)))
+    sends = [(token, f'App {a} says', f'message {a} for {token}') for token in tokens for a in range(APPS_PER_USER)]
+    return sends, unregistered
+
+
+def run_single(sends, unregistered):
+    """One send per notification from its own thread, like the old send_notification callers"""
+    fcm = LocalFCM(unregistered)
+    removed = set()
+
+    def send(token, title, body):
+        message = messaging.Message(notification=messaging.Notification(title=title, body=body), token=token)
+        response = fcm.send_each([message]).responses[0]
+        if not response.success:
+            removed.add(token)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=send, args=sending) for sending in sends]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    return fcm, time.perf_counter() - started, len(removed)
+
+
+def run_batched(sends, unregistered):
+    fcm = LocalFCM(unregistered)
+    removed = []
+    delivery = NotificationDelivery(send_each=fcm.send_each, remove_token=removed.append)
+    started = time.perf_counter()
+    for token, title, body in sends:
+        delivery.send(token, title, body, collapse_key='plugin')
+    while delivery.get_metrics()['pending'] or delivery.get_metrics()['batches'] == 0:
+        time.sleep(0.01)
+    delivery.flush()
+    return fcm, time.perf_counter() - started, len(removed), delivery.get_metrics()
+
+
+if __name__ == '__main__':
+    sends, unregistered = _burst()
+    print(f'{len(sends)} notifications to {USERS} users, {len(unregistered)} unregistered tokens\n')
+
+    fcm, elapsed, removed = run_single(sends, unregistered)
+    print(f'single:  {fcm.calls:>5} FCM calls, {fcm.delivered:>5} delivered, {removed:>3} invalid tokens seen, '
+          f'{elapsed * 1000:>7.0f} ms')
+
+    fcm, elapsed, removed, metrics = run_batched(sends, unregistered)
+    print(f'batched: {fcm.calls:>5} FCM calls, {fcm.delivered:>5} delivered, {removed:>3} invalid tokens removed, '
+          f'{elapsed * 1000:>7.0f} ms (including the {NOTIFICATION_BATCH_WINDOW_SECONDS * 1000:.0f} ms window)')
+    print(f'\nmetrics: {metrics}')
@@ -0,0 +1,81 @@
+"""
+Memory and CPU of a 3 hour transcript as TranscriptSegment models vs CompactTranscript columns.
+Run from backend/: python testing/transcript_segments_benchmark.py
+"""
+import random
+import time
+import tracemalloc
+
+from models.transcript_segment import TranscriptSegment, CompactTranscript
+
+HOURS = 3
+# one segment every ~4 seconds, the typical utterance rate of a listen session
+SEGMENTS = HOURS * 60 * 60 // 4
+ROUNDS = 5
+
+WORDS = 'so we should ship the new onboarding flow before friday and then look at retention numbers again'.split()
+
+
+def _segments():
+    random.seed(0)
+    segments, t = [], 0.0
+    for i in range(SEGMENTS):
+        duration = random.uniform(1.0, 3.5)
+        speaker = random.choice([0, 0, 1, 2])
+        segments.append({
+            'id': f'segment-{i}', 'text': ' '.join(random.choices(WORDS, k=random.randint(4, 25))),
+            'speaker': f'SPEAKER_{speaker:02d}', 'is_user': speaker == 0, 'person_id': None,
+            'start': t, 'end': t + duration, 'translations': [],
+        })
+        t += duration + random.uniform(0.1, 0.8)
+    return segments
+
+
+def _memory(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def _cpu(fn):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def _shift_models(segments):
+    for segment in segments:
+        segment.start += 12.5
+        segment.end += 12.5
+
+
+def main():
+    raw = _segments()
+    models, models_bytes = _memory(lambda: [TranscriptSegment(**segment) for segment in raw])
+    compact, compact_bytes = _memory(lambda: CompactTranscript.from_dicts(raw))
+    assert compact.as_string(include_timestamps=True) == \
+           TranscriptSegment.segments_as_string(models, include_timestamps=True)
+    assert compact.as_string() == TranscriptSegment.segments_as_string(models)
+    assert compact.to_dicts() == [segment.dict() for segment in models]
+
+    print(f'{SEGMENTS} segments, {HOURS}h transcript, best of {ROUNDS} rounds\n')
+    print(f'{"":28}{"TranscriptSegment":>20}{"CompactTranscript":>20}')
+    print(f'{"memory (KiB)":28}{models_bytes / 1024:>20.0f}{compact_bytes / 1024:>20.0f}')
+    rows = [
+        ('build from dicts (ms)', lambda: [TranscriptSegment(**segment) for segment in raw],
+         lambda: CompactTranscript.from_dicts(raw)),
+        ('time shift (ms)', lambda: _shift_models(models), lambda: compact.shift(12.5)),
+        ('serialize to dicts (ms)', lambda: [segment.dict() for segment in models], compact.to_dicts),
+        ('render transcript (ms)', lambda: TranscriptSegment.segments_as_string(models), compact.as_string),
+    ]
+    for name, model_fn, compact_fn in rows:
+        print(f'{name:28}{_cpu(model_fn):>20.2f}{_cpu(compact_fn):>20.2f}')
+
+
+if __name__ == '__main__':
+    main()
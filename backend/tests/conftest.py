@@ -0,0 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Firestore, Storage and OpenAI clients are created when their modules are imported, these let them be created
+# without credentials. The tests only cover code that never calls them.
+os.environ.setdefault('FIRESTORE_EMULATOR_HOST', 'localhost:8080')
+os.environ.setdefault('STORAGE_EMULATOR_HOST', 'http://localhost:9023')
+os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'test')
+os.environ.setdefault('OPENAI_API_KEY', 'test')
@@ -0,0 +1,42 @@
+from models.transcript_segment import TranscriptSegment
+from utils.conversations.discard import prefilter_discard, LLM_DISCARD_MAX_WORDS
+
+
+def _segments(*texts: str, seconds: float = 10, speakers: int = 1):
+    return [
+        TranscriptSegment(text=text, speaker=f'SPEAKER_0{i % speakers}', is_user=False, start=i * seconds,
+                          end=(i + 1) * seconds)
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_short_fillers_are_discarded():
+    assert prefilter_discard(_segments('um, uh')) is True
+    assert prefilter_discard(_segments('')) is True
+
+
+def test_short_transcripts_with_content_go_to_the_llm():
+    assert prefilter_discard(_segments('call mom tomorrow')) is None
+
+
+def test_assistant_commands_are_discarded():
+    assert prefilter_discard(_segments('hey siri set an alarm for six tomorrow morning please')) is True
+
+
+def test_real_exchanges_are_kept():
+    segments = _segments(
+        'We should move the product launch to March because the supplier delayed the batteries.',
+        'Agreed, marketing needs the new packaging designs and the pricing spreadsheet by Friday.',
+        'I will ask Sarah about the warehouse contract and the shipping insurance quotes.',
+        'Great, then we review budgets, hiring plans and the investor update next Tuesday.',
+        seconds=15, speakers=2,
+    )
+    assert prefilter_discard(segments) is False
+
+
+def test_other_scripts_go_to_the_llm():
+    assert prefilter_discard(_segments('Привет, как дела? Давай встретимся завтра утром в кафе.')) is None
+
+
+def test_transcripts_the_llm_never_sees_are_left_alone():
+    assert prefilter_discard(_segments(' '.join(['word'] * (LLM_DISCARD_MAX_WORDS + 1)))) is None
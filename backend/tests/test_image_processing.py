@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from utils.other.image_processing import is_near_duplicate, prepare_image
+
+
+def _page(lines, scale: float = 1, quality=95) -> bytes:
+    image = Image.new('RGB', (800, 1000), 'white')
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, 40 + i * 30), line, fill='black')
+        draw.rectangle((40, 55 + i * 30, 40 + 12 * len(line), 60 + i * 30), fill='black')
+    if scale != 1:
+        image = image.resize((int(800 * scale), int(1000 * scale)), Image.Resampling.BICUBIC)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def _photo(seed: int) -> bytes:
+    pixels = np.random.default_rng(seed).integers(0, 256, (600, 800, 3), dtype=np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).resize((1600, 1200), Image.Resampling.BICUBIC).save(output, format='JPEG')
+    return output.getvalue()
+
+
+LINES = [f'line {i} of the meeting notes, nothing special' for i in range(20)]
+
+
+def test_reencoded_and_rescaled_copies_are_duplicates():
+    a = prepare_image(_page(LINES)).fingerprint
+    b = prepare_image(_page(LINES, scale=0.6, quality=70)).fingerprint
+    assert is_near_duplicate(a, a)
+    assert is_near_duplicate(a, b)
+
+
+def test_a_changed_line_is_not_a_duplicate():
+    changed = LINES[:10] + ['the budget was approved'] + LINES[11:]
+    assert not is_near_duplicate(prepare_image(_page(LINES)).fingerprint, prepare_image(_page(changed)).fingerprint)
+
+
+def test_different_pictures_are_not_duplicates():
+    assert not is_near_duplicate(prepare_image(_photo(1)).fingerprint, prepare_image(_photo(2)).fingerprint)
+
+
+def test_images_without_fingerprint_are_never_duplicates():
+    fingerprint = prepare_image(_photo(1)).fingerprint
+    assert prepare_image(b'not an image').fingerprint is None
+    assert not is_near_duplicate(fingerprint, None)
+    assert not is_near_duplicate(None, None)
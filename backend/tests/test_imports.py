@@ -0,0 +1,8 @@
+import importlib
+
+import pytest
+
+
+@pytest.mark.parametrize('module', ['database.redis_db', 'database.chat', 'database.users'])
+def test_module_imports(module):
+    importlib.import_module(module)
@@ -0,0 +1,42 @@
+from models.transcript_segment import TranscriptSegment
+from utils.llms.long_transcript import split_segments_into_chunks, CHUNK_MAX_SEGMENTS, CHUNK_SPEAKER_GRACE_SECONDS, \
+    CHUNK_WINDOW_SECONDS
+
+
+def _segment(start: float, end: float = None, speaker: str = 'SPEAKER_00', is_user: bool = False):
+    return TranscriptSegment(text=f'at {start}', speaker=speaker, is_user=is_user, start=start,
+                             end=start + 5 if end is None else end)
+
+
+def test_no_segments():
+    assert split_segments_into_chunks([]) == []
+
+
+def test_chunks_are_cut_at_window_ends_on_speaker_changes():
+    segments = [
+        _segment(0), _segment(CHUNK_WINDOW_SECONDS - 10),
+        _segment(CHUNK_WINDOW_SECONDS + 5, speaker='SPEAKER_01'), _segment(CHUNK_WINDOW_SECONDS + 20),
+    ]
+    chunks = split_segments_into_chunks(segments)
+    assert chunks == [segments[:2], segments[2:]]
+
+
+def test_current_speaker_finishes_within_the_grace_period():
+    segments = [
+        _segment(0), _segment(CHUNK_WINDOW_SECONDS + 5),
+        _segment(CHUNK_WINDOW_SECONDS + CHUNK_SPEAKER_GRACE_SECONDS + 1),
+    ]
+    chunks = split_segments_into_chunks(segments)
+    assert chunks == [segments[:2], segments[2:]]
+
+
+def test_chunks_keep_their_windows_when_an_earlier_part_changes():
+    segments = [_segment(i * 60, speaker=f'SPEAKER_0{i % 2}') for i in range(30)]
+    edited = [_segment(0, speaker='SPEAKER_05')] + segments[1:]
+    assert split_segments_into_chunks(segments)[1:] == split_segments_into_chunks(edited)[1:]
+
+
+def test_untimed_segments_are_cut_by_count():
+    segments = [_segment(0, end=0) for _ in range(CHUNK_MAX_SEGMENTS * 2 + 1)]
+    chunks = split_segments_into_chunks(segments)
+    assert [len(chunk) for chunk in chunks] == [CHUNK_MAX_SEGMENTS, CHUNK_MAX_SEGMENTS, 1]
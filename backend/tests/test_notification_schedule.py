@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytz
+
+from utils.other.notification_schedule import timezones_at_local_time, is_local_time_anywhere
+
+
+def _brute_force(target_time: str, now: datetime):
+    return sorted(
+        tz_name for tz_name in pytz.all_timezones
+        if now.astimezone(pytz.timezone(tz_name)).strftime('%H:%M') == target_time
+    )
+
+
+def test_matches_every_time_zone_at_the_target_time():
+    for now in [datetime(2025, 1, 15, 3, 0, tzinfo=pytz.utc), datetime(2025, 7, 15, 20, 30, tzinfo=pytz.utc),
+                datetime(2025, 3, 30, 12, 45, tzinfo=pytz.utc)]:
+        for target_time in ['08:00', '22:00', '17:15']:
+            assert sorted(timezones_at_local_time(target_time, now)) == _brute_force(target_time, now)
+
+
+def test_follows_daylight_saving_time():
+    winter = datetime(2025, 1, 15, 13, 0, tzinfo=pytz.utc)
+    summer = datetime(2025, 7, 15, 12, 0, tzinfo=pytz.utc)
+    assert 'America/New_York' in timezones_at_local_time('08:00', winter)
+    assert 'America/New_York' in timezones_at_local_time('08:00', summer)
+
+
+def test_offsets_on_both_sides_of_utc():
+    now = datetime(2025, 1, 15, 8, 0, tzinfo=pytz.utc)
+    # UTC+14 is at 22:00 and UTC-10 at 22:00 of the day before
+    assert 'Pacific/Kiritimati' in timezones_at_local_time('22:00', now)
+    assert 'Pacific/Honolulu' in timezones_at_local_time('22:00', now)
+    assert 'Asia/Kolkata' in timezones_at_local_time('13:30', now)
+
+
+def test_is_local_time_anywhere():
+    now = datetime(2025, 1, 15, 8, 0, tzinfo=pytz.utc)
+    assert is_local_time_anywhere(['08:00', '22:00'], now)
+    # no time zone is 7 minutes off a quarter hour
+    assert not is_local_time_anywhere(['08:07'], now)
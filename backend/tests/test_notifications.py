@@ -0,0 +1,32 @@
+from utils.notifications import _PendingNotification, NOTIFICATION_MERGED_BODY_BYTES, NOTIFICATION_MERGED_PARTS
+
+
+def test_a_single_send_is_left_as_it_is():
+    body = 'x' * (NOTIFICATION_MERGED_BODY_BYTES * 2)
+    message = _PendingNotification('token', 'omi says', body, {'id': '1'}, 'chat').to_message()
+    assert message.notification.title == 'omi says'
+    assert message.notification.body == body
+    assert message.data == {'id': '1'}
+    assert message.android.collapse_key == 'chat'
+    assert message.apns.headers == {'apns-collapse-id': 'chat'}
+
+
+def test_sends_with_one_title_are_joined():
+    pending = _PendingNotification('token', 'omi says', 'first', {'id': '1'}, None)
+    pending.merge('omi says', 'second', {'id': '2'})
+    message = pending.to_message()
+    assert message.notification.title == 'omi says'
+    assert message.notification.body == 'first\nsecond'
+    assert message.data == {'id': '2'}
+    assert message.android is None
+
+
+def test_merged_bodies_show_the_latest_parts_within_the_byte_limit():
+    pending = _PendingNotification('token', 'a', 'é' * 1000, None, None)
+    for i in range(NOTIFICATION_MERGED_PARTS + 2):
+        pending.merge('b' if i % 2 else 'c', 'é' * 1000, None)
+    message = pending.to_message()
+    assert message.notification.title == f'{NOTIFICATION_MERGED_PARTS + 3} new messages'
+    assert message.notification.body.startswith('3 earlier messages…\n')
+    assert message.notification.body.endswith('…')
+    assert len(message.notification.body.encode('utf-8')) <= NOTIFICATION_MERGED_BODY_BYTES
@@ -0,0 +1,33 @@
+from models.transcript_segment import CompactTranscript, TranscriptSegment
+
+
+def _dicts():
+    return [
+        {'id': '1', 'text': 'hello', 'speaker': 'SPEAKER_00', 'is_user': True, 'start': 1.5, 'end': 2.0},
+        {'id': '2', 'text': 'hi', 'speaker': 'SPEAKER_01', 'is_user': False, 'start': 2.5, 'end': 4.0,
+         'translations': [{'lang': 'es', 'text': 'hola'}]},
+        {'id': '3', 'text': 'how are you', 'speaker': 'SPEAKER_00', 'is_user': True, 'start': 4.0, 'end': 6.25},
+    ]
+
+
+def test_shift_moves_every_segment():
+    transcript = CompactTranscript.from_dicts(_dicts()).shift(10)
+    assert [(s['start'], s['end']) for s in transcript.to_dicts()] == [(11.5, 12.0), (12.5, 14.0), (14.0, 16.25)]
+    transcript.shift(-11.5)
+    assert transcript.to_dicts()[0]['start'] == 0
+    assert transcript.shift(0).to_dicts()[0]['start'] == 0
+
+
+def test_round_trip_matches_the_models():
+    segments = [TranscriptSegment(**segment) for segment in _dicts()]
+    transcript = CompactTranscript.from_segments(segments)
+    assert transcript.to_dicts() == [segment.dict() for segment in segments]
+    assert transcript.to_segments() == segments
+
+
+def test_slices_keep_speakers_and_translations():
+    part = CompactTranscript.from_dicts(_dicts())[1:]
+    assert len(part) == 2
+    assert part[0].speaker == 'SPEAKER_01' and part[0].speaker_id == 1
+    assert part[0].translations[0].text == 'hola'
+    assert part[-1].text == 'how are you'
@@ -0,0 +1,29 @@
+from utils.tts.synthesis import split_text_for_tts, TTS_CHUNK_MAX_CHARS, TTS_FIRST_CHUNK_MAX_CHARS
+
+
+def test_short_text_is_one_chunk():
+    assert split_text_for_tts('Hello there. How are you?') == ['Hello there. How are you?']
+    assert split_text_for_tts('') == []
+
+
+def test_chunks_end_at_sentence_boundaries_within_their_limits():
+    sentences = [f'This is sentence number {i} of a long answer.' for i in range(100)]
+    chunks = split_text_for_tts(' '.join(sentences))
+    assert len(chunks[0]) <= TTS_FIRST_CHUNK_MAX_CHARS
+    assert all(len(chunk) <= TTS_CHUNK_MAX_CHARS for chunk in chunks)
+    assert all(chunk.endswith('.') for chunk in chunks)
+    assert ' '.join(chunks) == ' '.join(sentences)
+
+
+def test_long_sentences_are_cut_at_words():
+    sentence = ' '.join(['word'] * 600)
+    chunks = split_text_for_tts(sentence)
+    assert len(chunks[0]) <= TTS_FIRST_CHUNK_MAX_CHARS
+    assert all(len(chunk) <= TTS_CHUNK_MAX_CHARS for chunk in chunks)
+    assert ' '.join(chunks) == sentence
+
+
+def test_words_longer_than_a_chunk_are_truncated():
+    url = 'https://example.com/' + 'a' * 3000
+    chunks = split_text_for_tts(f'Open {url} now.')
+    assert all(len(chunk) <= TTS_CHUNK_MAX_CHARS + len('...') for chunk in chunks)
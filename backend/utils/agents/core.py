@@ -14,6 +14,7 @@ from langgraph.checkpoint.memory import MemorySaver
 
 from models.conversation import Conversation, CreateConversation
 from utils.agents.tools import get_agent_tools
+from utils.agents.retrieval import MAX_CONCURRENT_TOOL_CALLS
 from utils.llms.memory import get_prompt_memories
 from utils.llm import retrieve_memory_context_params
 from utils.langsmith_wrapper import pull_prompt, format_prompt
@@ -72,6 +73,7 @@ YOUR CAPABILITIES:
 
 MANDATORY TOOL USAGE WORKFLOW:
 1. ALWAYS start with conversation_retrieval to find relevant past conversations
+   (use multi_conversation_retrieval when you need context on several topics at once)
 2. ALWAYS use web_search when:
    - User asks about specific places, restaurants, services, or businesses
    - Current information would be helpful (prices, hours, reviews, locations)
@@ -389,7 +391,7 @@ CONVERSATION METADATA:
                 print(f"🔍 AGENT_DEBUG: Using fallback prompt, length: {len(analysis_prompt)}")
 
             # Configure the agent with conversation config
-            config = {"configurable": {"thread_id": session_id}}
+            config = {"configurable": {"thread_id": session_id}, "max_concurrency": MAX_CONCURRENT_TOOL_CALLS}
             
             print(f"🔥 DUPLICATE_DEBUG: About to call self.agent.invoke() - this will trigger LangGraph")
             print(f"🔥 DUPLICATE_DEBUG: - session_id: {session_id}")
@@ -554,7 +556,7 @@ CONVERSATION TRANSCRIPT:
 
 Please provide a comprehensive analysis with actionable recommendations. Do NOT include a title or header - start directly with your analysis content."""
 
-            config = {"configurable": {"thread_id": session_id}}
+            config = {"configurable": {"thread_id": session_id}, "max_concurrency": MAX_CONCURRENT_TOOL_CALLS}
             
             # Stream the agent execution
             for event in self.agent.stream(
@@ -600,7 +602,7 @@ Please provide a comprehensive analysis with actionable recommendations. Do NOT
             Agent's response
         """
         try:
-            config = {"configurable": {"thread_id": session_id}}
+            config = {"configurable": {"thread_id": session_id}, "max_concurrency": MAX_CONCURRENT_TOOL_CALLS}
             
             result = self.agent.invoke(
                 {"messages": [{"role": "user", "content": user_message}]},
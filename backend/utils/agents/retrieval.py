@@ -0,0 +1,177 @@
+"""
+Retrieval service shared by the agent conversation tools
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Callable, Tuple
+
+from database.conversations import get_conversations_by_id
+from database.vector_db import query_vectors, query_vectors_by_metadata
+from models.conversation import Conversation
+from utils.llm import embeddings
+
+# Longest preview any tool returns; shorter previews are sliced from it
+MAX_PREVIEW_LENGTH = 300
+
+# How long a user's retrieval session (embeddings + summaries) is kept around
+SESSION_TTL_SECONDS = 60 * 15
+
+# Upper bound of tool calls from a single ReAct step that run at the same time
+MAX_CONCURRENT_TOOL_CALLS = 8
+
+
+class AgentRetrievalService:
+    """
+    Per-user retrieval session for the agent tools.
+
+    Query embeddings and formatted conversation summaries are cached for the
+    lifetime of the session, so repeated or overlapping retrievals inside one
+    agent turn only pay for Pinecone and Firestore once.
+    """
+
+    def __init__(self, uid: str):
+        self.uid = uid
+        self._lock = threading.Lock()
+        # {query: Future[List[float]]}, futures so concurrent calls share one embedding request
+        self._embeddings: Dict[str, Future] = {}
+        # {conversation_id: summary dict with precomputed preview}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+
+    def embed(self, query: str) -> List[float]:
+        with self._lock:
+            future = self._embeddings.get(query)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._embeddings[query] = future
+
+        if owner:
+            try:
+                future.set_result(embeddings.embed_query(query))
+            except Exception as e:
+                with self._lock:
+                    self._embeddings.pop(query, None)
+                future.set_exception(e)
+        return future.result()
+
+    @staticmethod
+    def _build_summary(conv: Conversation) -> Dict[str, Any]:
+        transcript = conv.get_transcript(False)
+        structured = conv.structured
+        return {
+            "id": conv.id,
+            "title": structured.title if structured else "No title",
+            "overview": structured.overview if structured else "No overview",
+            "created_at": conv.created_at.isoformat(),
+            "category": structured.category if structured else None,
+            "action_items": [item.content if hasattr(item, 'content') else str(item)
+                             for item in (structured.action_items if structured else [])],
+            "people_mentioned": getattr(structured, 'people_mentioned', []) if structured else [],
+            "topics": getattr(structured, 'topics', []) if structured else [],
+            "_transcript_head": transcript[:MAX_PREVIEW_LENGTH],
+            "_transcript_length": len(transcript),
+        }
+
+    @staticmethod
+    def _with_preview(summary: Dict[str, Any], preview_length: int, fields: List[str]) -> Dict[str, Any]:
+        result = {field: summary[field] for field in fields}
+        head = summary["_transcript_head"]
+        if summary["_transcript_length"] > preview_length:
+            result["transcript_preview"] = head[:preview_length] + "..."
+        else:
+            result["transcript_preview"] = head
+        return result
+
+    def get_summaries(self, conversation_ids: List[str]) -> List[Dict[str, Any]]:
+        """Summaries for the given ids in ranking order, fetching only the uncached ones."""
+        with self._lock:
+            missing = [cid for cid in conversation_ids if cid not in self._summaries]
+
+        if missing:
+            fetched = {}
+            for data in get_conversations_by_id(self.uid, missing):
+                conv = Conversation(**data)
+                fetched[conv.id] = self._build_summary(conv)
+            with self._lock:
+                self._summaries.update(fetched)
+
+        with self._lock:
+            return [self._summaries[cid] for cid in conversation_ids if cid in self._summaries]
+
+    def retrieve(self, query: str, start_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None,
+                 max_results: int = 5) -> List[Dict[str, Any]]:
+        conversation_ids = query_vectors(
+            query=query,
+            uid=self.uid,
+            starts_at=start_timestamp,
+            ends_at=end_timestamp,
+            k=max_results,
+            vector=self.embed(query),
+        )
+        if not conversation_ids:
+            return []
+
+        fields = ["id", "title", "overview", "created_at", "category", "action_items"]
+        return [self._with_preview(s, 200, fields) for s in self.get_summaries(conversation_ids)]
+
+    def advanced_retrieve(self, query: str, people: Optional[List[str]] = None, topics: Optional[List[str]] = None,
+                          entities: Optional[List[str]] = None, start_timestamp: Optional[int] = None,
+                          end_timestamp: Optional[int] = None, max_results: int = 5) -> List[Dict[str, Any]]:
+        conversation_ids = query_vectors_by_metadata(
+            uid=self.uid,
+            vector=self.embed(query),
+            dates_filter=[
+                datetime.fromtimestamp(start_timestamp) if start_timestamp else None,
+                datetime.fromtimestamp(end_timestamp) if end_timestamp else None
+            ] if start_timestamp or end_timestamp else [None, None],
+            people=people or [],
+            topics=topics or [],
+            entities=entities or [],
+            dates=[],
+            limit=max_results
+        )
+        if not conversation_ids:
+            return []
+
+        fields = ["id", "title", "overview", "created_at", "category", "action_items", "people_mentioned", "topics"]
+        return [self._with_preview(s, MAX_PREVIEW_LENGTH, fields) for s in self.get_summaries(conversation_ids)]
+
+    @staticmethod
+    def run_concurrently(calls: List[Tuple[Callable, Dict[str, Any]]]) -> List[Any]:
+        """Run independent retrieval calls in parallel, returning results (or exceptions) in call order."""
+        if not calls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(calls), MAX_CONCURRENT_TOOL_CALLS)) as executor:
+            futures = [executor.submit(fn, **kwargs) for fn, kwargs in calls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+_services: Dict[str, Tuple[AgentRetrievalService, float]] = {}  # {uid: (service, expires_at)}
+_services_lock = threading.Lock()
+
+
+def get_retrieval_service(uid: str) -> AgentRetrievalService:
+    now = time.time()
+    with _services_lock:
+        for key in [k for k, (_, ex) in _services.items() if ex < now]:
+            del _services[key]
+
+        if uid in _services:
+            service, _ = _services[uid]
+        else:
+            service = AgentRetrievalService(uid)
+        _services[uid] = (service, now + SESSION_TTL_SECONDS)
+        return service
+
+
+def clear_retrieval_service(uid: str):
+    with _services_lock:
+        _services.pop(uid, None)
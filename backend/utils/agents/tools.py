@@ -2,7 +2,6 @@
 Agent tools for conversation analysis and retrieval
 """
 from typing import List, Optional, Dict, Any
-from datetime import datetime
 import os
 from langchain.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
@@ -11,10 +10,7 @@ from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
 from pydantic import BaseModel, Field
 
-from database.vector_db import query_vectors, query_vectors_by_metadata
-from database.conversations import get_conversations_by_id
-from models.conversation import Conversation
-from utils.llm import generate_embedding
+from utils.agents.retrieval import get_retrieval_service
 
 
 class PineconeRetrievalInput(BaseModel):
@@ -60,40 +56,17 @@ def pinecone_conversation_retrieval(
         Dictionary containing retrieved conversations with summaries and metadata
     """
     try:
-        # Query Pinecone for relevant conversation IDs
-        conversation_ids = query_vectors(
-            query=query,
-            uid=uid,
-            starts_at=start_timestamp,
-            ends_at=end_timestamp,
-            k=max_results
+        formatted_conversations = get_retrieval_service(uid).retrieve(
+            query, start_timestamp=start_timestamp, end_timestamp=end_timestamp, max_results=max_results
         )
-        
-        if not conversation_ids:
+
+        if not formatted_conversations:
             return {
                 "conversations": [],
                 "count": 0,
                 "message": "No relevant conversations found"
             }
-        
-        # Retrieve full conversation data from database
-        conversations_data = get_conversations_by_id(uid, conversation_ids)
-        conversations = [Conversation(**conv) for conv in conversations_data]
-        
-        # Format response with key information
-        formatted_conversations = []
-        for conv in conversations:
-            formatted_conversations.append({
-                "id": conv.id,
-                "title": conv.structured.title if conv.structured else "No title",
-                "overview": conv.structured.overview if conv.structured else "No overview",
-                "created_at": conv.created_at.isoformat(),
-                "category": conv.structured.category if conv.structured else None,
-                "action_items": [item.content if hasattr(item, 'content') else str(item) 
-                               for item in (conv.structured.action_items if conv.structured else [])],
-                "transcript_preview": conv.get_transcript(False)[:200] + "..." if len(conv.get_transcript(False)) > 200 else conv.get_transcript(False)
-            })
-        
+
         return {
             "conversations": formatted_conversations,
             "count": len(formatted_conversations),
@@ -136,51 +109,18 @@ def advanced_pinecone_retrieval(
         Dictionary with retrieved conversations and metadata
     """
     try:
-        # Generate embedding for the query
-        vector = generate_embedding(query)
-        
-        # Use advanced metadata search
-        conversation_ids = query_vectors_by_metadata(
-            uid=uid,
-            vector=vector,
-            dates_filter=[
-                datetime.fromtimestamp(start_timestamp) if start_timestamp else None,
-                datetime.fromtimestamp(end_timestamp) if end_timestamp else None
-            ] if start_timestamp or end_timestamp else [None, None],
-            people=people or [],
-            topics=topics or [],
-            entities=entities or [],
-            dates=[],
-            limit=max_results
+        formatted_conversations = get_retrieval_service(uid).advanced_retrieve(
+            query, people=people, topics=topics, entities=entities,
+            start_timestamp=start_timestamp, end_timestamp=end_timestamp, max_results=max_results
         )
-        
-        if not conversation_ids:
+
+        if not formatted_conversations:
             return {
                 "conversations": [],
                 "count": 0,
                 "message": "No conversations found matching the criteria"
             }
-        
-        # Get full conversation data
-        conversations_data = get_conversations_by_id(uid, conversation_ids)
-        conversations = [Conversation(**conv) for conv in conversations_data]
-        
-        # Format response
-        formatted_conversations = []
-        for conv in conversations:
-            formatted_conversations.append({
-                "id": conv.id,
-                "title": conv.structured.title if conv.structured else "No title",
-                "overview": conv.structured.overview if conv.structured else "No overview", 
-                "created_at": conv.created_at.isoformat(),
-                "category": conv.structured.category if conv.structured else None,
-                "action_items": [item.content if hasattr(item, 'content') else str(item) 
-                               for item in (conv.structured.action_items if conv.structured else [])],
-                "people_mentioned": getattr(conv.structured, 'people_mentioned', []) if conv.structured else [],
-                "topics": getattr(conv.structured, 'topics', []) if conv.structured else [],
-                "transcript_preview": conv.get_transcript(False)[:300] + "..." if len(conv.get_transcript(False)) > 300 else conv.get_transcript(False)
-            })
-        
+
         return {
             "conversations": formatted_conversations,
             "count": len(formatted_conversations),
@@ -373,9 +313,35 @@ def get_agent_tools(uid: str) -> List:
         return advanced_pinecone_retrieval.func(query, uid, people, topics, entities, 
                                          start_timestamp, end_timestamp, max_results)
     
+    @tool("multi_conversation_retrieval")
+    def bound_multi_retrieval(queries: List[str], start_timestamp: Optional[int] = None,
+                              end_timestamp: Optional[int] = None, max_results: int = 5):
+        """
+        Retrieve relevant past conversations for several search queries at once.
+        Prefer this over calling conversation_retrieval repeatedly when you need context on multiple topics.
+
+        Args:
+            queries: Search queries, one per topic, person or event
+            start_timestamp: Optional start timestamp filter (Unix timestamp)
+            end_timestamp: Optional end timestamp filter (Unix timestamp)
+            max_results: Maximum number of conversations to retrieve per query
+        """
+        service = get_retrieval_service(uid)
+        calls = [(pinecone_conversation_retrieval.func,
+                  {"query": q, "uid": uid, "start_timestamp": start_timestamp,
+                   "end_timestamp": end_timestamp, "max_results": max_results}) for q in queries]
+        results = service.run_concurrently(calls)
+        return {
+            query: result if not isinstance(result, Exception) else {
+                "conversations": [], "count": 0, "error": f"Error retrieving conversations: {str(result)}"
+            }
+            for query, result in zip(queries, results)
+        }
+
     return [
         bound_pinecone_retrieval,
         bound_advanced_retrieval,
+        bound_multi_retrieval,
         web_search_tool,
         azure_agent_tool
     ] 
\ No newline at end of file
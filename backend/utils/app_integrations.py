@@ -133,7 +133,7 @@ def trigger_external_integrations(uid: str, conversation: Conversation) -> list:
     for key, message in results.items():
         if not message:
             continue
-        messages.append(add_plugin_message(message, key, uid, conversation.id))
+        messages.append(add_plugin_message(message, key, uid, conversation))
     return messages
 
 
@@ -359,4 +359,6 @@ def send_app_notification(token: str, app_name: str, app_id: str, message: str):
         navigate_to=f'/chat/{app_id}',
     )
 
-    send_notification(token, app_name + ' says', message, NotificationMessage.get_message_as_dict(ai_message))
+    # bursts from several apps reach the user as one notification
+    send_notification(token, app_name + ' says', message, NotificationMessage.get_message_as_dict(ai_message),
+                      collapse_key='plugin')
@@ -1,5 +1,6 @@
+import concurrent.futures
 import os
-import threading
+import time
 from collections import defaultdict
 from datetime import datetime, timezone
 from typing import List, Tuple, Dict, Any
@@ -12,25 +13,34 @@ from database.apps import get_private_apps_db, get_public_unapproved_apps_db, \
     add_tester_db, add_app_access_for_tester_db, remove_app_access_for_tester_db, remove_tester_db, \
     is_tester_db, can_tester_access_app_db, get_apps_for_tester_db, get_app_chat_message_sent_usage_count_db, \
     update_app_in_db, get_audio_apps_count, get_persona_by_uid_db, update_persona_in_db, \
-    get_omi_personas_by_uid_db, get_api_key_by_hash_db, get_popular_apps_db
+    get_omi_personas_by_uid_db, get_api_key_by_hash_db, get_popular_apps_db, get_persona_state_db, set_persona_state_db
 from database.auth import get_user_name
 from database.conversations import get_conversations
-from database.memories import get_memories, get_user_public_memories
+from database.memories import get_memories, get_user_public_memories, get_memories_by_ids
 from database.redis_db import get_enabled_plugins, get_plugin_reviews, get_generic_cache, \
     set_generic_cache, set_app_usage_history_cache, get_app_usage_history_cache, get_app_money_made_cache, \
     set_app_money_made_cache, get_plugins_installs_count, get_plugins_reviews, get_app_cache_by_id, set_app_cache_by_id, \
     set_app_review_cache, get_app_usage_count_cache, set_app_money_made_amount_cache, get_app_money_made_amount_cache, \
-    set_app_usage_count_cache, set_user_paid_app, get_user_paid_app, delete_app_cache_by_id, is_username_taken
+    set_app_usage_count_cache, set_user_paid_app, get_user_paid_app, delete_app_cache_by_id, is_username_taken, \
+    add_persona_pending_items, get_persona_built_at, set_persona_built, schedule_persona_rebuild, \
+    get_due_persona_rebuilds, claim_persona_rebuild
 from database.users import get_stripe_connect_account_id
 from models.app import App, UsageHistoryItem, UsageHistoryType
 from models.conversation import Conversation
 from utils import stripe
-from utils.llm import condense_conversations, condense_memories, generate_persona_description, condense_tweets
+from utils.llm import condense_conversations, condense_memories, generate_persona_description, condense_tweets, \
+    fold_condensed_memories, fold_condensed_conversations
 from utils.social import get_twitter_timeline, TwitterProfile, get_twitter_profile
 
 MarketplaceAppReviewUIDs = os.getenv('MARKETPLACE_APP_REVIEWERS').split(',') if os.getenv(
     'MARKETPLACE_APP_REVIEWERS') else []
 
+# Persona prompts are refreshed at most once per interval, unless this many memories and conversations piled up
+PERSONA_REBUILD_INTERVAL_SECONDS = 30 * 60
+PERSONA_REBUILD_MIN_ITEMS = 10
+# Incremental updates to a persona's condensed texts before they are condensed from scratch again
+PERSONA_MAX_FOLDS = 20
+
 
 # ********************************
 # ************ TESTER ************
@@ -499,58 +509,69 @@ def generate_persona_desc(uid: str, persona_name: str):
     return persona_description
 
 
-def update_personas_async(uid: str):
+def update_personas_async(uid: str, force: bool = False):
+    """
+    Refreshes the user's personas after new memories or conversations, debounced: at most once per
+    PERSONA_REBUILD_INTERVAL_SECONDS unless PERSONA_REBUILD_MIN_ITEMS piled up, the rest is deferred to one later run.
+    The deferred run is kept in Redis, the next update or rebuild_due_personas (cron) picks it up once due.
+    """
+    pending = add_persona_pending_items(uid) or 0
+    built_at = get_persona_built_at(uid)
+    remaining = built_at + PERSONA_REBUILD_INTERVAL_SECONDS - time.time() if built_at else 0
+    if not force and remaining > 0 and pending < PERSONA_REBUILD_MIN_ITEMS:
+        schedule_persona_rebuild(uid, time.time() + remaining)
+        print(f"[PERSONAS] Debounced persona updates for uid={uid}, {pending} pending items")
+        return
+    # this run covers the deferred one
+    claim_persona_rebuild(uid)
+    _rebuild_personas(uid)
+
+
+def rebuild_due_personas():
+    """Runs the deferred persona rebuilds that are due, for the cron"""
+    for uid in get_due_persona_rebuilds(time.time()) or []:
+        if claim_persona_rebuild(uid):
+            _rebuild_personas(uid)
+
+
+def _rebuild_personas(uid: str):
     print(f"[PERSONAS] Starting persona updates in background thread for uid={uid}")
+    started_at = time.time()
     personas = get_omi_personas_by_uid_db(uid)
     if personas:
-        threads = []
-        for persona in personas:
-            threads.append(threading.Thread(target=sync_update_persona_prompt, args=(persona,)))
-
-        [t.start() for t in threads]
-        [t.join() for t in threads]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(personas)) as executor:
+            succeeded = all(list(executor.map(sync_update_persona_prompt, personas)))
+        if not succeeded:
+            # pending items stay counted, the rebuild is tried again later
+            schedule_persona_rebuild(uid, time.time() + PERSONA_REBUILD_INTERVAL_SECONDS)
+            print(f"[PERSONAS] Persona updates failed for uid={uid}, retrying later")
+            return
         print(f"[PERSONAS] Finished persona updates in background thread for uid={uid}")
     else:
         print(f"[PERSONAS] No personas found for uid={uid}")
+    set_persona_built(uid, started_at)
 
 
 def sync_update_persona_prompt(persona: dict):
-    """Synchronous wrapper for update_persona_prompt"""
+    """Synchronous wrapper for update_persona_prompt, returns whether it succeeded"""
     import asyncio
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
-        return loop.run_until_complete(update_persona_prompt(persona))
+        loop.run_until_complete(update_persona_prompt(persona))
+        return True
     except Exception as e:
         print(f"Error in update_persona_prompt for persona {persona.get('id', 'unknown')}: {str(e)}")
-        return None
+        return False
     finally:
         loop.close()
 
 
-async def update_persona_prompt(persona: dict):
-    """Update a persona's chat prompt with latest memories and conversations."""
-    # Get latest memories and user info
-    memories = get_user_public_memories(persona['uid'], limit=250)
-    user_name = get_user_name(persona['uid'])
-
-    # Get and condense recent conversations
-    conversations = get_conversations(persona['uid'], limit=100)
-    conversation_history = Conversation.conversations_to_string(conversations)
-    conversation_history = condense_conversations([conversation_history])
+def _content_digest(content: str) -> str:
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
 
-    condensed_tweets = None
-    # Condense tweets
-    if "twitter" in persona['connected_accounts'] and 'twitter' in persona:
-        # Get latest tweets
-        timeline = await get_twitter_timeline(persona['twitter']['username'])
-        tweets = [tweet.text for tweet in timeline.timeline]
-        condensed_tweets = condense_tweets(tweets, persona['name'])
 
-    # Condense memories
-    memories_text = condense_memories([memory['content'] for memory in memories if not memory['deleted']], user_name)
-
-    # Generate updated chat prompt
+def _build_persona_prompt(user_name: str, memories_text: str, conversation_history: str, condensed_tweets):
     persona_prompt = f"""
 You are {user_name} AI. Your objective is to personify {user_name} as accurately as possible for 1:1 cloning.
 
@@ -605,11 +626,104 @@ Recent Tweets:
 
 Use these facts, conversations and tweets to shape your personality. Responses should help the conversation go deeper. You have strong opinions, slightly controversial."""
 
-    persona['persona_prompt'] = persona_prompt
+    return persona_prompt
+
+
+def _persona_memories_text(uid: str, user_name: str, state: dict, rebuild: bool) -> Tuple[str, dict, bool]:
+    """(condensed memories, {memory id: content digest}, whether it was folded instead of rebuilt)"""
+    memories = [memory for memory in get_user_public_memories(uid, limit=250) if not memory['deleted']]
+    digests = {memory['id']: _content_digest(memory['content']) for memory in memories}
+    known = state.get('memory_digests') or {}
+
+    if not rebuild and known:
+        # edited facts, and facts that left the window because they were deleted or made private, need a rebuild
+        if any(memory_id in known and known[memory_id] != digest for memory_id, digest in digests.items()):
+            rebuild = True
+        else:
+            gone = [memory_id for memory_id in known if memory_id not in digests]
+            if gone:
+                found = get_memories_by_ids(uid, gone)
+                if len(found) < len(gone) or any(memory['deleted'] or memory.get('visibility', 'public') != 'public'
+                                                 for memory in found):
+                    rebuild = True
+
+    if rebuild or not known or not state.get('memories_text'):
+        return condense_memories([memory['content'] for memory in memories], user_name), digests, False
+    new_memories = [memory['content'] for memory in memories if memory['id'] not in known]
+    if not new_memories:
+        return state['memories_text'], digests, False
+    # facts that only aged out of the window stay in the condensed text, the digests track the window
+    return fold_condensed_memories(state['memories_text'], new_memories, user_name), digests, True
+
+
+def _persona_conversations_text(uid: str, state: dict, rebuild: bool) -> Tuple[str, Any, bool]:
+    """(condensed conversations, created_at of the newest one included, whether it was folded)"""
+    until = state.get('conversations_until')
+    if rebuild or not until or not state.get('conversation_history'):
+        conversations = get_conversations(uid, limit=100, include_transcript=False)
+        conversation_history = condense_conversations([Conversation.conversations_to_string(conversations)])
+        return conversation_history, conversations[0]['created_at'] if conversations else None, False
+
+    conversations = [conversation for conversation in
+                     get_conversations(uid, limit=100, start_date=until, include_transcript=False)
+                     if conversation['created_at'] > until]
+    if not conversations:
+        return state['conversation_history'], until, False
+    conversation_history = fold_condensed_conversations(
+        state['conversation_history'], Conversation.conversations_to_string(list(reversed(conversations))))
+    return conversation_history, conversations[0]['created_at'], True
+
+
+async def update_persona_prompt(persona: dict):
+    """
+    Update a persona's chat prompt with latest memories and conversations.
+    Only what changed since the last build is folded into the condensed facts and conversations, and nothing runs
+    when nothing changed. Condensed texts are rebuilt from scratch after PERSONA_MAX_FOLDS folds, so they don't drift.
+    """
+    uid = persona['uid']
+    state = get_persona_state_db(persona['id']) or {}
+    user_name = get_user_name(uid)
+    folds = state.get('folds', 0)
+    rebuild = not persona.get('persona_prompt') or state.get('user_name') != user_name or folds >= PERSONA_MAX_FOLDS
+
+    condensed_tweets = None
+    tweets_digest = None
+    # Condense tweets
+    if "twitter" in persona['connected_accounts'] and 'twitter' in persona:
+        # Get latest tweets
+        timeline = await get_twitter_timeline(persona['twitter']['username'])
+        tweets = [tweet.text for tweet in timeline.timeline]
+        tweets_digest = _content_digest('\n'.join(tweets))
+        if tweets_digest == state.get('tweets_digest') and not rebuild:
+            condensed_tweets = state.get('condensed_tweets')
+        else:
+            condensed_tweets = condense_tweets(tweets, persona['name'])
+
+    memories_text, memory_digests, memories_folded = _persona_memories_text(uid, user_name, state, rebuild)
+    conversation_history, conversations_until, conversations_folded = _persona_conversations_text(uid, state, rebuild)
+
+    if not rebuild and memories_text == state.get('memories_text') \
+            and conversation_history == state.get('conversation_history') \
+            and condensed_tweets == state.get('condensed_tweets'):
+        print(f"[PERSONAS] Nothing changed for persona {persona['id']}, skipping")
+        return
+
+    persona['persona_prompt'] = _build_persona_prompt(user_name, memories_text, conversation_history, condensed_tweets)
     persona['updated_at'] = datetime.now(timezone.utc)
 
     update_persona_in_db(persona)
     delete_app_cache_by_id(persona['id'])
+    set_persona_state_db(persona['id'], {
+        'user_name': user_name,
+        'memories_text': memories_text,
+        'memory_digests': memory_digests,
+        'conversation_history': conversation_history,
+        'conversations_until': conversations_until,
+        'condensed_tweets': condensed_tweets,
+        'tweets_digest': tweets_digest,
+        'folds': folds + 1 if memories_folded or conversations_folded else 0 if rebuild else folds,
+        'built_at': persona['updated_at'],
+    })
 
 
 def increment_username(username: str):
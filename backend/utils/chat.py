@@ -93,8 +93,8 @@ def process_voice_message_segment(path: str, uid: str):
         type='text',
         memories_id=memories_id,
     )
+    ai_message.memories = [MessageConversation.model_validate(m, from_attributes=True) for m in memories[:5]]
     chat_db.add_message(uid, ai_message.dict())
-    ai_message.memories = memories if len(memories) < 5 else memories[:5]
     if plugin_id:
         record_app_usage(uid, plugin_id, UsageHistoryType.chat_message_sent, message_id=ai_message.id)
 
@@ -163,9 +163,9 @@ async def process_voice_message_segment_stream(path: str, uid: str) -> AsyncGene
             plugin_id=plugin_id,
             type='text',
             memories_id=memories_id,
+            memories=[MessageConversation(**m) for m in (memories if len(memories) < 5 else memories[:5])],
         )
         chat_db.add_message(uid, ai_message.dict())
-        ai_message.memories = [MessageConversation(**m) for m in (memories if len(memories) < 5 else memories[:5])]
 
         if plugin_id:
             record_app_usage(uid, plugin_id, UsageHistoryType.chat_message_sent, message_id=ai_message.id)
@@ -206,4 +206,5 @@ def send_chat_message_notification(token: str, plugin_name: str, plugin_id: str,
         notification_type='plugin',
         navigate_to=f'/chat/{plugin_id}',
     )
-    send_notification(token, plugin_name + ' says', message, NotificationMessage.get_message_as_dict(ai_message))
+    send_notification(token, plugin_name + ' says', message, NotificationMessage.get_message_as_dict(ai_message),
+                      collapse_key='plugin')
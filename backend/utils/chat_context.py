@@ -0,0 +1,109 @@
+"""
+Per-user chat context (recent messages, chat session, time zone) for the chat send path.
+Entries are validated against the user's chat version in Redis, bumped by every message and session write
+(database/chat.py), so a hit costs one Redis GET instead of Firestore reads and writes made by other
+instances are never missed.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+import database.chat as chat_db
+import database.notifications as notification_db
+import database.redis_db as redis_db
+from models.chat import ChatSession, Message
+
+# Messages given to the chat graph as history
+CHAT_CONTEXT_MESSAGES = 10
+MAX_CACHED_CONTEXTS = 10000
+# Time zones only change with the app's settings, a stale one for this long is fine
+TIME_ZONE_TTL_SECONDS = 60 * 60
+
+_lock = threading.Lock()
+_contexts: OrderedDict = OrderedDict()  # {(uid, plugin_id): ChatContext}
+_time_zones: OrderedDict = OrderedDict()  # {uid: (time zone, loaded at)}
+
+
+class ChatContext(BaseModel):
+    version: Optional[int] = None
+    # oldest first
+    messages: List[Message] = []
+    chat_session: Optional[ChatSession] = None
+
+    def copy_for_request(self) -> 'ChatContext':
+        # requests mutate their session and message list, the cached entry stays untouched
+        return self.model_copy(update={
+            'messages': list(self.messages),
+            'chat_session': self.chat_session.model_copy(deep=True) if self.chat_session else None,
+        })
+
+
+def _remember(cache: OrderedDict, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > MAX_CACHED_CONTEXTS:
+        cache.popitem(last=False)
+
+
+def get_time_zone(uid: str) -> Optional[str]:
+    now = time.time()
+    with _lock:
+        cached = _time_zones.get(uid)
+    if cached and now - cached[1] < TIME_ZONE_TTL_SECONDS:
+        return cached[0]
+    tz = notification_db.get_user_time_zone(uid)
+    with _lock:
+        _remember(_time_zones, uid, (tz, now))
+    return tz
+
+
+async def load_chat_context(uid: str, plugin_id: Optional[str]) -> ChatContext:
+    """Recent messages and chat session of the user's chat with plugin_id, reads run concurrently on a miss"""
+    version = await asyncio.to_thread(redis_db.get_chat_version, uid)
+    if version is not None:
+        with _lock:
+            context = _contexts.get((uid, plugin_id))
+            if context and context.version == version:
+                _contexts.move_to_end((uid, plugin_id))
+                return context.copy_for_request()
+
+    # the version is read first, a write racing these reads only makes the entry look older than it is
+    chat_session, messages = await asyncio.gather(
+        asyncio.to_thread(chat_db.get_chat_session, uid, plugin_id=plugin_id),
+        asyncio.to_thread(chat_db.get_messages, uid, limit=CHAT_CONTEXT_MESSAGES, plugin_id=plugin_id),
+    )
+    context = ChatContext(
+        version=version,
+        messages=list(reversed([Message(**message) for message in messages])),
+        chat_session=ChatSession(**chat_session) if chat_session else None,
+    )
+    if version is not None:
+        with _lock:
+            _remember(_contexts, (uid, plugin_id), context)
+    return context.copy_for_request()
+
+
+def messages_written(uid: str, plugin_id: Optional[str], messages: List[Message],
+                     chat_session: Optional[ChatSession] = None):
+    """
+    Folds messages this instance just stored (one chat_db.add_message each) into the cached context.
+    The entry is dropped instead when anyone else wrote in between.
+    """
+    version = redis_db.get_chat_version(uid)
+    key = (uid, plugin_id)
+    with _lock:
+        context = _contexts.get(key)
+        if not context:
+            return
+        if version is None or context.version is None or context.version + len(messages) != version:
+            _contexts.pop(key, None)
+            return
+        stored = [message.model_copy(update={'memories': []}) for message in messages]
+        context.messages = (context.messages + stored)[-CHAT_CONTEXT_MESSAGES:]
+        context.version = version
+        if chat_session:
+            context.chat_session = chat_session.model_copy(deep=True)
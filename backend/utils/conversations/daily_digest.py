@@ -0,0 +1,110 @@
+"""
+Rolling per-user day digest. Every processed conversation is folded in as soon as it completes, and edits,
+discards and deletes are folded in or out the same way. The summary is refreshed at most once per
+DIGEST_SUMMARY_DELAY_SECONDS by the minute cron, spreading the summary LLM calls over the day, so the 22:00 daily
+summary (utils/other/notifications.py) only has to be sent.
+"""
+import time
+from datetime import datetime
+from typing import Optional
+
+import pytz
+
+import database.conversations as conversations_db
+import database.daily_digests as daily_digests_db
+import database.notifications as notification_db
+from database.redis_db import schedule_daily_digest_summary, get_due_daily_digest_summaries, \
+    claim_daily_digest_summary
+from models.conversation import Conversation
+from utils.llm import get_conversation_summary
+
+# get_conversation_summary's answer when it fails, never stored as a digest
+SUMMARY_FAILED = "Could not retrieve conversation summary due to an error."
+
+# Folds within this long of the first one share a single summary refresh
+DIGEST_SUMMARY_DELAY_SECONDS = 15 * 60
+
+
+def digest_date(at: datetime, tz: Optional[str]) -> str:
+    """The user's local day, digests are keyed by it"""
+    try:
+        zone = pytz.timezone(tz) if tz else pytz.utc
+    except pytz.UnknownTimeZoneError:
+        zone = pytz.utc
+    if at.tzinfo is None:
+        at = pytz.utc.localize(at)
+    return at.astimezone(zone).strftime('%Y-%m-%d')
+
+
+def _digest_conversation(conversation: Conversation) -> dict:
+    # what the summary prompt reads (Conversation.conversations_to_string), never the transcript
+    return conversation.dict(include={'id', 'created_at', 'started_at', 'finished_at', 'structured'})
+
+
+def summarize_daily_digest(uid: str, digest: dict) -> Optional[str]:
+    conversations = sorted(
+        [Conversation(**conversation) for conversation in (digest.get('conversations') or {}).values()],
+        key=lambda conversation: conversation.created_at,
+    )
+    if not conversations:
+        return None
+    summary = get_conversation_summary(uid, conversations)
+    return summary if summary and summary != SUMMARY_FAILED else None
+
+
+def _refresh_daily_digest_summary(uid: str, date: str):
+    try:
+        digest = daily_digests_db.get_daily_digest(uid, date)
+        if not digest or digest.get('sent_at') or digest.get('summary_revision') == digest.get('revision'):
+            return
+        summary = summarize_daily_digest(uid, digest)
+        if summary:
+            daily_digests_db.set_daily_digest_summary(uid, date, summary, digest['revision'])
+    except Exception as e:
+        print(f"refresh_daily_digest_summary failed for {date}: {e}", uid)
+
+
+def _schedule_daily_digest_summary(uid: str, date: str):
+    """
+    One summary refresh per user and day is pending at a time, folds meanwhile are picked up by it.
+    It is kept in Redis, so a restart does not lose it.
+    """
+    schedule_daily_digest_summary(uid, date, time.time() + DIGEST_SUMMARY_DELAY_SECONDS)
+
+
+def refresh_due_daily_digest_summaries():
+    """Runs the summary refreshes that are due, for the cron"""
+    for uid, date in get_due_daily_digest_summaries(time.time()) or []:
+        if claim_daily_digest_summary(uid, date):
+            _refresh_daily_digest_summary(uid, date)
+
+
+def fold_conversation_into_daily_digest(uid: str, conversation: Conversation):
+    """
+    Adds a processed conversation to today's digest, or removes it once discarded or deleted.
+    Meant for a background thread.
+    """
+    try:
+        tz = notification_db.get_user_time_zone(uid)
+        date = digest_date(conversation.created_at, tz)
+        if date != digest_date(datetime.now(pytz.utc), tz):
+            # reprocessed conversations of past days, their summary was sent already
+            return
+
+        if conversation.discarded or conversation.deleted:
+            if daily_digests_db.remove_daily_digest_conversation(uid, date, conversation.id):
+                _schedule_daily_digest_summary(uid, date)
+            return
+
+        digest = daily_digests_db.upsert_daily_digest_conversation(uid, date, _digest_conversation(conversation))
+        if not digest.get('sent_at'):
+            _schedule_daily_digest_summary(uid, date)
+    except Exception as e:
+        print(f"fold_conversation_into_daily_digest failed for {conversation.id}: {e}", uid)
+
+
+def refold_conversation_into_daily_digest(uid: str, conversation_id: str):
+    """Folds a conversation again after it was edited, discarded or deleted, for a background thread"""
+    conversation = conversations_db.get_conversation(uid, conversation_id, include_transcript=False)
+    if conversation and conversation.get('status') == 'completed':
+        fold_conversation_into_daily_digest(uid, Conversation(**conversation))
@@ -0,0 +1,117 @@
+import re
+import threading
+from typing import List, Optional
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+
+from models.transcript_segment import TranscriptSegment
+
+# should_discard_conversation only calls the LLM at or below this many words
+LLM_DISCARD_MAX_WORDS = 100
+
+FILLER_WORDS = {
+    'um', 'uh', 'uhm', 'umm', 'hmm', 'hm', 'mm', 'mhm', 'ah', 'oh', 'eh', 'huh', 'yeah', 'yea', 'yep', 'yup', 'nope',
+    'ok', 'okay', 'alright', 'right', 'like', 'sure', 'hi', 'hello', 'hey', 'bye', 'thanks', 'thank', 'cool', 'wow',
+    'gonna', 'gotta', 'wanna', 'just', 'really', 'know', 'mean', 'think', 'stuff', 'thing', 'things',
+    # contraction remainders after tokenizing "I'll", "don't", ...
+    'll', 've', 're', 'don', 'didn', 'doesn', 'isn', 'wasn', 'aren', 'won', 'can',
+}
+# Han, kana and hangul are written without spaces, each character counts as a word
+CJK_CHARACTER = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+# Stop and filler words are English, transcripts mostly in other scripts are left to the LLM
+LATIN_LETTERS_MIN_RATIO = 0.8
+ASSISTANT_COMMAND = re.compile(r'\b(hey siri|siri|alexa|ok google|okay google|hey google)\b', re.IGNORECASE)
+
+_vectorizer_stop_words = list(ENGLISH_STOP_WORDS.union(FILLER_WORDS))
+
+_stats_lock = threading.Lock()
+_stats = {'discarded': 0, 'kept': 0, 'escalated': 0}
+
+
+def _word_count(text: str) -> int:
+    cjk = len(CJK_CHARACTER.findall(text))
+    return cjk + len(CJK_CHARACTER.sub(' ', text).split())
+
+
+def _is_latin(text: str) -> bool:
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return True
+    latin = sum(1 for c in letters if ord(c) < 0x250)
+    return latin / len(letters) >= LATIN_LETTERS_MIN_RATIO
+
+
+def _content_terms(segments: List[TranscriptSegment]) -> List[str]:
+    """Informative terms of the transcript, ranked by TF-IDF over its segments."""
+    texts = [segment.text for segment in segments if segment.text.strip()]
+    if not texts:
+        return []
+    vectorizer = TfidfVectorizer(stop_words=_vectorizer_stop_words, token_pattern=r'(?u)\b[^\W\d_][^\W\d_]+\b')
+    try:
+        matrix = vectorizer.fit_transform(texts)
+    except ValueError:
+        # empty vocabulary, only stop words and fillers
+        return []
+    weights = matrix.max(axis=0).toarray().ravel()
+    terms = vectorizer.get_feature_names_out()
+    return [terms[i] for i in weights.argsort()[::-1]]
+
+
+def _record(decision: Optional[bool]):
+    key = 'escalated' if decision is None else ('discarded' if decision else 'kept')
+    with _stats_lock:
+        _stats[key] += 1
+        avoided = _stats['discarded'] + _stats['kept']
+        total = avoided + _stats['escalated']
+    print(f'prefilter_discard: {key}, LLM discard calls avoided {avoided}/{total}')
+
+
+def prefilter_discard(segments: List[TranscriptSegment]) -> Optional[bool]:
+    """
+    Local pre-filter for should_discard_conversation, deciding obvious cases without an LLM call.
+    Returns True (discard) or False (keep) for clear cases, None when the LLM should decide.
+    """
+    text = ' '.join(segment.text for segment in segments)
+    words = _word_count(text)
+    if words > LLM_DISCARD_MAX_WORDS:
+        # never reaches the LLM anyway
+        return None
+
+    if words < 4:
+        # a few words can still carry a note like "call mom tomorrow", only drop them when nothing is left
+        decision = None if _content_terms(segments) else True
+        _record(decision)
+        return decision
+
+    if not _is_latin(text):
+        _record(None)
+        return None
+
+    duration = max(segment.end for segment in segments) - min(segment.start for segment in segments)
+    speakers = len({'user' if segment.is_user else segment.speaker for segment in segments})
+    terms = _content_terms(segments)
+
+    decision = None
+    if len(terms) == 0:
+        # fillers and stop words only, or nothing the tokenizer knows, the LLM decides
+        decision = None
+    elif len(terms) <= 2 and speakers == 1:
+        decision = True
+    elif 0 < duration < 3 and words < 10:
+        decision = True
+    elif ASSISTANT_COMMAND.search(text) and len(terms) <= 6:
+        # device interactions, "hey siri set an alarm for six"
+        decision = True
+    elif speakers >= 2 and len(terms) >= 15 and duration >= 30:
+        # a real exchange between people with a substantial vocabulary
+        decision = False
+
+    _record(decision)
+    return decision
+
+
+def get_discard_prefilter_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['llm_calls_avoided'] = stats['discarded'] + stats['kept']
+    return stats
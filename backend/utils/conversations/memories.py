@@ -4,6 +4,79 @@ import database.memories as memories_db
 from models.memories import MemoryDB, Memory, CategoryEnum
 from models.integrations import ExternalIntegrationCreateMemory
 from utils.llm import extract_memories_from_text
+from utils.llms.memory_index import embed_texts, search_memories, index_memories
+
+# A candidate at least this similar to a stored memory (cosine of embeddings) is a duplicate of it
+MEMORY_DUPLICATE_THRESHOLD = 0.9
+# Stored memories compared with each candidate
+MEMORY_DUPLICATE_CANDIDATES = 3
+
+
+def _normalize_content(content: str) -> str:
+    return ' '.join(content.split()).rstrip('.')
+
+
+def _is_duplicate(memory: MemoryDB, matches: List[Tuple[str, float]], stored: dict) -> bool:
+    for memory_id, score in matches:
+        match = stored.get(memory_id)
+        # a reprocessed conversation's earlier memories are deleted before extraction, and don't count
+        if score < MEMORY_DUPLICATE_THRESHOLD or not match or match.get('deleted') or memory_id == memory.id:
+            continue
+        print(f'ingest_memories: "{memory.content}" duplicates "{match.get("content")}" ({score:.2f})')
+        return True
+    return False
+
+
+def ingest_memories(uid: str, memories: List[MemoryDB]) -> Tuple[List[MemoryDB], int]:
+    """
+    Normalizes candidate memories, drops the ones the user already has (or that repeat each other) by embedding
+    similarity against the user's memory index, and writes the rest in one Firestore batch.
+    Returns the memories written and how many duplicates were suppressed.
+    """
+    candidates, seen = [], set()
+    for memory in memories:
+        content = _normalize_content(memory.content)
+        if not content or content.lower() in seen:
+            continue
+        seen.add(content.lower())
+        memory.content = content
+        candidates.append(memory)
+
+    vectors = None
+    survivors = candidates
+    if candidates:
+        try:
+            vectors = embed_texts([memory.content for memory in candidates])
+            # repeats within the batch, the first one stays
+            similarity = vectors @ vectors.T
+            kept = []
+            for i in range(len(candidates)):
+                if all(similarity[i, j] < MEMORY_DUPLICATE_THRESHOLD for j in kept):
+                    kept.append(i)
+
+            matches = {i: search_memories(uid, vectors[i], MEMORY_DUPLICATE_CANDIDATES) for i in kept}
+            stored_ids = list({memory_id for found in matches.values() for memory_id, score in found
+                               if score >= MEMORY_DUPLICATE_THRESHOLD})
+            stored = {memory['id']: memory for memory in memories_db.get_memories_by_ids(uid, stored_ids)}
+            kept = [i for i in kept if not _is_duplicate(candidates[i], matches[i], stored)]
+            survivors = [candidates[i] for i in kept]
+            vectors = vectors[kept] if kept else None
+        except Exception as e:
+            # without the index everything is written, as before
+            print('ingest_memories: dedup failed', uid, e)
+            vectors = None
+    suppressed = len(memories) - len(survivors)
+
+    data = [memory.dict() for memory in survivors]
+    if data:
+        memories_db.save_memories(uid, data)
+        try:
+            index_memories(uid, data, vectors)
+        except Exception as e:
+            print('ingest_memories: index failed', uid, e)
+
+    print(f'ingest_memories: {len(survivors)} saved, {suppressed} duplicates suppressed')
+    return survivors, suppressed
 
 
 def process_external_integration_memory(uid: str, memory_data: ExternalIntegrationCreateMemory, app_id: str) -> List[
@@ -45,7 +118,7 @@ def process_external_integration_memory(uid: str, memory_data: ExternalIntegrati
 
     # Save all memories to the database if any were created
     if saved_memories:
-        memories_db.save_memories(uid, [fact_db.dict() for fact_db in saved_memories])
+        saved_memories, _ = ingest_memories(uid, saved_memories)
 
     return saved_memories
 
@@ -71,6 +144,6 @@ def process_twitter_memories(uid: str, tweets_text: str, persona_id: str) -> Lis
         saved_memories.append(memory_db)
 
     # Save all memories in batch
-    memories_db.save_memories(uid, [memory_db.dict() for memory_db in saved_memories])
+    saved_memories, _ = ingest_memories(uid, saved_memories)
 
     return saved_memories
@@ -4,7 +4,7 @@ import random
 import threading
 import uuid
 from datetime import timezone
-from typing import Union, Tuple, List, Optional
+from typing import Union, Tuple, List, Optional, Callable
 
 from fastapi import HTTPException
 
@@ -14,6 +14,7 @@ import database.conversations as conversations_db
 import database.notifications as notification_db
 import database.tasks as tasks_db
 import database.trends as trends_db
+from database.auth import get_user_name
 from database.apps import record_app_usage, get_omi_personas_by_uid_db, get_app_by_id_db
 from database.redis_db import get_user_preferred_app
 from database.vector_db import upsert_vector2, update_vector_metadata
@@ -30,7 +31,12 @@ from utils.llm import obtain_emotional_message, retrieve_metadata_fields_from_tr
     get_app_result, should_discard_conversation, summarize_experience_text, new_memories_extractor, \
     trends_extractor, get_message_structure, \
     retrieve_metadata_from_message, retrieve_metadata_from_text, select_best_app_for_conversation, \
-    extract_memories_from_text, get_reprocess_transcript_structure, extract_memories_from_image_content
+    extract_memories_from_text, get_reprocess_transcript_structure, extract_memories_from_image_content, \
+    get_combined_conversation_extraction, ConversationExtraction, Item
+from utils.conversations.daily_digest import fold_conversation_into_daily_digest
+from utils.conversations.discard import prefilter_discard
+from utils.llms.long_transcript import get_summarizable_transcript
+from utils.conversations.memories import ingest_memories
 from utils.notifications import send_notification
 from utils.other.hume import get_hume, HumeJobCallbackModel, HumeJobModelPredictionResponseModel
 from utils.retrieval.rag import retrieve_rag_conversation_context
@@ -39,7 +45,8 @@ from utils.webhooks import conversation_created_webhook
 
 def _get_structured(
         uid: str, language_code: str, conversation: Union[Conversation, CreateConversation, ExternalIntegrationCreateConversation],
-        force_process: bool = False, retries: int = 1
+        force_process: bool = False, retries: int = 1, on_partial: Optional[Callable[[Structured], None]] = None,
+        discard_checked: bool = False
 ) -> Tuple[Structured, bool]:
     try:
         tz = notification_db.get_user_time_zone(uid)
@@ -67,19 +74,55 @@ def _get_structured(
         # from Omi
         if force_process:
             # reprocess endpoint
+            transcript = get_summarizable_transcript(conversation.transcript_segments)
+            return get_reprocess_transcript_structure(transcript, conversation.started_at, language_code, tz, conversation.structured.title, uid, on_partial=on_partial), False
 
-            return get_reprocess_transcript_structure(conversation.get_transcript(False), conversation.started_at, language_code, tz, conversation.structured.title, uid), False
-
-        discarded = should_discard_conversation(conversation.get_transcript(False))
-        if discarded:
+        if not discard_checked and _should_discard(conversation):
             return Structured(emoji=random.choice(['🧠', '🎉'])), True
 
-        return get_transcript_structure(conversation.get_transcript(False), conversation.started_at, language_code, tz), False
+        transcript = get_summarizable_transcript(conversation.transcript_segments)
+        return get_transcript_structure(transcript, conversation.started_at, language_code, tz,
+                                        on_partial=on_partial), False
     except Exception as e:
         print(e)
         if retries == 2:
             raise HTTPException(status_code=500, detail="Error processing conversation, please try again later")
-        return _get_structured(uid, language_code, conversation, force_process, retries + 1)
+        return _get_structured(uid, language_code, conversation, force_process, retries + 1, on_partial, discard_checked)
+
+
+def _should_discard(conversation: Union[Conversation, CreateConversation]) -> bool:
+    # Obvious cases are decided locally, should_discard_conversation short-circuits long transcripts
+    discarded = prefilter_discard(conversation.transcript_segments)
+    if discarded is None:
+        discarded = should_discard_conversation(conversation.get_transcript(False))
+    return discarded
+
+
+# Single structured-output call for summary, memories, trends and vector metadata instead of one call each
+COMBINED_CONVERSATION_EXTRACTION = os.getenv('COMBINED_CONVERSATION_EXTRACTION', 'false').lower() == 'true'
+
+
+def _get_combined_extraction(
+        uid: str, conversation: Union[Conversation, CreateConversation, ExternalIntegrationCreateConversation],
+        on_partial: Optional[Callable[[Structured], None]] = None
+) -> Tuple[Optional[ConversationExtraction], bool]:
+    """
+    Combined extraction for Omi transcripts. Returns (extraction, discarded); a None extraction
+    on a kept conversation means the split calls should be used instead.
+    """
+    if conversation.source in [ConversationSource.workflow, ConversationSource.external_integration] or conversation.photos:
+        return None, False
+
+    if _should_discard(conversation):
+        return None, True
+
+    tz = notification_db.get_user_time_zone(uid)
+    user_name = get_user_name(uid)
+    transcript = get_summarizable_transcript(conversation.transcript_segments, user_name=user_name)
+    extraction = get_combined_conversation_extraction(uid, transcript, conversation.started_at, tz, on_partial=on_partial)
+    if extraction is None:
+        print('_get_combined_extraction failed, falling back to split extraction calls')
+    return extraction, False
 
 
 def _get_conversation_obj(uid: str, structured: Structured,
@@ -185,14 +228,17 @@ def _trigger_apps(uid: str, conversation: Conversation, is_reprocess: bool = Fal
     [t.join() for t in threads]
 
 
-def _extract_memories(uid: str, conversation: Conversation):
+def _extract_memories(uid: str, conversation: Conversation, extracted_memories: Optional[List[Memory]] = None):
     # TODO: maybe instead (once they can edit them) we should not tie it this hard
     memories_db.delete_memories_for_conversation(uid, conversation.id)
 
     new_memories: List[Memory] = []
 
     # Extract memories based on conversation source
-    if conversation.source == ConversationSource.external_integration:
+    if extracted_memories is not None:
+        # already extracted by the combined extraction call
+        new_memories = extracted_memories
+    elif conversation.source == ConversationSource.external_integration:
         text_content = conversation.external_data.get('text')
         if text_content and len(text_content) > 0:
             text_source = conversation.external_data.get('text_source', 'other')
@@ -211,7 +257,8 @@ def _extract_memories(uid: str, conversation: Conversation):
         return
 
     print(f"Saving {len(parsed_memories)} memories for conversation {conversation.id}")
-    memories_db.save_memories(uid, [fact.dict() for fact in parsed_memories])
+    saved, suppressed = ingest_memories(uid, parsed_memories)
+    print(f"Saved {len(saved)} memories for conversation {conversation.id}, {suppressed} duplicates suppressed")
 
 
 def _extract_memories_from_image_conversation(uid: str, conversation_id: str, image_descriptions: List[str], 
@@ -246,7 +293,8 @@ def _extract_memories_from_image_conversation(uid: str, conversation_id: str, im
         print(f'_extract_memories_from_image_conversation: {memory.category.value.upper()} | {memory.content}')
 
     print(f"Saving {len(parsed_memories)} memories for image conversation {conversation_id}")
-    memories_db.save_memories(uid, [memory.dict() for memory in parsed_memories])
+    saved, suppressed = ingest_memories(uid, parsed_memories)
+    print(f"Saved {len(saved)} memories for image conversation {conversation_id}, {suppressed} duplicates suppressed")
 
 
 def send_new_memories_notification(token: str, memories: [MemoryDB]):
@@ -260,16 +308,19 @@ def send_new_memories_notification(token: str, memories: [MemoryDB]):
         navigate_to="/facts",
     )
 
-    send_notification(token, "omi" + ' says', message, NotificationMessage.get_message_as_dict(ai_message))
+    send_notification(token, "omi" + ' says', message, NotificationMessage.get_message_as_dict(ai_message),
+                      collapse_key='new_fact')
 
 
-def _extract_trends(conversation: Conversation):
-    extracted_items = trends_extractor(conversation)
+def _extract_trends(conversation: Conversation, extracted_items: Optional[List[Item]] = None):
+    if extracted_items is None:
+        extracted_items = trends_extractor(conversation)
     parsed = [Trend(category=item.category, topics=[item.topic], type=item.type) for item in extracted_items]
     trends_db.save_trends(conversation, parsed)
 
 
-def save_structured_vector(uid: str, conversation: Conversation, update_only: bool = False):
+def save_structured_vector(uid: str, conversation: Conversation, update_only: bool = False,
+                           extracted_metadata: Optional[dict] = None):
     try:
         vector = generate_embedding(str(conversation.structured)) if not update_only else None
         tz = notification_db.get_user_time_zone(uid)
@@ -277,7 +328,10 @@ def save_structured_vector(uid: str, conversation: Conversation, update_only: bo
         metadata = {}
 
         # Extract metadata based on conversation source
-        if conversation.source == ConversationSource.external_integration:
+        if extracted_metadata is not None:
+            # already extracted by the combined extraction call
+            metadata = dict(extracted_metadata)
+        elif conversation.source == ConversationSource.external_integration:
             text_source = conversation.external_data.get('text_source')
             text_content = conversation.external_data.get('text')
             if text_content and len(text_content) > 0 and text_content and len(text_content) > 0:
@@ -327,18 +381,39 @@ def _update_personas_async(uid: str):
 
 def process_conversation(
         uid: str, language_code: str, conversation: Union[Conversation, CreateConversation, ExternalIntegrationCreateConversation],
-        force_process: bool = False, is_reprocess: bool = False, app_id: Optional[str] = None
+        force_process: bool = False, is_reprocess: bool = False, app_id: Optional[str] = None,
+        on_partial: Optional[Callable[[Structured], None]] = None
 ) -> Conversation:
-    structured, discarded = _get_structured(uid, language_code, conversation, force_process)
+    """
+    on_partial, when given, is called with partially filled Structured summaries while the summary is
+    being generated: first title/emoji/overview, then again once action items and events are available.
+    """
+    extraction, discarded = None, False
+    if COMBINED_CONVERSATION_EXTRACTION and not force_process:
+        extraction, discarded = _get_combined_extraction(uid, conversation, on_partial)
+
+    if extraction is not None:
+        structured = extraction.structured
+    elif discarded:
+        structured = Structured(emoji=random.choice(['🧠', '🎉']))
+    else:
+        structured, discarded = _get_structured(uid, language_code, conversation, force_process, on_partial=on_partial,
+                                                discard_checked=COMBINED_CONVERSATION_EXTRACTION and not force_process)
     conversation = _get_conversation_obj(uid, structured, conversation)
 
     if not discarded:
         _trigger_apps(uid, conversation, is_reprocess=is_reprocess, app_id=app_id)
-        threading.Thread(target=save_structured_vector, args=(uid, conversation,)).start() if not is_reprocess else None
-        threading.Thread(target=_extract_memories, args=(uid, conversation)).start()
+        if extraction is not None:
+            threading.Thread(target=save_structured_vector, args=(uid, conversation, False, extraction.metadata)).start() if not is_reprocess else None
+            threading.Thread(target=_extract_memories, args=(uid, conversation, extraction.memories)).start()
+            threading.Thread(target=_extract_trends, args=(conversation, extraction.trends)).start()
+        else:
+            threading.Thread(target=save_structured_vector, args=(uid, conversation,)).start() if not is_reprocess else None
+            threading.Thread(target=_extract_memories, args=(uid, conversation)).start()
 
     conversation.status = ConversationStatus.completed
     conversations_db.upsert_conversation(uid, conversation.dict())
+    threading.Thread(target=fold_conversation_into_daily_digest, args=(uid, conversation)).start()
 
     if not is_reprocess:
         threading.Thread(target=conversation_created_webhook, args=(uid, conversation,)).start()
@@ -511,15 +586,17 @@ def process_user_expression_measurement_callback(provider: str, request_id: str,
     return
 
 
-def retrieve_in_progress_conversation(uid):
+def retrieve_in_progress_conversation(uid, include_transcript: bool = True):
     conversation_id = redis_db.get_in_progress_conversation_id(uid)
     existing = None
 
     if conversation_id:
-        existing = conversations_db.get_conversation(uid, conversation_id)
+        existing = conversations_db.get_conversation(uid, conversation_id, include_transcript=False)
         if existing and existing['status'] != 'in_progress':
             existing = None
 
     if not existing:
-        existing = conversations_db.get_in_progress_conversation(uid)
+        existing = conversations_db.get_in_progress_conversation(uid, include_transcript=False)
+    if existing and include_transcript:
+        conversations_db.get_transcript_segments(uid, existing)
     return existing
@@ -57,7 +57,7 @@ def search_conversations(
 
         search_parameters = {
             'q': query,
-            'query_by': 'structured, transcript_segments',
+            'query_by': 'structured, transcript_segments, transcript_text',
             'filter_by': filter_by,
             'sort_by': 'created_at:desc',
             'per_page': per_page,
@@ -0,0 +1,225 @@
+"""
+Background deletion jobs, for wipes that are too big to finish inside a request: account deletion, clearing a chat,
+deleting all memories or all recordings.
+A job runs its steps in parallel. Firestore steps go through BulkWriter and storage steps delete prefixes in
+parallel. Each step's progress is checkpointed on the job document (database/deletion_jobs.py). A job stopped by a
+restart is picked up by the next resume_deletion_jobs sweep of any instance, and its finished steps are skipped.
+"""
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database.chat as chat_db
+import database.deletion_jobs as deletion_jobs_db
+import database.memories as memories_db
+import database.users as users_db
+from database._client import db
+from database.deletion_jobs import bulk_delete_collection
+from database.redis_db import acquire_deletion_job_lease, renew_deletion_job_lease, release_deletion_job_lease, \
+    delete_chat_keys
+from models.users import DeletionJobKind, DeletionJobStatus
+from utils.other.storage import delete_blobs_with_prefix, memories_recordings_bucket, speech_profiles_bucket, \
+    chat_files_bucket
+
+# Steps of a job run at the same time
+DELETION_JOB_WORKERS = 4
+# An instance that stops renewing its lease for this long is presumed dead, its job can be resumed elsewhere
+DELETION_JOB_LEASE_SECONDS = 60
+# Progress is written to the job document at most this often per step
+DELETION_JOB_CHECKPOINT_SECONDS = 2
+# A job failing this many runs is left failed
+DELETION_JOB_MAX_ATTEMPTS = 5
+DELETION_JOB_SWEEP_SECONDS = 60
+# How long endpoints wait for their job, most wipes then finish within the request as they used to
+DELETION_JOB_INLINE_SECONDS = 5
+
+_lock = threading.Lock()
+_finished: Dict[str, threading.Event] = {}
+
+# (step name, delete(on_progress) -> deleted count)
+Step = Tuple[str, Callable[[Callable[[int], None]], int]]
+
+
+def _step_name(name: str) -> str:
+    # step names are field names on the job document
+    return re.sub(r'\W', '_', name)
+
+
+def _delete_user_document(uid: str, on_progress: Callable[[int], None]) -> int:
+    users_db.delete_user_document(uid)
+    return 1
+
+
+def _unindex_memories(uid: str, on_progress: Callable[[int], None]) -> int:
+    # imported here, utils.llms.memory_index loads the LLM clients
+    from utils.llms import memory_index
+    memory_index.unindex_all_memories(uid)
+    return 1
+
+
+def _delete_chat_keys(uid: str, on_progress: Callable[[int], None]) -> int:
+    delete_chat_keys(uid)
+    return 1
+
+
+def _job_steps(job: dict) -> Tuple[List[Step], List[Step]]:
+    """Steps run in parallel, then steps run in order once those are done"""
+    uid = job['uid']
+    params = job.get('params') or {}
+    kind = job['kind']
+
+    if kind == DeletionJobKind.account:
+        steps = [
+            (_step_name(f'collection_{collection_ref.id}'), partial(bulk_delete_collection, collection_ref))
+            for collection_ref in users_db.get_user_collections(uid)
+        ]
+        for name, bucket_name in [('recordings', memories_recordings_bucket),
+                                  ('speech_profiles', speech_profiles_bucket),
+                                  ('chat_files', chat_files_bucket)]:
+            steps.append((f'blobs_{name}', partial(delete_blobs_with_prefix, bucket_name, f'{uid}/')))
+        steps += [('memory_vectors', partial(_unindex_memories, uid)), ('chat_keys', partial(_delete_chat_keys, uid))]
+        # deleting the user document also takes the user out of the notification buckets
+        return steps, [('user', partial(_delete_user_document, uid))]
+
+    if kind == DeletionJobKind.chat:
+        user_ref = db.collection('users').document(uid)
+        # jobs created before the cutoff was a parameter were created at their clear
+        cleared_at = params.get('cleared_at') or job['created_at'].timestamp()
+        return [('messages', partial(chat_db.batch_delete_messages, user_ref, params.get('plugin_id'),
+                                     params.get('chat_session_id'), cleared_at))], []
+
+    if kind == DeletionJobKind.memories:
+        return [('memories', partial(memories_db.delete_all_memories, uid)),
+                ('memory_vectors', partial(_unindex_memories, uid))], []
+
+    if kind == DeletionJobKind.recordings:
+        return [('blobs_recordings', partial(delete_blobs_with_prefix, memories_recordings_bucket, f'{uid}/'))], []
+
+    raise ValueError(f'Unknown deletion job kind {kind}')
+
+
+def _run_step(job_id: str, checkpoint: dict, step: Step):
+    name, delete = step
+    progress = checkpoint.get(name) or {}
+    if progress.get('completed'):
+        return
+    # a resumed step counts what the interrupted run already deleted
+    deleted_before = progress.get('deleted', 0)
+    last_checkpoint = [0.0]
+
+    def on_progress(deleted: int):
+        if time.time() - last_checkpoint[0] < DELETION_JOB_CHECKPOINT_SECONDS:
+            return
+        last_checkpoint[0] = time.time()
+        deletion_jobs_db.update_deletion_job(
+            job_id, {f'steps.{name}': {'deleted': deleted_before + deleted, 'completed': False}})
+
+    deleted = delete(on_progress)
+    deletion_jobs_db.update_deletion_job(
+        job_id, {f'steps.{name}': {'deleted': deleted_before + deleted, 'completed': True}})
+    print('deletion job step', job_id, name, deleted)
+
+
+def _run_job(job: dict):
+    job_id = job['id']
+    if not acquire_deletion_job_lease(job_id, DELETION_JOB_LEASE_SECONDS):
+        # running on another instance, a caller waiting here stops at its timeout
+        with _lock:
+            _finished.pop(job_id, None)
+        return
+
+    stop = threading.Event()
+
+    def renew_lease():
+        while not stop.wait(DELETION_JOB_LEASE_SECONDS / 3):
+            renew_deletion_job_lease(job_id, DELETION_JOB_LEASE_SECONDS)
+
+    threading.Thread(target=renew_lease, daemon=True).start()
+    attempts = job.get('attempts', 0) + 1
+    started = time.time()
+    try:
+        deletion_jobs_db.update_deletion_job(job_id, {'status': DeletionJobStatus.running.value, 'attempts': attempts})
+        parallel_steps, final_steps = _job_steps(job)
+        checkpoint = job.get('steps') or {}
+        with ThreadPoolExecutor(max_workers=DELETION_JOB_WORKERS) as executor:
+            # list() raises the first step failure, after the other steps are done
+            list(executor.map(partial(_run_step, job_id, checkpoint), parallel_steps))
+        for step in final_steps:
+            _run_step(job_id, checkpoint, step)
+        deletion_jobs_db.update_deletion_job(job_id, {
+            'status': DeletionJobStatus.completed.value, 'completed_at': datetime.now(timezone.utc), 'error': None,
+        })
+        print(f'deletion job {job_id} {job["kind"]} completed in {time.time() - started:.1f}s')
+    except Exception as e:
+        print('deletion job failed', job_id, attempts, e)
+        status = DeletionJobStatus.failed if attempts >= DELETION_JOB_MAX_ATTEMPTS else DeletionJobStatus.running
+        try:
+            # a running job is retried by the next sweep
+            deletion_jobs_db.update_deletion_job(job_id, {'status': status.value, 'error': str(e)})
+        except Exception as checkpoint_error:
+            print('deletion job checkpoint failed', job_id, checkpoint_error)
+    finally:
+        stop.set()
+        release_deletion_job_lease(job_id)
+        with _lock:
+            finished = _finished.pop(job_id, None)
+        if finished:
+            finished.set()
+
+
+def start_deletion_job(uid: str, kind: DeletionJobKind, params: dict = None, wait_seconds: float = 0) -> dict:
+    """
+    Creates the job and runs it in the background. With wait_seconds, waits up to that long for it to finish.
+    Returns the job as stored.
+    """
+    now = datetime.now(timezone.utc)
+    job = {
+        'id': str(uuid.uuid4()),
+        'uid': uid,
+        'kind': kind.value,
+        'params': params or {},
+        'status': DeletionJobStatus.pending.value,
+        'steps': {},
+        'attempts': 0,
+        'error': None,
+        'created_at': now,
+        'updated_at': now,
+    }
+    deletion_jobs_db.create_deletion_job(job)
+    finished = threading.Event()
+    with _lock:
+        _finished[job['id']] = finished
+    threading.Thread(target=_run_job, args=(job,), daemon=True).start()
+    if wait_seconds and finished.wait(wait_seconds):
+        return deletion_jobs_db.get_deletion_job(job['id']) or job
+    return job
+
+
+def get_deletion_job(uid: str, job_id: str) -> Optional[dict]:
+    job = deletion_jobs_db.get_deletion_job(job_id)
+    if not job or job['uid'] != uid:
+        return None
+    return job
+
+
+def resume_deletion_jobs():
+    """Runs the unfinished jobs no instance holds a lease on, jobs with a live lease are skipped by _run_job"""
+    for job in deletion_jobs_db.get_unfinished_deletion_jobs():
+        threading.Thread(target=_run_job, args=(job,), daemon=True).start()
+
+
+def start_deletion_job_sweeper():
+    def sweep():
+        while True:
+            try:
+                resume_deletion_jobs()
+            except Exception as e:
+                print('resume_deletion_jobs failed', e)
+            time.sleep(DELETION_JOB_SWEEP_SECONDS)
+
+    threading.Thread(target=sweep, daemon=True).start()
@@ -3,7 +3,7 @@ import re
 import os
 import base64
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Callable
 
 import tiktoken
 from langchain.schema import (
@@ -13,6 +13,7 @@ from langchain.schema import (
 )
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.utils.json import parse_partial_json
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings, AzureChatOpenAI
 from pydantic import BaseModel, Field, ValidationError
 import pytz
@@ -359,8 +360,193 @@ class EnhancedSummaryOutput(BaseModel):
     )
 
 
+# Fields that are pushed to the client as soon as they finish streaming
+_SUMMARY_HEADER_FIELDS = ('title', 'emoji', 'overview')
+
+
+def _stream_summary_output(prompt: str, on_partial: Callable[[Structured], None],
+                           title: Optional[str] = None, schema=EnhancedSummaryOutput) -> EnhancedSummaryOutput:
+    """
+    Streams the summary tool call (EnhancedSummaryOutput or a schema extending it) and parses the partial JSON
+    arguments as tokens arrive. Once title, emoji and overview are complete, `on_partial` is called with a
+    header-only Structured.
+    """
+    llm = llm_medium.bind_tools([schema], tool_choice=schema.__name__)
+    args = ''
+    header_sent = False
+    for chunk in llm.stream(prompt):
+        for tool_chunk in getattr(chunk, 'tool_call_chunks', None) or []:
+            args += tool_chunk.get('args') or ''
+        if header_sent or not args:
+            continue
+
+        partial = parse_partial_json(args)
+        if not isinstance(partial, dict):
+            continue
+
+        # Keys are generated in schema order, every key but the last one is final
+        completed = list(partial.keys())[:-1]
+        if not all(field in completed for field in _SUMMARY_HEADER_FIELDS):
+            continue
+
+        header_sent = True
+        category = partial.get('category') if 'category' in completed else None
+        try:
+            on_partial(Structured(
+                title=title if title else partial['title'],
+                overview=partial['overview'],
+                emoji=partial['emoji'],
+                category=category if category in [cat.value for cat in CategoryEnum] else CategoryEnum.other,
+            ))
+        except Exception as e:
+            print(f"Error emitting partial summary: {e}")
+
+    return schema(**json.loads(args))
+
+
+def _invoke_summary_output(prompt: str, on_partial: Optional[Callable[[Structured], None]] = None,
+                           title: Optional[str] = None, schema=EnhancedSummaryOutput) -> EnhancedSummaryOutput:
+    if on_partial is not None:
+        try:
+            return _stream_summary_output(prompt, on_partial, title, schema)
+        except Exception as e:
+            print(f"Error streaming summary output, falling back to a blocking call: {e}")
+
+    with_parser = llm_medium.with_structured_output(schema)
+    return with_parser.invoke(prompt)
+
+
+def _structured_from_summary_output(response: EnhancedSummaryOutput, on_partial: Optional[Callable[[Structured], None]] = None,
+                                    title: Optional[str] = None) -> Structured:
+    # Use existing title if provided, otherwise use generated title
+    structured = Structured(
+        title=title if title else response.title,
+        overview=response.overview,
+        emoji=response.emoji,
+        category=response.category,
+    )
+
+    # Add enhanced fields
+    structured.key_takeaways = response.key_takeaways
+    
+    # Process action items and events
+    for item in response.action_items:
+        structured.action_items.append(ActionItem(description=item))
+
+    for event in response.events:
+        description = event.description if event.description else ''
+        event_title = event.title if event.title else ''
+        user_prompt = event.user_prompt if event.user_prompt else ''
+        # Process the start time
+        starts_at = None
+        try:
+            # Handle ISO format with timezone information
+            start_str = event.start
+            if start_str.endswith('Z'):
+                # UTC timezone
+                start_str = start_str[:-1] + '+00:00'
+                starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
+            elif '+' in start_str[-6:] or '-' in start_str[-6:]:
+                # Has timezone offset like "+07:00" or "-07:00"
+                starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
+            else:
+                # No timezone info, parse as is
+                starts_at = datetime.strptime(start_str, '%Y-%m-%dT%H:%M:%S')
+        except Exception as e:
+            print(f"Error parsing event start time '{event.start}': {e}")
+            starts_at = datetime.now() + timedelta(days=1)  # fallback to tomorrow
+
+        duration = event.duration if event.duration else 30  # default 30 minutes
+
+        structured.events.append(Event(
+            title=event_title,
+            start=starts_at,  # Changed from starts_at to start
+            duration=duration,
+            description=description,
+            user_prompt=user_prompt,
+        ))
+
+    # Action items and events are ready before the (slow) resource web searches
+    if on_partial is not None:
+        try:
+            on_partial(structured)
+        except Exception as e:
+            print(f"Error emitting partial summary: {e}")
+
+    # Process improvement items with web search
+    for item in response.things_to_improve:
+        try:
+            # Handle both string items and ResourceItem objects
+            if isinstance(item, str):
+                content = item
+            else:
+                content = item.content if hasattr(item, 'content') else str(item)
+            
+            # Use web search to find relevant resources
+            search_query = f"How to {content.lower()}"
+            search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
+            
+            resource_url = ""
+            resource_title = ""
+            
+            # Get the first URL if available
+            if url_mapping:
+                first_url = next(iter(url_mapping.keys()), "")
+                resource_url = first_url
+                resource_title = url_mapping.get(first_url, "")
+            
+            # Create resource item
+            resource_item = ResourceItem(
+                content=content,
+                url=resource_url,
+                title=resource_title
+            )
+            structured.things_to_improve.append(resource_item)
+        except Exception as e:
+            print(f"Error processing improvement item: {e}")
+            # Add as simple ResourceItem with just content
+            structured.things_to_improve.append(ResourceItem(content=str(item)))
+    
+    # Process learning items with web search
+    for item in response.things_to_learn:
+        try:
+            # Handle both string items and ResourceItem objects
+            if isinstance(item, str):
+                content = item
+            else:
+                content = item.content if hasattr(item, 'content') else str(item)
+            
+            # Use web search to find relevant resources
+            search_query = f"Best resources to learn about {content.lower()}"
+            search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
+            
+            resource_url = ""
+            resource_title = ""
+            
+            # Get the first URL if available
+            if url_mapping:
+                first_url = next(iter(url_mapping.keys()), "")
+                resource_url = first_url
+                resource_title = url_mapping.get(first_url, "")
+            
+            # Create resource item
+            resource_item = ResourceItem(
+                content=content,
+                url=resource_url,
+                title=resource_title
+            )
+            structured.things_to_learn.append(resource_item)
+        except Exception as e:
+            print(f"Error processing learning item: {e}")
+            # Add as simple ResourceItem with just content
+            structured.things_to_learn.append(ResourceItem(content=str(item)))
+
+    return structured
+
+
 @trace_function(tags=["conversation_summary"])
-def get_transcript_structure(transcript: str, started_at: datetime, language_code: str, tz: str, uid: str = None) -> Structured:
+def get_transcript_structure(transcript: str, started_at: datetime, language_code: str, tz: str, uid: str = None,
+                             on_partial: Optional[Callable[[Structured], None]] = None) -> Structured:
     if len(transcript) == 0:
         return Structured(title='', overview='')
 
@@ -468,124 +654,9 @@ def get_transcript_structure(transcript: str, started_at: datetime, language_cod
     '''.replace('    ', '').strip()
 
     try:
-        with_parser = llm_medium.with_structured_output(EnhancedSummaryOutput)
-        response: EnhancedSummaryOutput = with_parser.invoke(prompt)
-        
-        structured = Structured(
-            title=response.title,
-            overview=response.overview,
-            emoji=response.emoji,
-            category=response.category,
-        )
-
-        # Add enhanced fields
-        structured.key_takeaways = response.key_takeaways
-        
-        # Process improvement items with web search
-        for item in response.things_to_improve:
-            try:
-                # Handle both string items and ResourceItem objects
-                if isinstance(item, str):
-                    content = item
-                else:
-                    content = item.content if hasattr(item, 'content') else str(item)
-                
-                # Use web search to find relevant resources
-                search_query = f"How to {content.lower()}"
-                search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
-                
-                resource_url = ""
-                resource_title = ""
-                
-                # Get the first URL if available
-                if url_mapping:
-                    first_url = next(iter(url_mapping.keys()), "")
-                    resource_url = first_url
-                    resource_title = url_mapping.get(first_url, "")
-                
-                # Create resource item
-                resource_item = ResourceItem(
-                    content=content,
-                    url=resource_url,
-                    title=resource_title
-                )
-                structured.things_to_improve.append(resource_item)
-            except Exception as e:
-                print(f"Error processing improvement item: {e}")
-                # Add as simple ResourceItem with just content
-                structured.things_to_improve.append(ResourceItem(content=str(item)))
-        
-        # Process learning items with web search
-        for item in response.things_to_learn:
-            try:
-                # Handle both string items and ResourceItem objects
-                if isinstance(item, str):
-                    content = item
-                else:
-                    content = item.content if hasattr(item, 'content') else str(item)
-                
-                # Use web search to find relevant resources
-                search_query = f"Best resources to learn about {content.lower()}"
-                search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
-                
-                resource_url = ""
-                resource_title = ""
-                
-                # Get the first URL if available
-                if url_mapping:
-                    first_url = next(iter(url_mapping.keys()), "")
-                    resource_url = first_url
-                    resource_title = url_mapping.get(first_url, "")
-                
-                # Create resource item
-                resource_item = ResourceItem(
-                    content=content,
-                    url=resource_url,
-                    title=resource_title
-                )
-                structured.things_to_learn.append(resource_item)
-            except Exception as e:
-                print(f"Error processing learning item: {e}")
-                # Add as simple ResourceItem with just content
-                structured.things_to_learn.append(ResourceItem(content=str(item)))
-
-        # Process action items and events
-        for item in response.action_items:
-            structured.action_items.append(ActionItem(description=item))
-
-        for event in response.events:
-            description = event.description if event.description else ''
-            title = event.title if event.title else ''
-            user_prompt = event.user_prompt if event.user_prompt else ''
-            # Process the start time
-            starts_at = None
-            try:
-                # Handle ISO format with timezone information
-                start_str = event.start
-                if start_str.endswith('Z'):
-                    # UTC timezone
-                    start_str = start_str[:-1] + '+00:00'
-                    starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
-                elif '+' in start_str[-6:] or '-' in start_str[-6:]:
-                    # Has timezone offset like "+07:00" or "-07:00"
-                    starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
-                else:
-                    # No timezone info, parse as is
-                    starts_at = datetime.strptime(start_str, '%Y-%m-%dT%H:%M:%S')
-            except Exception as e:
-                print(f"Error parsing event start time '{event.start}': {e}")
-                starts_at = datetime.now() + timedelta(days=1)  # fallback to tomorrow
-
-            duration = event.duration if event.duration else 30  # default 30 minutes
-
-            structured.events.append(Event(
-                title=title,
-                start=starts_at,  # Changed from starts_at to start
-                duration=duration,
-                description=description,
-                user_prompt=user_prompt,
-            ))
+        response: EnhancedSummaryOutput = _invoke_summary_output(prompt, on_partial)
 
+        structured = _structured_from_summary_output(response, on_partial)
         return structured
     except ValidationError as e:
         print(f"Validation error in get_transcript_structure: {e}")
@@ -606,7 +677,8 @@ def get_transcript_structure(transcript: str, started_at: datetime, language_cod
 
 
 def get_reprocess_transcript_structure(transcript: str, started_at: datetime, language_code: str, tz: str,
-                                       title: str, uid: str = None) -> Structured:
+                                       title: str, uid: str = None,
+                                       on_partial: Optional[Callable[[Structured], None]] = None) -> Structured:
     if len(transcript) == 0:
         return Structured(title='', overview='')
 
@@ -708,125 +780,9 @@ def get_reprocess_transcript_structure(transcript: str, started_at: datetime, la
     '''.replace('    ', '').strip()
 
     try:
-        with_parser = llm_medium.with_structured_output(EnhancedSummaryOutput)
-        response: EnhancedSummaryOutput = with_parser.invoke(prompt)
-
-        # Use existing title if provided, otherwise use generated title
-        structured = Structured(
-            title=title if title else response.title,
-            overview=response.overview,
-            emoji=response.emoji,
-            category=response.category,
-        )
-
-        # Add enhanced fields
-        structured.key_takeaways = response.key_takeaways
-        
-        # Process improvement items with web search
-        for item in response.things_to_improve:
-            try:
-                # Handle both string items and ResourceItem objects
-                if isinstance(item, str):
-                    content = item
-                else:
-                    content = item.content if hasattr(item, 'content') else str(item)
-                
-                # Use web search to find relevant resources
-                search_query = f"How to {content.lower()}"
-                search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
-                
-                resource_url = ""
-                resource_title = ""
-                
-                # Get the first URL if available
-                if url_mapping:
-                    first_url = next(iter(url_mapping.keys()), "")
-                    resource_url = first_url
-                    resource_title = url_mapping.get(first_url, "")
-                
-                # Create resource item
-                resource_item = ResourceItem(
-                    content=content,
-                    url=resource_url,
-                    title=resource_title
-                )
-                structured.things_to_improve.append(resource_item)
-            except Exception as e:
-                print(f"Error processing improvement item: {e}")
-                # Add as simple ResourceItem with just content
-                structured.things_to_improve.append(ResourceItem(content=str(item)))
-        
-        # Process learning items with web search
-        for item in response.things_to_learn:
-            try:
-                # Handle both string items and ResourceItem objects
-                if isinstance(item, str):
-                    content = item
-                else:
-                    content = item.content if hasattr(item, 'content') else str(item)
-                
-                # Use web search to find relevant resources
-                search_query = f"Best resources to learn about {content.lower()}"
-                search_results, annotations, url_mapping = perform_web_search(search_query, search_context_size="medium")
-                
-                resource_url = ""
-                resource_title = ""
-                
-                # Get the first URL if available
-                if url_mapping:
-                    first_url = next(iter(url_mapping.keys()), "")
-                    resource_url = first_url
-                    resource_title = url_mapping.get(first_url, "")
-                
-                # Create resource item
-                resource_item = ResourceItem(
-                    content=content,
-                    url=resource_url,
-                    title=resource_title
-                )
-                structured.things_to_learn.append(resource_item)
-            except Exception as e:
-                print(f"Error processing learning item: {e}")
-                # Add as simple ResourceItem with just content
-                structured.things_to_learn.append(ResourceItem(content=str(item)))
-
-        # Process action items and events
-        for item in response.action_items:
-            structured.action_items.append(ActionItem(description=item))
-
-        for event in response.events:
-            description = event.description if event.description else ''
-            title = event.title if event.title else ''
-            user_prompt = event.user_prompt if event.user_prompt else ''
-            # Process the start time
-            starts_at = None
-            try:
-                # Handle ISO format with timezone information
-                start_str = event.start
-                if start_str.endswith('Z'):
-                    # UTC timezone
-                    start_str = start_str[:-1] + '+00:00'
-                    starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
-                elif '+' in start_str[-6:] or '-' in start_str[-6:]:
-                    # Has timezone offset like "+07:00" or "-07:00"
-                    starts_at = datetime.fromisoformat(start_str).replace(tzinfo=None)
-                else:
-                    # No timezone info, parse as is
-                    starts_at = datetime.strptime(start_str, '%Y-%m-%dT%H:%M:%S')
-            except Exception as e:
-                print(f"Error parsing event start time '{event.start}': {e}")
-                starts_at = datetime.now() + timedelta(days=1)  # fallback to tomorrow
-
-            duration = event.duration if event.duration else 30  # default 30 minutes
-
-            structured.events.append(Event(
-                title=title,
-                start=starts_at,  # Changed from starts_at to start
-                duration=duration,
-                description=description,
-                user_prompt=user_prompt,
-            ))
+        response: EnhancedSummaryOutput = _invoke_summary_output(prompt, on_partial, title)
 
+        structured = _structured_from_summary_output(response, on_partial, title)
         return structured
     except ValidationError as e:
         print(f"Validation error in get_reprocess_transcript_structure: {e}")
@@ -1266,7 +1222,7 @@ def _get_answer_simple_message_prompt(uid: str, messages: List[Message], app: Op
     conversation_history = Message.get_messages_as_string(
         messages, use_user_name_if_available=True, use_plugin_name_if_available=True
     )
-    user_name, memories_str = get_prompt_memories(uid)
+    user_name, memories_str = get_prompt_memories(uid, query=messages[-1].text if messages else None)
 
     plugin_info = ""
     if app:
@@ -1345,7 +1301,7 @@ def answer_persona_question_stream(app: App, messages: List[Message], callbacks:
 def _get_qa_rag_prompt(uid: str, question: str, context: str, plugin: Optional[App] = None,
                        cited: Optional[bool] = False,
                        messages: List[Message] = [], tz: Optional[str] = "UTC") -> str:
-    user_name, memories_str = get_prompt_memories(uid)
+    user_name, memories_str = get_prompt_memories(uid, query=question)
     memories_str = '\n'.join(memories_str.split('\n')[1:]).strip()
 
     # Use as template (make sure it varies every time): "If I were you $user_name I would do x, y, z."
@@ -1520,7 +1476,8 @@ def new_memories_extractor(
 ) -> List[Memory]:
     # print('new_memories_extractor', uid, 'segments', len(segments), user_name, 'len(memories_str)', len(memories_str))
     if user_name is None or memories_str is None:
-        user_name, memories_str = get_prompt_memories(uid)
+        # facts already known about what the conversation is about, so they are not extracted again
+        user_name, memories_str = get_prompt_memories(uid, query=TranscriptSegment.segments_as_string(segments))
 
     content = TranscriptSegment.segments_as_string(segments, user_name=user_name)
     if not content or len(content) < 25:  # less than 5 words, probably nothing
@@ -1774,6 +1731,11 @@ class ExpectedOutput(BaseModel):
     items: List[Item] = Field(default=[], description="List of items.")
 
 
+def _filter_trend_items(items: List[Item]) -> List[Item]:
+    options = ceo_options + company_options + software_product_options + hardware_product_options + ai_product_options
+    return [item for item in items if item.topic in options]
+
+
 def trends_extractor(memory: Conversation) -> List[Item]:
     transcript = memory.get_transcript(False)
     if len(transcript) == 0:
@@ -1803,13 +1765,7 @@ def trends_extractor(memory: Conversation) -> List[Item]:
     try:
         with_parser = llm_mini.with_structured_output(ExpectedOutput)
         response: ExpectedOutput = with_parser.invoke(prompt)
-        filtered = []
-        for item in response.items:
-            if item.topic not in [e for e in (
-                    ceo_options + company_options + software_product_options + hardware_product_options + ai_product_options)]:
-                continue
-            filtered.append(item)
-        return filtered
+        return _filter_trend_items(response.items)
 
     except Exception as e:
         print(f'Error determining memory discard: {e}')
@@ -2188,6 +2144,11 @@ def _process_extracted_metadata(uid: str, prompt: str) -> dict:
         print(f'Error extracting metadata: {e}')
         return {'people': [], 'topics': [], 'entities': [], 'dates': []}
 
+    return _metadata_from_extracted_information(uid, result)
+
+
+def _metadata_from_extracted_information(uid: str, result: ExtractedInformation) -> dict:
+    """Normalize extracted metadata and register the values as the user's search filters"""
     def normalize_filter(value: str) -> str:
         # Convert to lowercase and strip whitespace
         value = value.lower().strip()
@@ -2235,6 +2196,126 @@ def _process_extracted_metadata(uid: str, prompt: str) -> dict:
     return metadata
 
 
+# **********************************************
+# ********* COMBINED CONVERSATION PASS *********
+# **********************************************
+
+class CombinedExtractionOutput(EnhancedSummaryOutput):
+    memories: List[Memory] = Field(
+        default=[],
+        description="Up to 3 **new** facts about the user learned from this conversation, if any",
+    )
+    trends: List[Item] = Field(default=[], description="Trending topics mentioned in the conversation, if any")
+    people: List[str] = Field(
+        default=[],
+        examples=[['John Doe', 'Jane Doe']],
+        description='Identify all the people names who were mentioned during the conversation.'
+    )
+    topics: List[str] = Field(
+        default=[],
+        examples=[['Artificial Intelligence', 'Machine Learning']],
+        description='List all the main topics and subtopics that were discussed.',
+    )
+    entities: List[str] = Field(
+        default=[],
+        examples=[['OpenAI', 'GPT-4']],
+        description='List any products, technologies, places, or other entities that are relevant to the conversation.'
+    )
+    dates: List[str] = Field(
+        default=[],
+        examples=[['2024-01-01', '2024-01-02']],
+        description='Extract any dates mentioned in the conversation. Use the format YYYY-MM-DD.'
+    )
+
+
+class ConversationExtraction(BaseModel):
+    structured: Structured
+    memories: List[Memory] = []
+    trends: List[Item] = []
+    metadata: dict = {}
+
+
+@trace_function(tags=["conversation_summary"])
+def get_combined_conversation_extraction(
+        uid: str, transcript: str, started_at: datetime, tz: str,
+        on_partial: Optional[Callable[[Structured], None]] = None
+) -> Optional[ConversationExtraction]:
+    """
+    Single structured-output pass producing what get_transcript_structure, new_memories_extractor,
+    trends_extractor and retrieve_metadata_fields_from_transcript produce separately.
+    Returns None on failure so callers can fall back to the split calls.
+    """
+    if len(transcript) == 0:
+        return None
+
+    user_name, memories_str = get_prompt_memories(uid, query=transcript)
+    valid_categories_str = ", ".join([f"'{cat.value}'" for cat in CategoryEnum])
+    started_at_str = started_at.astimezone(pytz.timezone(tz)).strftime("%A, %B %d at %I:%M %p")
+
+    prompt = f'''
+    You are a personal growth coach and life assistant analyzing a conversation from {user_name}'s life.
+    In one pass, produce a summary of the conversation, new facts about {user_name}, trending topics and search metadata.
+
+    **Summary**
+    - Title: a memorable, personal title that captures the essence of what {user_name} experienced.
+    - Overview: written directly to {user_name}, what this moment meant and why it matters for their growth.
+    - Emoji: one emoji that represents the conversation.
+    - Category: you MUST choose one of the following values EXACTLY as written: {valid_categories_str}
+    - Key takeaways: 3-5 personally meaningful insights {user_name} can carry forward.
+    - Things to improve: 2-3 growth opportunities, each starting with an empowering action verb and saying why it matters. Use content (the suggestion itself), url (empty string) and title (empty string).
+    - Things to learn: 1-2 specific topics or skills worth learning, connected to the conversation. Use content, url (empty string) and title (empty string).
+    - Action items: commitments or next steps {user_name} mentioned.
+    - Events: events or meetings mentioned for scheduling, with the start in ISO format.
+
+    **Memories**
+    Up to 3 **new** facts about {user_name} (age, city, relationships, occupation, preferences, interests, habits, skills...).
+    Each fact is one concise sentence like "{user_name} works as a software engineer.", uses no gendered pronouns, and is categorized as one of: core, hobbies, lifestyle, interests, habits, work, skills, other.
+    Never repeat or closely mirror a fact that is already known. If there is nothing new and noteworthy, return an empty list.
+
+    Facts already known about {user_name} (DO NOT REPEAT ANY):
+    ```
+    {memories_str}
+    ```
+
+    **Trends**
+    Topics of the conversation classified within one of these categories: {str([e.value for e in TrendEnum]).strip("[]")}, with type "best" for a positive perception or "worst" for a negative one.
+    The topic must be one of these options, otherwise leave it out:
+    - ceo_options: {", ".join(ceo_options)}
+    - company_options: {", ".join(company_options)}
+    - software_product_options: {", ".join(software_product_options)}
+    - hardware_product_options: {", ".join(hardware_product_options)}
+    - ai_product_options: {", ".join(ai_product_options)}
+
+    **Metadata**
+    People mentioned by name, the main topics and subtopics, relevant entities (products, technologies, places...) and dates mentioned (YYYY-MM-DD, in UTC).
+    The transcript may have word errors and poor diarization, infer and fix them before extracting.
+
+    For context, this conversation happened on {started_at_str} ({tz}).
+    If one says "today", it means that day, "tomorrow" the day after, "yesterday" the day before, "next week" the next monday.
+
+    Conversation that {user_name} experienced:
+    {transcript}
+    '''.replace('    ', '').strip()
+
+    try:
+        # streamed when on_partial is given, the summary header is sent before the rest is generated
+        response: CombinedExtractionOutput = _invoke_summary_output(prompt, on_partial,
+                                                                    schema=CombinedExtractionOutput)
+    except Exception as e:
+        print(f'Error in get_combined_conversation_extraction: {e}')
+        return None
+
+    metadata = _metadata_from_extracted_information(uid, ExtractedInformation(
+        people=response.people, topics=response.topics, entities=response.entities, dates=response.dates,
+    ))
+    return ConversationExtraction(
+        structured=_structured_from_summary_output(response, on_partial),
+        memories=response.memories[:3],
+        trends=_filter_trend_items(response.trends),
+        metadata=metadata,
+    )
+
+
 def select_structured_filters(question: str, filters_available: dict) -> dict:
     prompt = f'''
     Based on a question asked by the user to an AI, the AI needs to search for the user information related to topics, entities, people, and dates that will help it answering.
@@ -2297,8 +2378,8 @@ class OutputMessage(BaseModel):
 
 
 def provide_advice_message(uid: str, segments: List[TranscriptSegment], context: str) -> str:
-    user_name, memories_str = get_prompt_memories(uid)
     transcript = TranscriptSegment.segments_as_string(segments)
+    user_name, memories_str = get_prompt_memories(uid, query=transcript)
     # TODO: tweak with different type of requests, like this, or roast, or praise or emotional, etc.
 
     prompt = f"""
@@ -2340,7 +2421,7 @@ def provide_advice_message(uid: str, segments: List[TranscriptSegment], context:
 
 def get_proactive_message(uid: str, plugin_prompt: str, params: [str], context: str,
                           chat_messages: List[Message]) -> str:
-    user_name, memories_str = get_prompt_memories(uid)
+    user_name, memories_str = get_prompt_memories(uid, query=context or None)
 
     prompt = plugin_prompt
     for param in params:
@@ -2463,6 +2544,54 @@ Conversations:
     return response.content
 
 
+def fold_condensed_memories(condensed: str, memories: List[str], name: str) -> str:
+    """Updates a condense_memories profile with new facts, instead of condensing every fact again"""
+    combined_memories = "\n".join(memories)
+    prompt = f"""
+You maintain a condensed profile of {name}, used to replicate their personality, communication style, decision-making patterns, and contextual knowledge for 1:1 cloning.
+
+Update the profile with the new facts below:
+1. Integrate each new fact into the section it belongs to, merging it with related facts.
+2. Replace anything in the profile a new fact contradicts or updates.
+3. Keep everything else, in the same output format and sections.
+4. Discard new facts that are trivial or already covered.
+5. Keep the profile as concise as it is now.
+
+Absolutely no introductory or closing statements, explanations, or any unnecessary text. Output only the updated profile.
+
+Current profile:
+{condensed}
+
+New facts:
+{combined_memories}
+    """
+    response = llm_medium.invoke(prompt)
+    return response.content
+
+
+def fold_condensed_conversations(condensed: str, conversations: str) -> str:
+    """Updates a condense_conversations context with the conversations that happened since it was built"""
+    prompt = f"""
+You maintain a condensed context of a user's recent conversations, used to replicate their communication style, personality, decision-making patterns, and contextual knowledge for 1:1 cloning.
+
+Update the context with the new conversations below:
+1. Integrate new themes, interests, patterns, and ongoing discussions into the sections they belong to.
+2. Give the new conversations more weight than older context, drop older context they make obsolete.
+3. Keep the same output format and sections.
+4. Keep the context as concise as it is now, eliminate trivial details.
+
+Absolutely no introductory or closing statements, explanations, or any unnecessary text. Output only the updated context.
+
+Current context:
+{condensed}
+
+New conversations:
+{conversations}
+    """
+    response = llm_medium.invoke(prompt)
+    return response.content
+
+
 def condense_tweets(tweets, name):
     prompt = f"""
 You are tasked with generating context to enable 1:1 cloning of {name} based on their tweets. The objective is to extract and condense the most relevant information while preserving {name}'s core identity, personality, communication style, and thought patterns.  
@@ -0,0 +1,113 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from database.redis_db import get_generic_cache, set_generic_cache
+from models.transcript_segment import TranscriptSegment
+from utils.llm import llm_mini, num_tokens_from_string
+
+# Transcripts above this size are summarized chunk by chunk before the final structure call
+LONG_TRANSCRIPT_TOKENS = 12000
+
+# Chunks follow fixed time windows so that editing one part of a transcript keeps the other chunks' cache keys
+CHUNK_WINDOW_SECONDS = 10 * 60
+# Once a window is full, wait at most this long for the current speaker to finish before cutting
+CHUNK_SPEAKER_GRACE_SECONDS = 60
+# Fallback for transcripts without usable timestamps
+CHUNK_MAX_SEGMENTS = 60
+
+CHUNK_SUMMARY_CACHE_TTL = 60 * 60 * 24 * 7
+MAX_PARALLEL_CHUNKS = 8
+
+
+def is_long_transcript(transcript: str) -> bool:
+    return num_tokens_from_string(transcript) > LONG_TRANSCRIPT_TOKENS
+
+
+def split_segments_into_chunks(segments: List[TranscriptSegment]) -> List[List[TranscriptSegment]]:
+    if not segments:
+        return []
+
+    timed = segments[-1].end > 0 and all(segments[i].start <= segments[i + 1].start for i in range(len(segments) - 1))
+    if not timed:
+        return [segments[i:i + CHUNK_MAX_SEGMENTS] for i in range(0, len(segments), CHUNK_MAX_SEGMENTS)]
+
+    chunks = [[segments[0]]]
+    window_end = (int(segments[0].start // CHUNK_WINDOW_SECONDS) + 1) * CHUNK_WINDOW_SECONDS
+    for segment in segments[1:]:
+        current = chunks[-1]
+        if segment.start >= window_end:
+            speaker_changed = segment.speaker != current[-1].speaker or segment.is_user != current[-1].is_user
+            if speaker_changed or segment.start >= window_end + CHUNK_SPEAKER_GRACE_SECONDS:
+                chunks.append([segment])
+                window_end = (int(segment.start // CHUNK_WINDOW_SECONDS) + 1) * CHUNK_WINDOW_SECONDS
+                continue
+        current.append(segment)
+    return chunks
+
+
+def _chunk_cache_key(chunk_text: str) -> str:
+    return f'transcript-chunk-summary:{hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()}'
+
+
+def _summarize_chunk(chunk_text: str) -> str:
+    key = _chunk_cache_key(chunk_text)
+    cached = get_generic_cache(key)
+    if cached and cached.get('summary'):
+        return cached['summary']
+
+    prompt = f'''
+    You will be given one part of a longer conversation transcript.
+    Write dense notes for this part only, they will be merged with the notes of the other parts to summarize the whole conversation.
+
+    Include:
+    - The main topics discussed and what was said about them
+    - Decisions, insights and personal realizations
+    - Any commitments, tasks or next steps, and who owns them
+    - Any events, meetings or deadlines mentioned, with their dates and times exactly as said
+    - Names of people, places and things that matter
+
+    Keep the speaker attributions. Do not add anything that is not in the transcript. Use at most 300 words.
+
+    Transcript part:
+    ```
+    {chunk_text}
+    ```
+    '''.replace('    ', '').strip()
+
+    summary = llm_mini.invoke(prompt).content
+    set_generic_cache(key, {'summary': summary}, ttl=CHUNK_SUMMARY_CACHE_TTL)
+    return summary
+
+
+def condense_long_transcript(segments: List[TranscriptSegment], user_name: str = None) -> str:
+    """
+    Map step of the long transcript pipeline: summarizes each time chunk in parallel and returns the
+    chunk notes in order, ready to be reduced by the regular structure extraction prompt.
+    Chunk notes are cached by content, so reprocessing only re-summarizes chunks that changed.
+    """
+    chunks = split_segments_into_chunks(segments)
+    chunk_texts = [TranscriptSegment.segments_as_string(chunk, user_name=user_name) for chunk in chunks]
+
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_PARALLEL_CHUNKS) or 1) as executor:
+        summaries = list(executor.map(_summarize_chunk, chunk_texts))
+
+    parts = []
+    for i, (chunk, summary) in enumerate(zip(chunks, summaries)):
+        parts.append(f'Part {i + 1} of {len(chunks)} [{chunk[0].get_timestamp_string().split(" - ")[0]}'
+                     f' - {chunk[-1].get_timestamp_string().split(" - ")[1]}]:\n{summary.strip()}')
+    return '\n\n'.join(parts)
+
+
+def get_summarizable_transcript(segments: List[TranscriptSegment], user_name: str = None) -> str:
+    """The full transcript for regular conversations, the condensed chunk notes for very long ones."""
+    transcript = TranscriptSegment.segments_as_string(segments, user_name=user_name)
+    if not is_long_transcript(transcript):
+        return transcript
+
+    print(f'get_summarizable_transcript: long transcript with {len(segments)} segments, summarizing in chunks')
+    try:
+        return condense_long_transcript(segments, user_name)
+    except Exception as e:
+        print(f'Error condensing long transcript, using the full transcript: {e}')
+        return transcript
@@ -3,19 +3,35 @@ from typing import List, Tuple, Optional
 import database.memories as memories_db
 from database.auth import get_user_name
 from models.memories import Memory
+import utils.llms.memory_index as memory_index
 
+# Newest memories added to the relevant ones when a prompt has a query
+PROMPT_RECENT_MEMORIES = 30
 
-def get_prompt_memories(uid: str) -> str:
-    user_name, user_made_memories, generated_memories = get_prompt_data(uid)
+
+def get_prompt_memories(uid: str, query: Optional[str] = None) -> str:
+    """
+    Memories for a prompt. With a query (a question, a transcript), the memories most relevant to it and the newest
+    ones, otherwise the newest 100.
+    """
+    user_name, user_made_memories, generated_memories = get_prompt_data(uid, query)
     memories_str = f'you already know the following facts about {user_name}: \n{Memory.get_memories_as_str(generated_memories)}.'
     if user_made_memories:
         memories_str += f'\n\n{user_name} also shared the following about self: \n{Memory.get_memories_as_str(user_made_memories)}'
     return user_name, memories_str + '\n'
 
 
-def get_prompt_data(uid: str) -> Tuple[str, List[Memory], List[Memory]]:
+def get_prompt_data(uid: str, query: Optional[str] = None) -> Tuple[str, List[Memory], List[Memory]]:
     # TODO: cache this
-    existing_memories = memories_db.get_memories(uid, limit=100)
+    relevant_memories = memory_index.get_relevant_memories(uid, query) if query else None
+    if relevant_memories is None:
+        existing_memories = memories_db.get_memories(uid, limit=100)
+    else:
+        existing_memories = relevant_memories
+        seen = {memory['id'] for memory in relevant_memories}
+        for memory in memories_db.get_memories(uid, limit=PROMPT_RECENT_MEMORIES):
+            if memory['id'] not in seen:
+                existing_memories.append(memory)
     user_made = [Memory(**memory) for memory in existing_memories if memory['manually_added']]
     # TODO: filter only reviewed True
     generated = [Memory(**memory) for memory in existing_memories if not memory['manually_added']]
@@ -0,0 +1,184 @@
+"""
+Per-user vector index over memories (facts), so prompts can carry the memories relevant to a transcript or question
+instead of only the newest ones.
+Vectors live in a Pinecone namespace per user when Pinecone is configured (MEMORY_INDEX_BACKEND=pinecone), or in
+process (MEMORY_INDEX_BACKEND=local), where a user's index is built with one batch embedding on first use.
+Memories are embedded in batch when saved (utils/conversations/memories.ingest_memories), search results are read
+back from Firestore so deleted and rejected memories never reach a prompt.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import database.memories as memories_db
+import utils.llm
+
+# Memories given to a prompt by relevance
+PROMPT_MEMORIES_K = 30
+# Embedding inputs are capped, a long transcript is represented by its beginning
+MEMORY_QUERY_MAX_CHARS = 6000
+
+LOCAL_INDEX_MAX_USERS = 500
+# Memories saved by other instances show up in a local index after this long
+LOCAL_INDEX_TTL_SECONDS = 10 * 60
+
+
+class _LocalIndex:
+    def __init__(self, memory_ids: List[str], vectors: np.ndarray):
+        self.memory_ids = list(memory_ids)
+        self.rows = {memory_id: i for i, memory_id in enumerate(self.memory_ids)}
+        self.vectors = vectors
+        self.built_at = time.time()
+
+    def upsert(self, memory_ids: List[str], vectors: np.ndarray):
+        new_ids, new_rows = [], []
+        for memory_id, vector in zip(memory_ids, vectors):
+            if memory_id in self.rows:
+                self.vectors[self.rows[memory_id]] = vector
+            else:
+                self.rows[memory_id] = len(self.memory_ids) + len(new_ids)
+                new_ids.append(memory_id)
+                new_rows.append(vector)
+        if new_ids:
+            self.memory_ids.extend(new_ids)
+            new_rows = np.array(new_rows, dtype=np.float32)
+            self.vectors = np.vstack([self.vectors, new_rows]) if self.vectors.size else new_rows
+
+    def remove(self, memory_ids: List[str]):
+        removed = set(memory_ids)
+        keep = [i for i, memory_id in enumerate(self.memory_ids) if memory_id not in removed]
+        self.memory_ids = [self.memory_ids[i] for i in keep]
+        self.rows = {memory_id: i for i, memory_id in enumerate(self.memory_ids)}
+        self.vectors = self.vectors[keep]
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        if not self.memory_ids:
+            return []
+        scores = self.vectors @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.memory_ids[i], float(scores[i])) for i in top]
+
+
+_lock = threading.Lock()
+_local_indexes: OrderedDict = OrderedDict()  # {uid: _LocalIndex}
+
+
+def _use_pinecone() -> bool:
+    backend = os.getenv('MEMORY_INDEX_BACKEND')
+    if backend:
+        return backend == 'pinecone'
+    return os.getenv('PINECONE_API_KEY') is not None
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Unit length embeddings, one batch call for all texts"""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors = np.array(utils.llm.embeddings.embed_documents(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _cached_local_index(uid: str) -> Optional[_LocalIndex]:
+    with _lock:
+        local_index = _local_indexes.get(uid)
+        if local_index and time.time() - local_index.built_at < LOCAL_INDEX_TTL_SECONDS:
+            _local_indexes.move_to_end(uid)
+            return local_index
+    return None
+
+
+def _get_local_index(uid: str) -> _LocalIndex:
+    local_index = _cached_local_index(uid)
+    if local_index:
+        return local_index
+    memories = [memory for memory in memories_db.get_memory_contents(uid) if memory.get('content')]
+    vectors = embed_texts([memory['content'] for memory in memories])
+    local_index = _LocalIndex([memory['id'] for memory in memories], vectors)
+    with _lock:
+        _local_indexes[uid] = local_index
+        _local_indexes.move_to_end(uid)
+        while len(_local_indexes) > LOCAL_INDEX_MAX_USERS:
+            _local_indexes.popitem(last=False)
+    print('memory_index: built local index', uid, len(memories))
+    return local_index
+
+
+def index_memories(uid: str, memories: List[dict], vectors: Optional[np.ndarray] = None):
+    """Adds or replaces memories in the user's index, vectors are computed here unless given"""
+    if not memories:
+        return
+    memory_ids = [memory['id'] for memory in memories]
+    if vectors is None:
+        vectors = embed_texts([memory['content'] for memory in memories])
+    if _use_pinecone():
+        from database.vector_db import upsert_memory_vectors
+        upsert_memory_vectors(uid, memory_ids, vectors.tolist())
+        return
+    # an index not built yet picks the memories up when it is
+    local_index = _cached_local_index(uid)
+    if local_index:
+        with _lock:
+            local_index.upsert(memory_ids, vectors)
+
+
+def unindex_memories(uid: str, memory_ids: List[str]):
+    if not memory_ids:
+        return
+    try:
+        if _use_pinecone():
+            from database.vector_db import delete_memory_vectors
+            delete_memory_vectors(uid, memory_ids)
+            return
+        with _lock:
+            local_index = _local_indexes.get(uid)
+            if local_index:
+                local_index.remove(memory_ids)
+    except Exception as e:
+        print('memory_index: unindex failed', uid, e)
+
+
+def unindex_all_memories(uid: str):
+    """Empties the user's index, errors are raised so a deletion job can retry"""
+    if _use_pinecone():
+        from database.vector_db import delete_memories_namespace
+        delete_memories_namespace(uid)
+        return
+    with _lock:
+        _local_indexes.pop(uid, None)
+
+
+def search_memories(uid: str, vector: np.ndarray, k: int) -> List[Tuple[str, float]]:
+    """(memory id, cosine similarity) of the k memories nearest to a unit length vector"""
+    if _use_pinecone():
+        from database.vector_db import query_memory_vectors
+        return query_memory_vectors(uid, vector.tolist(), k)
+    local_index = _get_local_index(uid)
+    with _lock:
+        return local_index.search(vector, k)
+
+
+def get_relevant_memories(uid: str, query: str, k: int = PROMPT_MEMORIES_K) -> Optional[List[dict]]:
+    """
+    The k memories most relevant to query, most relevant first.
+    None when the index can't be searched or has nothing for the user (e.g. not backfilled yet), callers then fall
+    back to the newest memories.
+    """
+    try:
+        vector = embed_texts([query[:MEMORY_QUERY_MAX_CHARS]])[0]
+        # deleted and rejected memories can still be indexed, ask for extra candidates
+        matches = search_memories(uid, vector, k * 2)
+    except Exception as e:
+        print('memory_index: search failed', uid, e)
+        return None
+    if not matches:
+        return None
+    memories = memories_db.get_memories_by_ids(uid, [memory_id for memory_id, _ in matches])
+    memories = [memory for memory in memories if not memory.get('deleted') and memory.get('user_review') is not False]
+    return memories[:k] or None
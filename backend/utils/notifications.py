@@ -1,33 +1,203 @@
+"""
+FCM delivery. Single sends are queued and flushed every NOTIFICATION_BATCH_WINDOW_SECONDS as messaging.send_each
+batches, sends sharing a token and collapse key within a window merge into one notification, and tokens FCM
+reports as invalid are removed from the user.
+"""
 import asyncio
+import atexit
 import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
 
 from firebase_admin import messaging
 
 import database.notifications as notification_db
 
+# How long a send waits for others to share its batch
+NOTIFICATION_BATCH_WINDOW_SECONDS = 0.5
+# send_each accepts at most 500 messages
+NOTIFICATION_BATCH_SIZE = 500
+# A merged notification shows the latest this many sends
+NOTIFICATION_MERGED_PARTS = 5
+# FCM rejects payloads over 4KB (notification and data together), merged bodies are cut to this many bytes
+NOTIFICATION_MERGED_BODY_BYTES = 2048
 
-def send_notification(token: str, title: str, body: str, data: dict = None):
-    print('send_notification')
-    notification = messaging.Notification(title=title, body=body)
-    message = messaging.Message(notification=notification, token=token)
 
-    if data:
-        message.data = data
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    # room for the ellipsis, a character cut in half is dropped
+    return encoded[:max_bytes - 3].decode('utf-8', errors='ignore') + '…'
 
-    try:
-        response = messaging.send(message)
-        print('send_notification success:', response)
-    except Exception as e:
-        error_message = str(e)
-        if "Requested entity was not found" in error_message:
-            notification_db.remove_token(token)
-        print('send_notification failed:', e)
+
+class _PendingNotification:
+    def __init__(self, token: str, title: str, body: str, data: Optional[dict], collapse_key: Optional[str]):
+        self.token = token
+        self.collapse_key = collapse_key
+        self.parts = [(title, body)]
+        self.data = data
+
+    def merge(self, title: str, body: str, data: Optional[dict]):
+        self.parts.append((title, body))
+        if data:
+            # the notification opens the latest one
+            self.data = data
+
+    def to_message(self) -> messaging.Message:
+        titles = {title for title, _ in self.parts}
+        parts = self.parts[-NOTIFICATION_MERGED_PARTS:]
+        if len(self.parts) == 1:
+            title, body = self.parts[0]
+        elif len(titles) == 1:
+            title, body = self.parts[0][0], '\n'.join(body for _, body in parts)
+        else:
+            title = f'{len(self.parts)} new messages'
+            body = '\n'.join(f'{part_title}: {part_body}' for part_title, part_body in parts)
+        if len(self.parts) > 1:
+            if len(self.parts) > len(parts):
+                body = f'{len(self.parts) - len(parts)} earlier messages…\n{body}'
+            body = _truncate_utf8(body, NOTIFICATION_MERGED_BODY_BYTES)
+
+        message = messaging.Message(notification=messaging.Notification(title=title, body=body), token=self.token)
+        if self.data:
+            message.data = self.data
+        if self.collapse_key:
+            # the device replaces a notification still shown from an earlier window
+            message.android = messaging.AndroidConfig(collapse_key=self.collapse_key)
+            message.apns = messaging.APNSConfig(headers={'apns-collapse-id': self.collapse_key})
+        return message
+
+
+def _is_invalid_token_error(e: Exception) -> bool:
+    if isinstance(e, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    return "Requested entity was not found" in str(e)
+
+
+class NotificationDelivery:
+    """
+    Batches notifications over a short window. send_each is messaging.send_each unless a stand-in is given
+    (testing/notification_delivery_benchmark.py).
+    """
+
+    def __init__(self, send_each: Callable = None, window_seconds: float = NOTIFICATION_BATCH_WINDOW_SECONDS,
+                 remove_token: Callable[[str], None] = None):
+        self._send_each = send_each or messaging.send_each
+        self._remove_token = remove_token or notification_db.remove_token
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: OrderedDict = OrderedDict()  # {(token, collapse key or a unique key): _PendingNotification}
+        self._sequence = 0
+        self._thread: Optional[threading.Thread] = None
+        self._metrics: Dict[str, float] = {
+            'queued': 0, 'collapsed': 0, 'sent': 0, 'failed': 0, 'batches': 0, 'invalid_tokens_removed': 0,
+            'last_batch_size': 0, 'last_batch_ms': 0,
+        }
+
+    def send(self, token: str, title: str, body: str, data: dict = None, collapse_key: str = None):
+        with self._lock:
+            self._metrics['queued'] += 1
+            if collapse_key:
+                key = (token, collapse_key)
+            else:
+                self._sequence += 1
+                key = (token, self._sequence)
+            pending = self._pending.get(key)
+            if pending:
+                pending.merge(title, body, data)
+                self._metrics['collapsed'] += 1
+            else:
+                self._pending[key] = _PendingNotification(token, title, body, data, collapse_key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+            time.sleep(self.window_seconds)
+            self.flush()
+
+    def flush(self):
+        """Sends everything queued, from the worker after every window and at exit"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for i in range(0, len(pending), NOTIFICATION_BATCH_SIZE):
+            self.send_batch([p.to_message() for p in pending[i:i + NOTIFICATION_BATCH_SIZE]])
+
+    def send_batch(self, messages: List[messaging.Message]):
+        if not messages:
+            return
+        started = time.perf_counter()
+        try:
+            response = self._send_each(messages)
+        except Exception as e:
+            print('send_batch failed:', e)
+            with self._lock:
+                self._metrics['failed'] += len(messages)
+                self._metrics['batches'] += 1
+            return
+
+        invalid_tokens = set()
+        failed = 0
+        for message, result in zip(messages, response.responses):
+            if result.success:
+                continue
+            failed += 1
+            if _is_invalid_token_error(result.exception):
+                invalid_tokens.add(message.token)
+            else:
+                print('send_notification failed:', result.exception)
+        for token in invalid_tokens:
+            try:
+                self._remove_token(token)
+            except Exception as e:
+                print('remove_token failed:', e)
+
+        with self._lock:
+            self._metrics['sent'] += len(messages) - failed
+            self._metrics['failed'] += failed
+            self._metrics['batches'] += 1
+            self._metrics['invalid_tokens_removed'] += len(invalid_tokens)
+            self._metrics['last_batch_size'] = len(messages)
+            self._metrics['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        print(f'send_batch: {len(messages) - failed}/{len(messages)} sent, {len(invalid_tokens)} tokens removed')
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {**self._metrics, 'pending': len(self._pending)}
+
+
+_delivery = NotificationDelivery()
+atexit.register(_delivery.flush)
+
+
+def get_delivery_metrics() -> dict:
+    return _delivery.get_metrics()
+
+
+def send_notification(token: str, title: str, body: str, data: dict = None, collapse_key: str = None):
+    """
+    Queues a notification, it goes out with the next batch.
+    Notifications to the same token with the same collapse_key in one window are merged.
+    """
+    if not token:
+        print('send_notification skipped: no token')
+        return
+    _delivery.send(token, title, body, data, collapse_key)
 
 
 async def send_bulk_notification(user_tokens: list, title: str, body: str):
     try:
-        batch_size = 500
-        num_batches = math.ceil(len(user_tokens) / batch_size)
+        num_batches = math.ceil(len(user_tokens) / NOTIFICATION_BATCH_SIZE)
 
         def send_batch(batch_users):
             messages = [
@@ -36,12 +206,12 @@ async def send_bulk_notification(user_tokens: list, title: str, body: str):
                     token=token
                 ) for token in batch_users
             ]
-            return messaging.send_each(messages)
+            _delivery.send_batch(messages)
 
         tasks = []
         for i in range(num_batches):
-            start = i * batch_size
-            end = start + batch_size
+            start = i * NOTIFICATION_BATCH_SIZE
+            end = start + NOTIFICATION_BATCH_SIZE
             batch_users = user_tokens[start:end]
             task = asyncio.to_thread(send_batch, batch_users)
             tasks.append(task)
@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import hashlib
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+import database.redis_db as redis_db
+from utils.llm import analyze_image_content
+from utils.other.image_processing import ImageFingerprint, PreparedImage, prepare_image, is_near_duplicate
+from utils.other.storage import upload_conversation_image
+
+# Images uploaded and analyzed at the same time for a single request
+MAX_PARALLEL_IMAGES = 5
+
+IMAGE_ANALYSIS_FALLBACK = "Image content could not be analyzed"
+
+
+class IngestedImage(BaseModel):
+    index: int
+    url: str
+    description: str
+    analyzed: bool = True
+    # index of the earlier image of this request whose description was reused, if any
+    duplicate_of: Optional[int] = None
+    reused_description: bool = False
+
+
+def _prompt_key(user_prompt: Optional[str]) -> str:
+    # descriptions depend on the user's instructions, cache them per prompt
+    return hashlib.sha256((user_prompt or '').strip().encode('utf-8')).hexdigest()[:16]
+
+
+def _load_cached_descriptions(cached: Dict[str, str]) -> List[Tuple[ImageFingerprint, str]]:
+    entries = []
+    for content_hash, value in cached.items():
+        try:
+            entry = json.loads(value)
+            fingerprint = ImageFingerprint(content_hash=content_hash, phash=entry['phash'],
+                                           thumbnail=base64.b64decode(entry['thumbnail']))
+        except (ValueError, KeyError) as e:
+            print(f"Skipping unreadable cached image description: {e}")
+            continue
+        entries.append((fingerprint, entry['description']))
+    return entries
+
+
+def _dump_cached_description(fingerprint: ImageFingerprint, description: str) -> str:
+    return json.dumps({
+        'phash': fingerprint.phash, 'description': description,
+        'thumbnail': base64.b64encode(fingerprint.thumbnail).decode('ascii'),
+    })
+
+
+def _find_cached_description(fingerprint: Optional[ImageFingerprint],
+                             cached: List[Tuple[ImageFingerprint, str]]) -> Optional[str]:
+    if not fingerprint:
+        return None
+    for cached_fingerprint, description in cached:
+        if is_near_duplicate(fingerprint, cached_fingerprint):
+            return description
+    return None
+
+
+def _find_duplicate_of(index: int, prepared: List[PreparedImage], primaries: List[int]) -> Optional[int]:
+    for primary in primaries:
+        if is_near_duplicate(prepared[index].fingerprint, prepared[primary].fingerprint):
+            return primary
+    return None
+
+
+async def ingest_conversation_images(
+        images_data: List[bytes], uid: str, conversation_id: str, user_prompt: Optional[str] = None
+) -> AsyncIterator[IngestedImage]:
+    """
+    Uploads and analyzes conversation images concurrently, off the event loop.
+    Images are downscaled and stripped of metadata first. Near-duplicate frames, within the request or against
+    images already described for this conversation, reuse the existing description instead of a vision call.
+    Yields each image as soon as it is done, so results arrive in completion order, not upload order.
+    An upload failure is raised and cancels the remaining images; a failed analysis falls back to a placeholder.
+    """
+    prepared = await asyncio.gather(*[asyncio.to_thread(prepare_image, data) for data in images_data])
+    prompt_key = _prompt_key(user_prompt)
+    cached = await asyncio.to_thread(redis_db.get_conversation_image_descriptions, conversation_id, prompt_key) or {}
+    cached = _load_cached_descriptions(cached)
+
+    # decide up front, in upload order, which images need the vision model
+    primaries: List[int] = []
+    duplicate_of: Dict[int, int] = {}
+    cached_descriptions: Dict[int, str] = {}
+    for i, image in enumerate(prepared):
+        description = _find_cached_description(image.fingerprint, cached)
+        if description:
+            cached_descriptions[i] = description
+            continue
+        primary = _find_duplicate_of(i, prepared, primaries)
+        if primary is not None:
+            duplicate_of[i] = primary
+        else:
+            primaries.append(i)
+
+    print(f"ingest_conversation_images: {len(prepared)} images, {len(primaries)} to analyze, "
+          f"{len(duplicate_of)} near-duplicates, {len(cached_descriptions)} cached")
+
+    loop = asyncio.get_running_loop()
+    descriptions: Dict[int, asyncio.Future] = {i: loop.create_future() for i in primaries}
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_IMAGES)
+
+    async def analyze(index: int):
+        try:
+            description = await asyncio.to_thread(analyze_image_content, prepared[index].data, user_prompt)
+        except Exception as e:
+            print(f"Error analyzing image {index}: {e}")
+            description = None
+        # analyze_image_content reports its own failures with the fallback text
+        result = (description, True) if description and description != IMAGE_ANALYSIS_FALLBACK \
+            else (IMAGE_ANALYSIS_FALLBACK, False)
+        descriptions[index].set_result(result)
+        return result
+
+    async def ingest(index: int) -> IngestedImage:
+        async with semaphore:
+            upload = asyncio.to_thread(upload_conversation_image, prepared[index].data, uid, conversation_id, index)
+            if index in descriptions:
+                # the upload and the vision call are independent, run them side by side
+                url, (description, analyzed) = await asyncio.gather(upload, analyze(index))
+                return IngestedImage(index=index, url=url, description=description, analyzed=analyzed)
+            url = await upload
+
+        if index in cached_descriptions:
+            return IngestedImage(index=index, url=url, description=cached_descriptions[index],
+                                 reused_description=True)
+        # wait for the earlier frame outside the semaphore, it may still need a slot
+        primary = duplicate_of[index]
+        description, analyzed = await asyncio.shield(descriptions[primary])
+        return IngestedImage(index=index, url=url, description=description, analyzed=analyzed,
+                             duplicate_of=primary, reused_description=True)
+
+    tasks = [asyncio.create_task(ingest(i)) for i in range(len(prepared))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    new_descriptions = {}
+    for i in primaries:
+        description, analyzed = descriptions[i].result()
+        fingerprint = prepared[i].fingerprint
+        if analyzed and fingerprint:
+            new_descriptions[fingerprint.content_hash] = _dump_cached_description(fingerprint, description)
+    if new_descriptions:
+        await asyncio.to_thread(
+            redis_db.cache_conversation_image_descriptions, conversation_id, prompt_key, new_descriptions
+        )
+
+
+async def ingest_conversation_images_ordered(
+        images_data: List[bytes], uid: str, conversation_id: str, user_prompt: Optional[str] = None,
+        on_progress: Optional[Callable[[IngestedImage, int, int], None]] = None,
+) -> List[IngestedImage]:
+    """Runs the ingestion pipeline to completion and returns the images in upload order."""
+    results = []
+    async for image in ingest_conversation_images(images_data, uid, conversation_id, user_prompt):
+        results.append(image)
+        if on_progress:
+            on_progress(image, len(results), len(images_data))
+    return sorted(results, key=lambda image: image.index)
@@ -0,0 +1,126 @@
+import hashlib
+import io
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+# The vision model ("detail": "high") fits images in a 2048px square and then scales the shortest side to 768px,
+# anything above that is uploaded and billed for nothing
+VISION_MAX_LONG_SIDE = 2048
+VISION_MAX_SHORT_SIDE = 768
+JPEG_QUALITY = 85
+
+# Images whose perceptual hashes differ in at most this many of 256 bits are near-duplicate candidates
+NEAR_DUPLICATE_DISTANCE = 32
+# A candidate is confirmed block by block (8x8 pixels) on grayscale thumbnails: no block may differ by more than
+# NEAR_DUPLICATE_MAX_BLOCK_DIFFERENCE per pixel (0-255), and every block with some texture must correlate at least
+# NEAR_DUPLICATE_MIN_BLOCK_CORRELATION. Coarse hashes alone can't tell apart pages of text or screenshots sharing a
+# layout, a mean over the whole thumbnail hides a changed line, and faint small text only shows in the correlation.
+NEAR_DUPLICATE_MAX_BLOCK_DIFFERENCE = 4.0
+NEAR_DUPLICATE_MIN_BLOCK_CORRELATION = 0.9
+TEXTURED_BLOCK_MIN_STD = 1.0
+THUMBNAIL_SIZE = 64
+THUMBNAIL_BLOCK = 8
+
+
+class ImageFingerprint(BaseModel):
+    # sha256 of the prepared JPEG, the same upload prepares to the same bytes
+    content_hash: str
+    phash: str
+    # THUMBNAIL_SIZE x THUMBNAIL_SIZE grayscale pixels
+    thumbnail: bytes
+
+
+class PreparedImage(BaseModel):
+    data: bytes
+    fingerprint: Optional[ImageFingerprint] = None
+    width: int = 0
+    height: int = 0
+
+
+def _difference_hash(gray: Image.Image) -> str:
+    """256 bit dHash: compares neighbouring pixels of a 17x16 grayscale thumbnail, robust to scaling and re-encoding."""
+    pixels = np.asarray(gray.resize((17, 16), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+    return f'{int("".join("1" if bit else "0" for bit in bits), 2):064x}'
+
+
+def _fingerprint(data: bytes, gray: Image.Image) -> ImageFingerprint:
+    thumbnail = gray.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS).tobytes()
+    return ImageFingerprint(content_hash=hashlib.sha256(data).hexdigest(), phash=_difference_hash(gray),
+                            thumbnail=thumbnail)
+
+
+def hash_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def _blocks(thumbnail: bytes) -> np.ndarray:
+    """The thumbnail's THUMBNAIL_BLOCK square blocks, one row of pixels each"""
+    blocks = THUMBNAIL_SIZE // THUMBNAIL_BLOCK
+    pixels = np.frombuffer(thumbnail, dtype=np.uint8).astype(np.float32)
+    pixels = pixels.reshape(blocks, THUMBNAIL_BLOCK, blocks, THUMBNAIL_BLOCK).transpose(0, 2, 1, 3)
+    return pixels.reshape(blocks * blocks, THUMBNAIL_BLOCK * THUMBNAIL_BLOCK)
+
+
+def thumbnails_match(a: bytes, b: bytes) -> bool:
+    a, b = _blocks(a), _blocks(b)
+    if np.abs(a - b).mean(axis=1).max() > NEAR_DUPLICATE_MAX_BLOCK_DIFFERENCE:
+        return False
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+    a_std, b_std = np.sqrt((a ** 2).mean(axis=1)), np.sqrt((b ** 2).mean(axis=1))
+    textured = np.maximum(a_std, b_std) > TEXTURED_BLOCK_MIN_STD
+    if not textured.any():
+        return True
+    correlation = (a * b).mean(axis=1)[textured] / np.maximum(a_std * b_std, 1e-6)[textured]
+    return bool(correlation.min() >= NEAR_DUPLICATE_MIN_BLOCK_CORRELATION)
+
+
+def is_near_duplicate(a: Optional[ImageFingerprint], b: Optional[ImageFingerprint]) -> bool:
+    """Same picture: identical content, or a close hash confirmed by the thumbnails"""
+    if not a or not b:
+        return False
+    if a.content_hash == b.content_hash:
+        return True
+    if len(a.thumbnail) != len(b.thumbnail) or hash_distance(a.phash, b.phash) > NEAR_DUPLICATE_DISTANCE:
+        return False
+    return thumbnails_match(a.thumbnail, b.thumbnail)
+
+
+def prepare_image(image_data: bytes) -> PreparedImage:
+    """
+    Decodes an uploaded image once and returns a JPEG downscaled to what the vision model uses, with all metadata
+    (EXIF, GPS, ICC, text chunks) dropped, along with its fingerprint for duplicate detection.
+    EXIF has to be read (extract_image_timestamp) before this, the output no longer carries it.
+    Undecodable images are passed through untouched and without a fingerprint.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+
+        scale = min(1.0, VISION_MAX_LONG_SIDE / max(image.size), VISION_MAX_SHORT_SIDE / min(image.size))
+        if scale < 1.0:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        # a fresh save without exif/icc_profile arguments writes no metadata
+        image.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        data = output.getvalue()
+        return PreparedImage(data=data, fingerprint=_fingerprint(data, image.convert('L')),
+                             width=image.width, height=image.height)
+    except Exception as e:
+        print(f"Error preparing image, using the original: {e}")
+        return PreparedImage(data=image_data)
+
@@ -0,0 +1,116 @@
+"""
+Local filesystem stand-in for the parts of the google.cloud.storage client used by utils/other/storage.py.
+Enabled with STORAGE_LOCAL_DIR, every bucket becomes a directory under it, for tests and local development.
+"""
+import datetime
+import os
+import shutil
+from typing import BinaryIO, Iterator, List, Optional
+
+
+class LocalBlob:
+    def __init__(self, bucket: 'LocalBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.content_type = None
+        self.chunk_size = None
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.bucket.root, self.name)
+
+    @property
+    def size(self) -> Optional[int]:
+        return os.path.getsize(self._path) if self.exists() else None
+
+    def exists(self) -> bool:
+        return os.path.isfile(self._path)
+
+    def upload_from_file(self, file_obj: BinaryIO, rewind: bool = False, size: int = None, content_type: str = None,
+                         **kwargs):
+        if rewind:
+            file_obj.seek(0)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'wb') as f:
+            if size is None:
+                shutil.copyfileobj(file_obj, f)
+            else:
+                f.write(file_obj.read(size))
+        if content_type:
+            self.content_type = content_type
+
+    def upload_from_string(self, data, content_type: str = None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'wb') as f:
+            f.write(data)
+        if content_type:
+            self.content_type = content_type
+
+    def upload_from_filename(self, filename: str, content_type: str = None, **kwargs):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        shutil.copyfile(filename, self._path)
+        if content_type:
+            self.content_type = content_type
+
+    def compose(self, sources: List['LocalBlob'], **kwargs):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'wb') as f:
+            for source in sources:
+                with open(source._path, 'rb') as part:
+                    shutil.copyfileobj(part, f)
+
+    def download_to_filename(self, filename: str, **kwargs):
+        shutil.copyfile(self._path, filename)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        with open(self._path, 'rb') as f:
+            return f.read()
+
+    def delete(self, **kwargs):
+        os.remove(self._path)
+
+    def generate_signed_url(self, version: str = None, expiration: datetime.timedelta = None, method: str = 'GET',
+                            **kwargs) -> str:
+        return f'file://{os.path.abspath(self._path)}'
+
+
+class LocalBucket:
+    def __init__(self, client: 'LocalStorageClient', name: str):
+        self.client = client
+        self.name = name
+        self.root = os.path.join(client.root, name or '_default')
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def list_blobs(self, prefix: str = '') -> Iterator[LocalBlob]:
+        if not os.path.isdir(self.root):
+            return iter([])
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                name = os.path.relpath(os.path.join(directory, file), self.root).replace(os.sep, '/')
+                if name.startswith(prefix):
+                    names.append(name)
+        return iter([LocalBlob(self, name) for name in sorted(names)])
+
+    def delete_blobs(self, blobs: List[LocalBlob], on_error=None):
+        for blob in blobs:
+            try:
+                blob.delete()
+            except FileNotFoundError:
+                if on_error is None:
+                    raise
+                on_error(blob)
+
+
+class LocalStorageClient:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def bucket(self, name: str) -> LocalBucket:
+        return LocalBucket(self, name)
@@ -0,0 +1,93 @@
+"""
+Resolves which users are at a given local time, for the notification cron.
+Time zones are grouped by their current UTC offset, so a UTC minute maps to the zones at the target local time
+with a dictionary lookup, and users are read page by page from per time zone buckets in Redis
+(maintained by database/notifications.save_token).
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+
+import pytz
+
+import database.notifications as notification_db
+import database.redis_db as redis_db
+
+NOTIFICATION_PAGE_SIZE = 500
+# Offsets only change at DST transitions, which happen on a quarter hour
+_OFFSET_TABLE_WINDOW_SECONDS = 15 * 60
+
+_lock = threading.Lock()
+_offset_table: Tuple[int, Dict[int, List[str]]] = (-1, {})
+
+
+def timezones_by_offset(now: datetime) -> Dict[int, List[str]]:
+    """{UTC offset in minutes: time zones currently at that offset}, rebuilt once per window"""
+    global _offset_table
+    window = int(now.timestamp()) // _OFFSET_TABLE_WINDOW_SECONDS
+    with _lock:
+        if _offset_table[0] == window:
+            return _offset_table[1]
+    table: Dict[int, List[str]] = {}
+    for tz_name in pytz.all_timezones:
+        offset = now.astimezone(pytz.timezone(tz_name)).utcoffset()
+        table.setdefault(int(offset.total_seconds() // 60), []).append(tz_name)
+    with _lock:
+        _offset_table = (window, table)
+    return table
+
+
+def _minute_of_day(local_time: str) -> int:
+    hour, minute = local_time.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def timezones_at_local_time(target_time: str, now: datetime = None) -> List[str]:
+    """Time zones where it is target_time ("HH:MM") at the current UTC minute"""
+    now = now or datetime.now(pytz.utc)
+    table = timezones_by_offset(now)
+    offset = (_minute_of_day(target_time) - (now.hour * 60 + now.minute)) % (24 * 60)
+    # offsets range from -12:00 to +14:00, the same local time can be reached from both sides of UTC
+    return table.get(offset, []) + table.get(offset - 24 * 60, [])
+
+
+def is_local_time_anywhere(target_times: Iterable[str], now: datetime = None) -> bool:
+    now = now or datetime.now(pytz.utc)
+    return any(timezones_at_local_time(target_time, now) for target_time in target_times)
+
+
+async def iter_users_at_local_time(target_time: str, page_size: int = NOTIFICATION_PAGE_SIZE) \
+        -> AsyncIterator[List[Tuple[str, str, str]]]:
+    """Pages of (uid, fcm token, time zone) of the users at target_time"""
+    timezones = timezones_at_local_time(target_time)
+    if not timezones:
+        return
+
+    if not await asyncio.to_thread(redis_db.is_notification_index_ready):
+        # index not built yet (migration/notification_index.py), query Firestore
+        users = await notification_db.get_users_id_in_timezones(timezones)
+        for i in range(0, len(users), page_size):
+            yield users[i:i + page_size]
+        return
+
+    page: List[Tuple[str, str, str]] = []
+    seen = set()  # HSCAN may return a user twice while the hash is rehashed
+    for time_zone in timezones:
+        cursor = 0
+        while True:
+            result = await asyncio.to_thread(redis_db.scan_notification_users, time_zone, cursor, page_size)
+            if result is None:
+                break
+            cursor, users = result
+            for uid, token in users.items():
+                if uid not in seen:
+                    seen.add(uid)
+                    page.append((uid, token, time_zone))
+            if len(page) >= page_size:
+                yield page
+                page = []
+            if not cursor:
+                break
+    if page:
+        yield page
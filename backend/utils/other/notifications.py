@@ -2,20 +2,23 @@ import asyncio
 import concurrent.futures
 import threading
 from datetime import datetime
-from datetime import time
 
 import pytz
 
 import database.chat as chat_db
-import database.conversations as conversations_db
-import database.notifications as notification_db
+import database.daily_digests as daily_digests_db
 from models.notification_message import NotificationMessage
-from utils.llm import get_conversation_summary
+from utils.apps import rebuild_due_personas
+from utils.conversations.daily_digest import digest_date, summarize_daily_digest, refresh_due_daily_digest_summaries
 from utils.notifications import send_notification, send_bulk_notification
+from utils.other.notification_schedule import is_local_time_anywhere, iter_users_at_local_time
 from utils.webhooks import day_summary_webhook
 
 
 async def start_cron_job():
+    # every minute, deferred persona rebuilds and digest summaries must not wait for a notification hour
+    await asyncio.to_thread(rebuild_due_personas)
+    await asyncio.to_thread(refresh_due_daily_digest_summaries)
     if should_run_job():
         print('start_cron_job')
         await send_daily_notification()
@@ -23,26 +26,14 @@ async def start_cron_job():
 
 
 def should_run_job():
-    current_utc = datetime.now(pytz.utc)
-    target_hours = {8, 22}
-
-    for tz in pytz.all_timezones:
-        local_time = current_utc.astimezone(pytz.timezone(tz))
-        if local_time.hour in target_hours and local_time.minute == 0:
-            return True
-
-    return False
+    return is_local_time_anywhere(['08:00', '22:00'])
 
 
 async def send_daily_summary_notification():
     try:
         daily_summary_target_time = "22:00"
-        timezones_in_time = _get_timezones_at_time(daily_summary_target_time)
-        user_in_time_zone = await notification_db.get_users_id_in_timezones(timezones_in_time)
-        if not user_in_time_zone:
-            return None
-
-        await _send_bulk_summary_notification(user_in_time_zone)
+        async for users in iter_users_at_local_time(daily_summary_target_time):
+            await _send_bulk_summary_notification(users)
     except Exception as e:
         print(e)
         print("Error sending message:", e)
@@ -53,13 +44,18 @@ def _send_summary_notification(user_data: tuple):
     uid = user_data[0]
     fcm_token = user_data[1]
     daily_summary_title = "Here is your action plan for tomorrow"  # TODO: maybe include llm a custom message for this
-    memories = conversations_db.filter_conversations_by_date(
-        uid, datetime.combine(datetime.now().date(), time.min), datetime.now()
-    )
-    if not memories:
+    # the day's conversations were folded into the digest as they were processed, it only has to be sent
+    date = digest_date(datetime.now(pytz.utc), user_data[2])
+    digest = daily_digests_db.get_daily_digest(uid, date)
+    if not digest or not digest.get('conversations') or digest.get('sent_at'):
         return
-    else:
-        summary = get_conversation_summary(uid, memories)
+
+    summary = digest.get('summary')
+    if not summary or digest.get('summary_revision') != digest.get('revision'):
+        # a fold is still running or failed, the only summary call left for the cron
+        summary = summarize_daily_digest(uid, digest)
+        if not summary:
+            return
 
     ai_message = NotificationMessage(
         text=summary,
@@ -69,6 +65,7 @@ def _send_summary_notification(user_data: tuple):
         navigate_to="/chat/omi",  # omi ~ no select
     )
     chat_db.add_summary_message(summary, uid)
+    daily_digests_db.mark_daily_digest_sent(uid, date)
     threading.Thread(target=day_summary_webhook, args=(uid, summary)).start()
     send_notification(fcm_token, daily_summary_title, summary, NotificationMessage.get_message_as_dict(ai_message))
 
@@ -98,24 +95,10 @@ async def send_daily_notification():
 
 
 async def _send_notification_for_time(target_time: str, title: str, body: str):
-    user_in_time_zone = await _get_users_in_timezone(target_time)
-    if not user_in_time_zone:
+    sent = 0
+    async for users in iter_users_at_local_time(target_time):
+        await send_bulk_notification([token for _, token, _ in users], title, body)
+        sent += len(users)
+    if not sent:
         print("No users found in time zone")
-        return None
-    await send_bulk_notification(user_in_time_zone, title, body)
-    return user_in_time_zone
-
-
-async def _get_users_in_timezone(target_time: str):
-    timezones_in_time = _get_timezones_at_time(target_time)
-    return await notification_db.get_users_token_in_timezones(timezones_in_time)
-
-
-def _get_timezones_at_time(target_time):
-    target_timezones = []
-    for tz_name in pytz.all_timezones:
-        tz = pytz.timezone(tz_name)
-        current_time = datetime.now(tz).strftime("%H:%M")
-        if current_time == target_time:
-            target_timezones.append(tz_name)
-    return target_timezones
+    return sent
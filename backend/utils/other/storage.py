@@ -1,16 +1,31 @@
+import asyncio
 import datetime
+import io
 import json
 import os
-from typing import List
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, unquote
+from typing import Callable, List, BinaryIO, Optional, Union
+
+from fastapi import UploadFile
 
 from google.cloud import storage
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials as OAuth2Credentials
-from google.cloud.storage import transfer_manager
 
-from database.redis_db import cache_signed_url, get_cached_signed_url
+from database.redis_db import cache_signed_urls, get_cached_signed_urls
+from utils.other.local_storage import LocalStorageClient
+
+signing_credentials = None
 
-if os.environ.get('SERVICE_ACCOUNT_JSON'):
+if os.environ.get('STORAGE_LOCAL_DIR'):
+    print(f"Using local filesystem storage at {os.environ['STORAGE_LOCAL_DIR']}")
+    storage_client = LocalStorageClient(os.environ['STORAGE_LOCAL_DIR'])
+elif os.environ.get('SERVICE_ACCOUNT_JSON'):
     service_account_info = json.loads(os.environ["SERVICE_ACCOUNT_JSON"])
     project_id = os.environ.get('GOOGLE_CLOUD_PROJECT') or service_account_info.get('project_id', service_account_info.get('quota_project_id'))
     
@@ -18,6 +33,8 @@ if os.environ.get('SERVICE_ACCOUNT_JSON'):
     if service_account_info.get('type') == 'service_account':
         credentials = service_account.Credentials.from_service_account_info(service_account_info)
         storage_client = storage.Client(project=project_id, credentials=credentials)
+        # holds the private key, URLs are signed locally without a network call
+        signing_credentials = credentials
     else:
         # OAuth2 credentials (authorized_user type)
         print("Warning: Using OAuth2 credentials - signed URLs may not work. Consider using service account credentials.")
@@ -41,6 +58,108 @@ omi_plugins_bucket = os.getenv('BUCKET_PLUGINS_LOGOS')
 app_thumbnails_bucket = os.getenv('BUCKET_APP_THUMBNAILS')
 chat_files_bucket = os.getenv('BUCKET_CHAT_FILES')
 
+# *******************************************
+# *********** STREAMING UPLOADS *************
+# *******************************************
+
+# Resumable uploads send the stream in chunks of this size (must be a multiple of 256KB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Uploads at least this big are split into parts uploaded in parallel and composed into the final object
+PARALLEL_COMPOSITE_THRESHOLD = 64 * 1024 * 1024
+PARALLEL_COMPOSITE_MAX_PARTS = 32  # GCS compose limit
+PARALLEL_COMPOSITE_WORKERS = 8
+
+
+def _stream_size(file_obj: BinaryIO) -> Optional[int]:
+    try:
+        position = file_obj.tell()
+        file_obj.seek(0, io.SEEK_END)
+        size = file_obj.tell() - position
+        file_obj.seek(position)
+        return size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _parallel_composite_upload(bucket, blob, file_obj: BinaryIO, size: int):
+    part_size = max(UPLOAD_CHUNK_SIZE, -(-size // PARALLEL_COMPOSITE_MAX_PARTS))
+    part_size = -(-part_size // (256 * 1024)) * (256 * 1024)
+    prefix = f'{blob.name}.parts-{uuid.uuid4().hex[:8]}'
+    parts = [bucket.blob(f'{prefix}/{i:02d}') for i in range(-(-size // part_size))]
+
+    try:
+        with ThreadPoolExecutor(max_workers=PARALLEL_COMPOSITE_WORKERS) as executor:
+            # reads on the shared stream are sequential, uploads run in parallel with at most one wave in memory
+            for wave in range(0, len(parts), PARALLEL_COMPOSITE_WORKERS):
+                futures = [executor.submit(part.upload_from_string, file_obj.read(part_size))
+                           for part in parts[wave:wave + PARALLEL_COMPOSITE_WORKERS]]
+                for future in futures:
+                    future.result()
+        blob.compose(parts)
+    finally:
+        for part in parts:
+            try:
+                part.delete()
+            except Exception:
+                pass
+
+
+def upload_blob_from_file(bucket_name: str, path: str, file_obj: BinaryIO, content_type: str = None,
+                          cache_control: str = None, size: int = None):
+    """
+    Streams a file object (open file, UploadFile.file, BytesIO) straight to GCS, without a local copy.
+    Large seekable streams go through a parallel composite upload, the rest through a chunked resumable upload.
+    """
+    bucket = storage_client.bucket(bucket_name)
+    blob = bucket.blob(path)
+    if cache_control:
+        blob.cache_control = cache_control
+    if content_type:
+        blob.content_type = content_type
+
+    if size is None:
+        size = _stream_size(file_obj)
+    if size is not None and size >= PARALLEL_COMPOSITE_THRESHOLD:
+        _parallel_composite_upload(bucket, blob, file_obj, size)
+        return blob
+
+    if size is None or size > UPLOAD_CHUNK_SIZE:
+        blob.chunk_size = UPLOAD_CHUNK_SIZE
+    blob.upload_from_file(file_obj, size=size, content_type=content_type)
+    return blob
+
+
+def upload_blob_from_bytes(bucket_name: str, path: str, data: Union[bytes, bytearray], content_type: str = None,
+                           cache_control: str = None):
+    return upload_blob_from_file(bucket_name, path, io.BytesIO(data), content_type=content_type,
+                                 cache_control=cache_control, size=len(data))
+
+
+def upload_blob_from_upload_file(bucket_name: str, path: str, file: UploadFile, cache_control: str = None):
+    file.file.seek(0)
+    return upload_blob_from_file(bucket_name, path, file.file, content_type=file.content_type,
+                                 cache_control=cache_control)
+
+
+def upload_blob_from_source(bucket_name: str, path: str, source: Union[str, BinaryIO], content_type: str = None,
+                            cache_control: str = None):
+    """Uploads from a local file path or from an already open stream."""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return upload_blob_from_file(bucket_name, path, f, content_type=content_type, cache_control=cache_control)
+    source.seek(0)
+    return upload_blob_from_file(bucket_name, path, source, content_type=content_type, cache_control=cache_control)
+
+
+async def upload_blob_from_bytes_async(bucket_name: str, path: str, data: Union[bytes, bytearray],
+                                       content_type: str = None, cache_control: str = None):
+    return await asyncio.to_thread(upload_blob_from_bytes, bucket_name, path, data, content_type, cache_control)
+
+
+async def upload_blob_from_upload_file_async(bucket_name: str, path: str, file: UploadFile, cache_control: str = None):
+    return await asyncio.to_thread(upload_blob_from_upload_file, bucket_name, path, file, cache_control)
+
+
 # *******************************************
 # ************* SPEECH PROFILE **************
 # *******************************************
@@ -223,10 +342,42 @@ def get_conversation_recording_if_exists(uid: str, memory_id: str) -> str:
 def delete_all_conversation_recordings(uid: str):
     if not uid:
         return
-    bucket = storage_client.bucket(memories_recordings_bucket)
-    blobs = bucket.list_blobs(prefix=uid)
-    for blob in blobs:
-        blob.delete()
+    delete_blobs_with_prefix(memories_recordings_bucket, f'{uid}/')
+
+
+# Blobs per delete call and calls in flight when a prefix is deleted
+DELETE_BLOBS_PAGE_SIZE = 100
+DELETE_BLOBS_WORKERS = 16
+
+
+def delete_blobs_with_prefix(bucket_name: str, prefix: str, on_progress: Callable[[int], None] = None) -> int:
+    """
+    Deletes every blob under prefix, pages of the listing are deleted in parallel while it continues.
+    Blobs already gone are skipped, re-running it after an interruption deletes what is left.
+    """
+    if not bucket_name or not prefix:
+        return 0
+    bucket = storage_client.bucket(bucket_name)
+
+    def delete_page(blobs) -> int:
+        bucket.delete_blobs(blobs, on_error=lambda blob: None)
+        return len(blobs)
+
+    deleted = 0
+    with ThreadPoolExecutor(max_workers=DELETE_BLOBS_WORKERS) as executor:
+        futures, page = [], []
+        for blob in bucket.list_blobs(prefix=prefix):
+            page.append(blob)
+            if len(page) == DELETE_BLOBS_PAGE_SIZE:
+                futures.append(executor.submit(delete_page, page))
+                page = []
+        if page:
+            futures.append(executor.submit(delete_page, page))
+        for future in futures:
+            deleted += future.result()
+            if on_progress:
+                on_progress(deleted)
+    return deleted
 
 
 # ********************************************
@@ -255,36 +406,103 @@ def delete_syncing_temporal_file(file_path: str):
 # ************* UTILS **************
 # **********************************
 
-def _get_signed_url(blob, minutes):
-    if cached := get_cached_signed_url(blob.name):
-        return cached
+# Per-process signed URL cache, {(bucket, blob path): (url, expires_at)}
+SIGNED_URLS_LRU_MAX = 20000
+# URLs closer than this to their expiry are re-signed instead of being handed out
+SIGNED_URL_MIN_REMAINING_SECONDS = 5 * 60
+
+_signed_urls: OrderedDict = OrderedDict()
+_signed_urls_lock = threading.Lock()
+
 
+def _signed_url_expires_at(signed_url: str, default: float) -> float:
+    # V4 signed URLs carry their signing date and lifetime
+    query = parse_qs(urlparse(signed_url).query)
+    try:
+        signed_at = datetime.datetime.strptime(query['X-Goog-Date'][0], '%Y%m%dT%H%M%SZ')
+        signed_at = signed_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        return signed_at + int(query['X-Goog-Expires'][0])
+    except (KeyError, IndexError, ValueError):
+        return default
+
+
+def _remember_signed_urls(bucket_name: str, signed_urls: dict, default_expires_at: float):
+    with _signed_urls_lock:
+        for path, url in signed_urls.items():
+            _signed_urls[(bucket_name, path)] = (url, _signed_url_expires_at(url, default_expires_at))
+            _signed_urls.move_to_end((bucket_name, path))
+        while len(_signed_urls) > SIGNED_URLS_LRU_MAX:
+            _signed_urls.popitem(last=False)
+
+
+def _sign_url(blob, minutes: int) -> str:
     try:
         # Try to generate signed URL (requires service account with private key)
-        signed_url = blob.generate_signed_url(version="v4", expiration=datetime.timedelta(minutes=minutes), method="GET")
-        cache_signed_url(blob.name, signed_url, minutes * 60)
-        return signed_url
+        return blob.generate_signed_url(
+            version="v4", expiration=datetime.timedelta(minutes=minutes), method="GET", credentials=signing_credentials
+        )
     except AttributeError as e:
         if "private key" in str(e).lower():
             print(f"Warning: Cannot generate signed URL - using public URL fallback. Error: {e}")
             # Fallback to public URL (only works if bucket/blob is publicly accessible)
-            public_url = f"https://storage.googleapis.com/{blob.bucket.name}/{blob.name}"
-            return public_url
+            return None
         else:
             raise e
     except Exception as e:
         print(f"Error generating signed URL: {e}")
-        # Fallback to public URL
-        public_url = f"https://storage.googleapis.com/{blob.bucket.name}/{blob.name}"
-        return public_url
+        return None
 
 
-def upload_plugin_logo(file_path: str, plugin_id: str):
-    bucket = storage_client.bucket(omi_plugins_bucket)
+def get_signed_urls(bucket_name: str, blob_paths: List[str], minutes: int) -> dict:
+    """
+    Signed GET URLs for many blobs of a bucket, {blob path: url}.
+    Resolved from the process LRU first, then from Redis with a single MGET, and the remaining ones are signed
+    locally with the cached service account credentials. Blobs that cannot be signed get their public URL.
+    """
+    now = time.time()
+    result = {}
+    with _signed_urls_lock:
+        for path in blob_paths:
+            cached = _signed_urls.get((bucket_name, path))
+            if cached and cached[1] - now > SIGNED_URL_MIN_REMAINING_SECONDS:
+                _signed_urls.move_to_end((bucket_name, path))
+                result[path] = cached[0]
+
+    missing = list(dict.fromkeys(path for path in blob_paths if path not in result))
+    if not missing:
+        return result
+
+    from_redis = {}
+    for path, url in (get_cached_signed_urls(missing) or {}).items():
+        if _signed_url_expires_at(url, now + 60 * 60) - now > SIGNED_URL_MIN_REMAINING_SECONDS:
+            from_redis[path] = url
+    _remember_signed_urls(bucket_name, from_redis, now + 60 * 60)
+    result.update(from_redis)
+
+    bucket = storage_client.bucket(bucket_name)
+    signed = {}
+    for path in missing:
+        if path in from_redis:
+            continue
+        url = _sign_url(bucket.blob(path), minutes)
+        if url:
+            signed[path] = url
+        else:
+            result[path] = f"https://storage.googleapis.com/{bucket_name}/{path}"
+    if signed:
+        cache_signed_urls(signed, minutes * 60)
+        _remember_signed_urls(bucket_name, signed, now + minutes * 60)
+        result.update(signed)
+    return result
+
+
+def _get_signed_url(blob, minutes):
+    return get_signed_urls(blob.bucket.name, [blob.name], minutes)[blob.name]
+
+
+def upload_plugin_logo(file: Union[str, BinaryIO], plugin_id: str):
     path = f'{plugin_id}.png'
-    blob = bucket.blob(path)
-    blob.cache_control = 'public, no-cache'
-    blob.upload_from_filename(file_path)
+    upload_blob_from_source(omi_plugins_bucket, path, file, cache_control='public, no-cache')
     return f'https://storage.googleapis.com/{omi_plugins_bucket}/{path}'
 
 
@@ -295,12 +513,9 @@ def delete_plugin_logo(img_url: str):
     blob = bucket.blob(path)
     blob.delete()
 
-def upload_app_thumbnail(file_path: str, thumbnail_id: str) -> str:
-    bucket = storage_client.bucket(app_thumbnails_bucket)
+def upload_app_thumbnail(file: Union[str, BinaryIO], thumbnail_id: str) -> str:
     path = f'{thumbnail_id}.jpg'
-    blob = bucket.blob(path)
-    blob.cache_control = 'public, no-cache'
-    blob.upload_from_filename(file_path)
+    upload_blob_from_source(app_thumbnails_bucket, path, file, cache_control='public, no-cache')
     public_url = f'https://storage.googleapis.com/{app_thumbnails_bucket}/{path}'
     return public_url
 
@@ -322,10 +537,18 @@ def upload_multi_chat_files(files_name: List[str], uid: str) -> dict:
     Returns:
         dict: A dictionary mapping original filenames to their Google Cloud Storage URLs
     """
-    bucket = storage_client.bucket(chat_files_bucket)
-    result = transfer_manager.upload_many_from_filenames(bucket, files_name, source_directory="./", blob_name_prefix=f'{uid}/')
+    def upload(name: str):
+        try:
+            upload_blob_from_source(chat_files_bucket, f'{uid}/{name}', name)
+        except Exception as e:
+            return e
+
+    # in-process threads, uploads are I/O bound and share the client's connection pool
+    with ThreadPoolExecutor(max_workers=min(len(files_name), PARALLEL_COMPOSITE_WORKERS) or 1) as executor:
+        results = list(executor.map(upload, files_name))
+
     dictFiles = {}
-    for name, result in zip(files_name, result):
+    for name, result in zip(files_name, results):
         if isinstance(result, Exception):
             print("Failed to upload {} due to exception: {}".format(name, result))
         else:
@@ -349,34 +572,30 @@ def upload_conversation_image(image_data: bytes, uid: str, conversation_id: str,
     Returns:
         str: Signed URL of the uploaded image
     """
-    import uuid
-    import tempfile
-    import os
-    
     # Create a unique filename
     unique_id = str(uuid.uuid4())[:8]
     filename = f"{conversation_id}_{image_index}_{unique_id}.jpg"
-    
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-        temp_file.write(image_data)
-        temp_file_path = temp_file.name
-    
-    try:
-        # Upload to Firebase Storage
-        bucket = storage_client.bucket(chat_files_bucket)  # Reusing chat files bucket
-        path = f'{uid}/conversation_images/{filename}'
-        blob = bucket.blob(path)
-        blob.cache_control = 'public, max-age=3600'  # Cache for 1 hour
-        blob.upload_from_filename(temp_file_path)
-        
-        # Return signed URL instead of public storage URL
-        return _get_signed_url(blob, 60 * 24)  # 24 hours expiry
-        
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
+
+    # Upload to Firebase Storage, reusing chat files bucket
+    path = f'{uid}/conversation_images/{filename}'
+    blob = upload_blob_from_bytes(
+        chat_files_bucket, path, image_data, content_type='image/jpeg', cache_control='public, max-age=3600'
+    )
+
+    # Return signed URL instead of public storage URL
+    return _get_signed_url(blob, 60 * 24)  # 24 hours expiry
+
+
+def refresh_conversation_image_urls(image_urls: List[str]) -> List[str]:
+    """
+    Re-signs stored conversation image URLs, which expire a day after upload, in one batch.
+    URLs that don't point to the chat files bucket are returned unchanged.
+    """
+    prefix = f'https://storage.googleapis.com/{chat_files_bucket}/'
+    paths = [unquote(urlparse(url).path.split(f'/{chat_files_bucket}/', 1)[1]) if url.startswith(prefix) else None
+             for url in image_urls]
+    signed = get_signed_urls(chat_files_bucket, [path for path in paths if path], 60 * 24)
+    return [signed.get(path, url) if path else url for path, url in zip(paths, image_urls)]
 
 
 def upload_multiple_conversation_images(images_data: List[bytes], uid: str, conversation_id: str) -> List[str]:
@@ -423,80 +642,38 @@ def delete_conversation_images(uid: str, conversation_id: str):
 
 
 # **********************************
-# ******* CONVERSATION AUDIO *******
+# ********* TTS AUDIO CACHE *********
 # **********************************
-def upload_conversation_audio(audio_data: bytes, uid: str, conversation_id: str, voice: str = "alloy", speed: float = 1.0) -> str:
-    """
-    Upload an audio file for a conversation TTS to Firebase Storage.
-    
-    Args:
-        audio_data: Raw audio data as bytes
-        uid: User ID
-        conversation_id: ID of the conversation
-        voice: TTS voice used
-        speed: TTS speed used
-    
-    Returns:
-        str: Signed URL of the uploaded audio file
-    """
-    import tempfile
-    import os
-    
-    # Create filename with voice and speed parameters to ensure uniqueness
-    filename = f"{conversation_id}_{voice}_{speed}.mp3"
-    
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-        temp_file.write(audio_data)
-        temp_file_path = temp_file.name
-    
-    try:
-        # Upload to Firebase Storage
-        bucket = storage_client.bucket(chat_files_bucket)  # Reusing chat files bucket
-        path = f'{uid}/conversation_audio/{filename}'
-        blob = bucket.blob(path)
-        blob.cache_control = 'public, max-age=86400'  # Cache for 24 hours
-        blob.content_type = 'audio/mpeg'
-        blob.upload_from_filename(temp_file_path)
-        
-        # Return signed URL
-        return _get_signed_url(blob, 60 * 24)  # 24 hours expiry
-        
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
+def _tts_cache_path(key: str) -> str:
+    return f'tts_cache/{key}.mp3'
 
 
-def get_conversation_audio_url(uid: str, conversation_id: str, voice: str = "alloy", speed: float = 1.0) -> str:
-    """
-    Get signed URL for existing conversation audio file.
-    
-    Args:
-        uid: User ID
-        conversation_id: ID of the conversation
-        voice: TTS voice used
-        speed: TTS speed used
-    
-    Returns:
-        str: Signed URL if file exists, None otherwise
-    """
+def upload_tts_audio(key: str, audio_data: bytes):
+    upload_blob_from_bytes(
+        chat_files_bucket, _tts_cache_path(key), audio_data, content_type='audio/mpeg',
+        cache_control='public, max-age=86400'
+    )
+
+
+def download_tts_audio(key: str) -> bytes:
     bucket = storage_client.bucket(chat_files_bucket)
-    filename = f"{conversation_id}_{voice}_{speed}.mp3"
-    path = f'{uid}/conversation_audio/{filename}'
-    blob = bucket.blob(path)
-    
-    try:
-        # Check if the blob exists
-        if blob.exists():
-            return _get_signed_url(blob, 60 * 24)  # 24 hours expiry
-        else:
-            return None
-    except Exception as e:
-        print(f"Error checking conversation audio existence: {e}")
-        return None
+    return bucket.blob(_tts_cache_path(key)).download_as_bytes()
+
 
+def get_tts_audio_signed_url(key: str) -> str:
+    bucket = storage_client.bucket(chat_files_bucket)
+    return _get_signed_url(bucket.blob(_tts_cache_path(key)), 60 * 24)
+
+
+def delete_tts_audio(keys: List[str]):
+    bucket = storage_client.bucket(chat_files_bucket)
+    # missing blobs are fine, another instance may have evicted them first
+    bucket.delete_blobs([bucket.blob(_tts_cache_path(key)) for key in keys], on_error=lambda blob: None)
 
+
+# **********************************
+# ******* CONVERSATION AUDIO *******
+# **********************************
 def delete_conversation_audio(uid: str, conversation_id: str, voice: str = None, speed: float = None):
     """
     Delete audio files associated with a conversation.
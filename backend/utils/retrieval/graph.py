@@ -437,10 +437,12 @@ def execute_graph_chat(
 
 async def execute_graph_chat_stream(
         uid: str, messages: List[Message], plugin: Optional[App] = None, cited: Optional[bool] = False,
-        callback_data: dict = {}, chat_session: Optional[ChatSession] = None
+        callback_data: dict = {}, chat_session: Optional[ChatSession] = None, tz: Optional[str] = None
 ) -> AsyncGenerator[str, None]:
+    """tz: the user's time zone when the caller already has it, read here otherwise"""
     print('execute_graph_chat_stream plugin: ', plugin.id if plugin else '<none>')
-    tz = notification_db.get_user_time_zone(uid)
+    if tz is None:
+        tz = await asyncio.to_thread(notification_db.get_user_time_zone, uid)
     callback = AsyncStreamingCallback()
 
     try:
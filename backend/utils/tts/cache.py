@@ -0,0 +1,176 @@
+"""
+Content addressed TTS audio cache, shared across users and conversations
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import database.redis_db as redis_db
+from utils.other.storage import upload_tts_audio, download_tts_audio, delete_tts_audio, get_tts_audio_signed_url
+
+# Cached audio not played for this long is evicted from GCS
+TTS_CACHE_TTL_SECONDS = 60 * 60 * 24 * 30
+# Upper bound of cached audio objects, least recently used ones are evicted beyond it
+TTS_CACHE_MAX_ENTRIES = 200000
+# Eviction runs in the background after this many new entries on an instance
+TTS_CACHE_EVICT_EVERY = 200
+
+# Keys known to be stored, so lookups never need a GCS exists() probe
+KNOWN_KEYS_MAX = 50000
+# Hot audio kept in process (short sentences repeat the most), by total size
+MEMORY_AUDIO_MAX_BYTES = 32 * 1024 * 1024
+# Only re-touch a key in Redis when its last touch is older than this
+TOUCH_INTERVAL_SECONDS = 60 * 60
+
+_lock = threading.Lock()
+_known_keys: OrderedDict = OrderedDict()  # {key: last touched ts}
+_audio: OrderedDict = OrderedDict()  # {key: bytes}
+_audio_bytes = 0
+_new_entries = 0
+
+
+def tts_cache_key(text: str, voice: str, speed: float, model: str) -> str:
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(f'{model}\n{voice}\n{float(speed)}\n{normalized}'.encode('utf-8')).hexdigest()
+
+
+def _remember_key(key: str, ts: float):
+    _known_keys[key] = ts
+    _known_keys.move_to_end(key)
+    while len(_known_keys) > KNOWN_KEYS_MAX:
+        _known_keys.popitem(last=False)
+
+
+def _remember_audio(key: str, data: bytes):
+    global _audio_bytes
+    if len(data) > MEMORY_AUDIO_MAX_BYTES // 8:
+        return
+    if key in _audio:
+        _audio.move_to_end(key)
+        return
+    _audio[key] = data
+    _audio_bytes += len(data)
+    while _audio_bytes > MEMORY_AUDIO_MAX_BYTES:
+        _, evicted = _audio.popitem(last=False)
+        _audio_bytes -= len(evicted)
+
+
+def _touch(key: str):
+    now = time.time()
+    with _lock:
+        last = _known_keys.get(key)
+        fresh = last is not None and now - last <= TOUCH_INTERVAL_SECONDS
+        _remember_key(key, last if fresh else now)
+    if not fresh:
+        redis_db.touch_tts_cache_keys({key: now})
+
+
+def is_cached(key: str) -> bool:
+    with _lock:
+        if key in _known_keys:
+            _known_keys.move_to_end(key)
+            known = True
+        else:
+            known = False
+    if known:
+        return True
+
+    last_used = (redis_db.get_tts_cache_last_used([key]) or {}).get(key)
+    if last_used is None or last_used < time.time() - TTS_CACHE_TTL_SECONDS:
+        return False
+    with _lock:
+        _remember_key(key, last_used)
+    return True
+
+
+def warm_index(keys: List[str]):
+    """Resolves which of the keys are stored with a single Redis call, ahead of per-key lookups"""
+    with _lock:
+        unknown = [key for key in keys if key not in _known_keys]
+    if not unknown:
+        return
+    min_last_used = time.time() - TTS_CACHE_TTL_SECONDS
+    found = redis_db.get_tts_cache_last_used(unknown) or {}
+    with _lock:
+        for key, last_used in found.items():
+            if last_used >= min_last_used:
+                _remember_key(key, last_used)
+
+
+def get_cached_audio(key: str) -> Optional[bytes]:
+    """Cached audio for the key, from memory or GCS, None when it was never synthesized"""
+    with _lock:
+        data = _audio.get(key)
+        if data is not None:
+            _audio.move_to_end(key)
+    if data is not None:
+        _touch(key)
+        return data
+
+    if not is_cached(key):
+        return None
+    try:
+        data = download_tts_audio(key)
+    except Exception as e:
+        # evicted by another instance since it was indexed
+        print(f"🔊 TTS_CACHE: Failed to load {key}: {e}")
+        with _lock:
+            _known_keys.pop(key, None)
+        redis_db.remove_tts_cache_keys([key])
+        return None
+
+    with _lock:
+        _remember_audio(key, data)
+    _touch(key)
+    return data
+
+
+def get_cached_audio_url(key: str) -> Optional[str]:
+    if not is_cached(key):
+        return None
+    _touch(key)
+    return get_tts_audio_signed_url(key)
+
+
+def store_audio(key: str, data: bytes):
+    """Uploads synthesized audio and indexes it, meant to run off the request path"""
+    global _new_entries
+    if not data:
+        return
+    with _lock:
+        _remember_audio(key, data)
+    try:
+        upload_tts_audio(key, data)
+    except Exception as e:
+        print(f"🔊 TTS_CACHE: Failed to store {key}: {e}")
+        return
+    _touch(key)
+
+    with _lock:
+        _new_entries += 1
+        evict = _new_entries % TTS_CACHE_EVICT_EVERY == 0
+    if evict:
+        threading.Thread(target=evict_stale_audio).start()
+
+
+def store_audio_in_background(key: str, data: bytes):
+    threading.Thread(target=store_audio, args=(key, data)).start()
+
+
+def evict_stale_audio():
+    """Deletes audio unused for TTS_CACHE_TTL_SECONDS and the least recently used beyond TTS_CACHE_MAX_ENTRIES"""
+    stale = redis_db.get_stale_tts_cache_keys(time.time() - TTS_CACHE_TTL_SECONDS, TTS_CACHE_MAX_ENTRIES) or []
+    if not stale:
+        return
+    # unindex first, a concurrent reader then re-synthesizes instead of hitting a deleted blob
+    redis_db.remove_tts_cache_keys(stale)
+    with _lock:
+        for key in stale:
+            _known_keys.pop(key, None)
+    try:
+        delete_tts_audio(stale)
+    except Exception as e:
+        print(f"🔊 TTS_CACHE: Failed to evict audio: {e}")
+    print(f"🔊 TTS_CACHE: Evicted {len(stale)} cached audio files")
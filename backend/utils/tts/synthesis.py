@@ -0,0 +1,201 @@
+"""
+Azure TTS synthesis with sentence chunking, for streaming speech back to clients
+"""
+import asyncio
+import os
+import re
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from utils.tts import cache as tts_cache
+
+TTS_MODEL = "gpt-4o-mini-tts"
+
+# The first chunk is kept short so the first audio arrives quickly, the rest are packed up to the larger size
+TTS_FIRST_CHUNK_MAX_CHARS = 250
+TTS_CHUNK_MAX_CHARS = 1000
+# Chunks synthesized at the same time for one request
+MAX_PARALLEL_TTS_CHUNKS = 4
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class TTSError(Exception):
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_tts_client() -> httpx.AsyncClient:
+    """One pooled client for all TTS calls, keeps connections to Azure warm across requests."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _client
+
+
+def is_tts_configured() -> bool:
+    return bool(os.getenv("AZURE_TTS_API_KEY") and os.getenv("AZURE_TTS_ENDPOINT"))
+
+
+def _tts_request(text: str, voice: str, speed: float):
+    azure_tts_api_version = os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview")
+    url = f"{os.getenv('AZURE_TTS_ENDPOINT')}?api-version={azure_tts_api_version}"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.getenv('AZURE_TTS_API_KEY')}"
+    }
+    payload = {"model": TTS_MODEL, "input": text, "voice": voice, "speed": speed}
+    return url, headers, payload
+
+
+def truncate_text_for_tts(text: str, max_chars: int = 3000) -> str:
+    """
+    Truncate text to fit within Azure TTS limits.
+    Azure TTS has a 2000 token limit, so we'll use a conservative 3000 character limit.
+    """
+    print(f"🔊 TTS_TRUNCATE: Input text length: {len(text)} characters")
+
+    if len(text) <= max_chars:
+        print(f"🔊 TTS_TRUNCATE: Text within limit, no truncation needed")
+        return text
+
+    print(f"🔊 TTS_TRUNCATE: Text exceeds {max_chars} chars, truncating...")
+
+    # Try to truncate at sentence boundaries
+    sentences = text.split('. ')
+    truncated = ""
+
+    for sentence in sentences:
+        test_text = truncated + sentence + ". "
+        if len(test_text) <= max_chars:
+            truncated = test_text
+        else:
+            break
+
+    # If we got at least some content, return it
+    if len(truncated) > 100:
+        print(f"🔊 TTS_TRUNCATE: Truncated at sentence boundary to {len(truncated)} characters")
+        return truncated.strip()
+
+    # Fallback: hard truncate at character limit
+    fallback_text = text[:max_chars].strip() + "..."
+    print(f"🔊 TTS_TRUNCATE: Hard truncated to {len(fallback_text)} characters")
+    return fallback_text
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    # a sentence longer than a chunk is cut at word boundaries
+    parts, current = [], ""
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_text_for_tts(text: str, first_chunk_max_chars: int = TTS_FIRST_CHUNK_MAX_CHARS,
+                       max_chars: int = TTS_CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Splits text into synthesis chunks at sentence boundaries, every chunk within the TTS input limit.
+    The first chunk is short so playback can start while the rest is still being synthesized.
+    """
+    chunks: List[str] = []
+    current = ""
+    for sentence in split_sentences(text):
+        limit = first_chunk_max_chars if not chunks else max_chars
+        pieces = [sentence] if len(sentence) <= limit else [
+            # a single word longer than the limit (a url, say) is cut too
+            truncate_text_for_tts(piece, limit) for piece in _split_long_sentence(sentence, limit)
+        ]
+        for piece in pieces:
+            limit = first_chunk_max_chars if not chunks else max_chars
+            if current and len(current) + 1 + len(piece) > limit:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def synthesize_speech(text: str, voice: str, speed: float) -> bytes:
+    url, headers, payload = _tts_request(text, voice, speed)
+    response = await get_tts_client().post(url, headers=headers, json=payload)
+    if response.status_code != 200:
+        raise TTSError(f"Azure TTS service error: {response.status_code} - {response.text}")
+    return response.content
+
+
+async def _stream_synthesis(text: str, voice: str, speed: float) -> AsyncIterator[bytes]:
+    url, headers, payload = _tts_request(text, voice, speed)
+    async with get_tts_client().stream("POST", url, headers=headers, json=payload) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            raise TTSError(f"Azure TTS service error: {response.status_code} - {body.decode(errors='ignore')}")
+        async for data in response.aiter_bytes():
+            yield data
+
+
+async def _synthesize_cached(key: str, text: str, voice: str, speed: float) -> bytes:
+    data = await asyncio.to_thread(tts_cache.get_cached_audio, key)
+    if data:
+        return data
+    data = await synthesize_speech(text, voice, speed)
+    tts_cache.store_audio_in_background(key, data)
+    return data
+
+
+async def stream_speech(text: str, voice: str, speed: float) -> AsyncIterator[bytes]:
+    """
+    Streams MP3 audio for text of any length.
+    Every chunk is looked up in the content addressed cache first, so repeated sentences cost no synthesis.
+    An uncached first chunk is forwarded byte by byte as Azure produces it, while the following chunks are
+    synthesized concurrently (at most MAX_PARALLEL_TTS_CHUNKS at a time) and yielded in order.
+    MP3 streams are frame based, so the chunks' audio plays back as one continuous file.
+    """
+    chunks = split_text_for_tts(text)
+    if not chunks:
+        return
+    keys = [tts_cache.tts_cache_key(chunk, voice, speed, TTS_MODEL) for chunk in chunks]
+    await asyncio.to_thread(tts_cache.warm_index, keys)
+    print(f"🔊 TTS_STREAM: {len(text)} characters in {len(chunks)} chunks")
+
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_TTS_CHUNKS)
+
+    async def synthesize(key: str, chunk: str) -> bytes:
+        async with semaphore:
+            return await _synthesize_cached(key, chunk, voice, speed)
+
+    tasks = [asyncio.create_task(synthesize(key, chunk)) for key, chunk in zip(keys[1:], chunks[1:])]
+    try:
+        first = await asyncio.to_thread(tts_cache.get_cached_audio, keys[0])
+        if first:
+            yield first
+        else:
+            parts = []
+            async for data in _stream_synthesis(chunks[0], voice, speed):
+                parts.append(data)
+                yield data
+            tts_cache.store_audio_in_background(keys[0], b''.join(parts))
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()